@@ -0,0 +1,237 @@
+import os
+import json
+import time
+import zlib
+import sqlite3
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import tracing
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = os.environ.get("GENETIC_APP_CACHE", "annotation_cache.sqlite3")
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+DAY = 24 * 3600
+# Seconds an entry is fresh, per source
+SOURCE_TTLS = {
+    "gnomad": 30 * DAY,
+    "pubmed": 7 * DAY,
+    "gemini": 90 * DAY,
+}
+# Extra seconds after expiry during which the stale value is still served while it is refreshed
+STALE_GRACE = 30 * DAY
+# Seconds a negative result (e.g. variant not in gnomAD) is served; short and without stale
+# grace, so a new data release is picked up soon
+NEGATIVE_TTL = DAY
+# Reads refresh an entry's LRU timestamp only when it is older than this, so cache reads
+# normally take no write lock (eviction order is accurate to within this interval)
+ACCESS_UPDATE_INTERVAL = 3600
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache (
+    source TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    created REAL NOT NULL,
+    accessed REAL NOT NULL,
+    PRIMARY KEY (source, key)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed);
+"""
+
+
+def normalize_variant_key(chrom, pos, ref, alt):
+    """Canonical CHROM-POS-REF-ALT key: no 'chr' prefix, upper-case alleles, integer position."""
+    chrom = str(chrom).strip()
+    if chrom.lower().startswith("chr"):
+        chrom = chrom[3:]
+    return f"{chrom.upper()}-{int(pos)}-{str(ref).strip().upper()}-{str(alt).strip().upper()}"
+
+
+def _is_negative(value):
+    """A definitive "no data" answer, marked {'error': ..., 'not_found': True}."""
+    return isinstance(value, dict) and value.get("not_found") is True
+
+
+def _is_error(value):
+    """A failed lookup (transport, HTTP, decoding), worth retrying; negative results are not errors."""
+    return isinstance(value, dict) and "error" in value and not _is_negative(value)
+
+
+class AnnotationCache:
+    """
+    SQLite-backed cache for external annotation results, shared by every worker
+    process on the host (WAL mode). Values are JSON, zlib-compressed. Entries
+    expire per source (SOURCE_TTLS), negative results after `negative_ttl`, and the
+    least recently used ones are evicted once the cache grows past `max_bytes`.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_bytes=DEFAULT_MAX_BYTES, ttls=None, stale_grace=STALE_GRACE,
+                 negative_ttl=NEGATIVE_TTL):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttls = {**SOURCE_TTLS, **(ttls or {})}
+        self.stale_grace = stale_grace
+        self.negative_ttl = negative_ttl
+        self._local = threading.local()
+        self._writes = 0
+        self._writes_lock = threading.Lock()
+        self._revalidating = set()
+        self._revalidate_lock = threading.Lock()
+        self._revalidate_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="cache-revalidate")
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _write_many(self, sql, rows):
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(sql, rows)
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    # --- Reads and writes ---
+    def get_many(self, source, keys):
+        """Returns {key: (value, is_fresh)} for cached keys within the TTL plus stale grace."""
+        if not keys:
+            return {}
+        now = time.time()
+        ttl = self.ttls.get(source, DAY)
+        conn = self._connect()
+        found = {}
+        touched = []
+        keys = list(dict.fromkeys(keys))
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            rows = conn.execute(
+                f"SELECT key, value, created, accessed FROM cache "
+                f"WHERE source = ? AND key IN ({','.join('?' * len(chunk))})",
+                [source, *chunk],
+            ).fetchall()
+            for key, blob, created, accessed in rows:
+                age = now - created
+                if age > ttl + self.stale_grace:
+                    continue
+                value = json.loads(zlib.decompress(blob))
+                if _is_negative(value):
+                    if age > self.negative_ttl:
+                        continue
+                    found[key] = (value, True)
+                else:
+                    found[key] = (value, age <= ttl)
+                if now - accessed > ACCESS_UPDATE_INTERVAL:
+                    touched.append(key)
+        if touched:
+            self._write_many(
+                "UPDATE cache SET accessed = ? WHERE source = ? AND key = ?",
+                [(now, source, key) for key in touched],
+            )
+        return found
+
+    def get(self, source, key):
+        hit = self.get_many(source, [key]).get(key)
+        return hit[0] if hit and hit[1] else None
+
+    def set_many(self, source, items):
+        """Stores {key: value}; failed lookups are never cached, negative results are (see NEGATIVE_TTL)."""
+        now = time.time()
+        rows = []
+        for key, value in items.items():
+            if _is_error(value):
+                continue
+            blob = zlib.compress(json.dumps(value).encode())
+            rows.append((source, key, blob, len(blob), now, now))
+        if not rows:
+            return
+        self._write_many("INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?, ?, ?)", rows)
+        with self._writes_lock:
+            self._writes += len(rows)
+            due = self._writes >= 1000
+            if due:
+                self._writes = 0
+        if due:
+            self.evict()
+
+    def set(self, source, key, value):
+        self.set_many(source, {key: value})
+
+    def evict(self):
+        """Drops least recently used entries until the cache is below 90% of max_bytes."""
+        conn = self._connect()
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        target = total - int(self.max_bytes * 0.9)
+        freed = 0
+        doomed = []
+        for source, key, size in conn.execute("SELECT source, key, size FROM cache ORDER BY accessed").fetchall():
+            doomed.append((source, key))
+            freed += size
+            if freed >= target:
+                break
+        self._write_many("DELETE FROM cache WHERE source = ? AND key = ?", doomed)
+        logger.info(f"Annotation cache evicted {len(doomed)} entries ({freed} bytes)")
+
+    # --- Read-through lookups ---
+    def lookup(self, source, keys, args_list, fetch_batch):
+        """
+        Read-through batch lookup. Fresh hits are returned directly. Stale hits are
+        returned immediately and refreshed in the background (stale-while-revalidate).
+        Misses are fetched with one `fetch_batch(args_subset)` call and stored.
+        Returns one result per key, in order.
+        """
+        cached = self.get_many(source, keys)
+        results = [None] * len(keys)
+        missing, stale = [], []
+        for i, key in enumerate(keys):
+            hit = cached.get(key)
+            if hit is None:
+                missing.append(i)
+                continue
+            results[i] = hit[0]
+            if not hit[1]:
+                stale.append(i)
+
+        tracing.add(cache_hits=len(keys) - len(missing), cache_misses=len(missing))
+        if missing:
+            fetched = fetch_batch([args_list[i] for i in missing])
+            for i, value in zip(missing, fetched):
+                results[i] = value
+            self.set_many(source, {keys[i]: value for i, value in zip(missing, fetched)})
+        if stale:
+            self._revalidate(source, [keys[i] for i in stale], [args_list[i] for i in stale], fetch_batch)
+        return results
+
+    def _revalidate(self, source, keys, args_list, fetch_batch):
+        with self._revalidate_lock:
+            todo = [(k, a) for k, a in zip(keys, args_list) if (source, k) not in self._revalidating]
+            self._revalidating.update((source, k) for k, _ in todo)
+        if not todo:
+            return
+
+        def _refresh():
+            try:
+                fetched = fetch_batch([a for _, a in todo])
+                self.set_many(source, {k: value for (k, _), value in zip(todo, fetched)})
+            except Exception as e:
+                logger.warning(f"Background refresh of {len(todo)} {source} entries failed: {e}")
+            finally:
+                with self._revalidate_lock:
+                    self._revalidating.difference_update((source, k) for k, _ in todo)
+
+        self._revalidate_pool.submit(_refresh)
@@ -0,0 +1,203 @@
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import tracing
+
+logger = logging.getLogger(__name__)
+
+
+class Service:
+    """
+    An external annotation source: the function to call, its own concurrency
+    limit (thread pool size) and a rate limiter shared with other sessions.
+    Calls that raise one of `throttle_errors` slow the limiter down and are retried.
+
+    With `batch_size` set, `func` takes a list of argument tuples and returns one
+    result per tuple, and the engine groups up to `batch_size` variants per call.
+    `limiter=None` leaves rate limiting to `func` itself.
+    """
+
+    def __init__(self, name, func, limiter, concurrency=4, throttle_errors=(), max_retries=3, retry_delay=2.0,
+                 batch_size=None):
+        self.name = name
+        self.func = func
+        self.limiter = limiter
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.throttle_errors = tuple(throttle_errors)
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+
+    def call(self, *args):
+        items = len(args[0]) if self.batch_size else 1
+        with tracing.span(self.name, items=items) as span:
+            for attempt in range(self.max_retries + 1):
+                if self.limiter is not None:
+                    self.limiter.acquire()
+                try:
+                    result = self.func(*args)
+                except self.throttle_errors as e:
+                    if self.limiter is not None:
+                        self.limiter.throttled()
+                    if attempt == self.max_retries:
+                        raise
+                    logger.warning(f"{self.name} throttled (attempt {attempt + 1}): {e}")
+                    span["retries"] = attempt + 1
+                    time.sleep(self.retry_delay * (2 ** attempt))
+                    continue
+                if self.limiter is not None:
+                    self.limiter.succeeded()
+                return result
+
+    def submit_all(self, pool, args_list):
+        """Submits one call per argument tuple (or one per batch) and returns a future per tuple."""
+        call = tracing.bind(self.call)
+        if not self.batch_size:
+            return [pool.submit(call, *args) for args in args_list]
+        futures = []
+        for start in range(0, len(args_list), self.batch_size):
+            chunk = args_list[start:start + self.batch_size]
+            item_futures = [Future() for _ in chunk]
+            pool.submit(call, chunk).add_done_callback(
+                lambda f, item_futures=item_futures: _fan_out(f, item_futures))
+            futures.extend(item_futures)
+        return futures
+
+
+def _fan_out(batch_future, item_futures):
+    if batch_future.cancelled():
+        for f in item_futures:
+            f.cancel()
+        return
+    e = batch_future.exception()
+    results = None if e else batch_future.result()
+    for i, f in enumerate(item_futures):
+        if e:
+            f.set_exception(e)
+        else:
+            f.set_result(results[i])
+
+
+def _when_all(futures, callback):
+    remaining = [len(futures)]
+    lock = threading.Lock()
+
+    def _done(_):
+        with lock:
+            remaining[0] -= 1
+            last = remaining[0] == 0
+        if last:
+            callback()
+
+    for f in futures:
+        f.add_done_callback(_done)
+
+
+def _result_or_error(future):
+    e = future.exception()
+    return {'error': f"{type(e).__name__}: {e}"} if e else future.result()
+
+
+def variant_label(row):
+    return f"{row['CHROM']}-{row['POS']}-{row['REF']}-{row['ALT']}"
+
+
+def annotate_variants(rows, build_prompt, pubmed, gnomad, gemini, fingerprint=None, triage=None):
+    """
+    Annotates variants concurrently. For each row (a dict with ID, CHROM, POS, REF,
+    ALT) the PubMed and gnomAD lookups run in parallel on their own pools; once both
+    finish, `build_prompt(row, pubmed_response, gnomad_response)` is sent to Gemini.
+    Different variants overlap freely, bounded by each service's concurrency and rate.
+    If `gemini.batch_size` is set, ready prompts are grouped and Gemini is called with
+    a list of (variant_label, prompt, cache_key) tuples instead of a single prompt;
+    cache_key is `fingerprint(row, pubmed_response, gnomad_response)`, or None.
+    `triage(row, pubmed_response, gnomad_response, prompt, cache_key)` may return a
+    text to use as the interpretation instead of calling Gemini, or None.
+
+    Yields one dict per variant as soon as it completes (not in input order):
+    {"index", "row", "pubmed", "gnomad", "interpretation"}.
+    """
+    rows = list(rows)
+    done = queue.Queue()
+    pools = {s.name: ThreadPoolExecutor(max_workers=s.concurrency, thread_name_prefix=s.name)
+             for s in (pubmed, gnomad, gemini)}
+    pending = []
+    pending_lock = threading.Lock()
+    lookups_left = [len(rows)]
+    # Gemini calls are submitted from lookup callbacks, so bind them to the caller's trace run now
+    gemini_call = tracing.bind(gemini.call)
+
+    def _emit(item, interpretation):
+        index, row, pm_future, gn_future = item
+        done.put({
+            "index": index,
+            "row": row,
+            "pubmed": _result_or_error(pm_future),
+            "gnomad": _result_or_error(gn_future),
+            "interpretation": interpretation,
+        })
+
+    def _submit(items_with_prompts):
+        if gemini.batch_size:
+            args = ([(variant_label(item[1]), prompt, key) for item, (prompt, key) in items_with_prompts],)
+        else:
+            args = (items_with_prompts[0][1][0],)
+        try:
+            ai_future = pools[gemini.name].submit(gemini_call, *args)
+        except RuntimeError:
+            return  # engine is shutting down
+
+        def _finished(f):
+            if f.cancelled():
+                return
+            e = f.exception()
+            results = None if e else (f.result() if gemini.batch_size else [f.result()])
+            for i, (item, _) in enumerate(items_with_prompts):
+                _emit(item, f"❌ Error: {e}" if e else results[i])
+
+        ai_future.add_done_callback(_finished)
+
+    def _lookups_done(item):
+        _, row, pm_future, gn_future = item
+        if pm_future.cancelled() or gn_future.cancelled():
+            return
+        pm, gn = _result_or_error(pm_future), _result_or_error(gn_future)
+        try:
+            prompt = (build_prompt(row, pm, gn), fingerprint(row, pm, gn) if fingerprint else None)
+            summary = triage(row, pm, gn, *prompt) if triage else None
+        except Exception as e:
+            _emit(item, f"❌ Error: {e}")
+            prompt = None
+        else:
+            if summary is not None:
+                _emit(item, summary)
+                prompt = None
+        with pending_lock:
+            lookups_left[0] -= 1
+            if prompt is not None:
+                pending.append((item, prompt))
+            ready = []
+            if pending and (not gemini.batch_size or len(pending) >= gemini.batch_size or lookups_left[0] == 0):
+                ready, pending[:] = pending[:], []
+        if not gemini.batch_size:
+            for entry in ready:
+                _submit([entry])
+        elif ready:
+            _submit(ready)
+
+    try:
+        pm_futures = pubmed.submit_all(pools[pubmed.name], [(str(int(row["ID"])),) for row in rows])
+        gn_futures = gnomad.submit_all(pools[gnomad.name],
+                                       [(row["CHROM"], row["POS"], row["REF"], row["ALT"]) for row in rows])
+        for index, row in enumerate(rows):
+            item = (index, row, pm_futures[index], gn_futures[index])
+            _when_all([pm_futures[index], gn_futures[index]], lambda item=item: _lookups_done(item))
+        for _ in range(len(rows)):
+            yield done.get()
+    finally:
+        # Also runs when the consumer stops early (e.g. a Streamlit rerun)
+        for pool in pools.values():
+            pool.shutdown(wait=False, cancel_futures=True)
@@ -1,14 +1,8 @@
-import os
 import streamlit as st
 from streamlit_option_menu import option_menu
-import pandas as pd
-import gzip, io, time
 
-from pdf_report_generator import create_pdf_report_for_streamlit
-from clinvar_parser import enrich_clinvar_df, add_gnomad_links, fetch_gnomad_simple
-from gemini_handler import generate_with_gemini
-from clingen_handler import load_clingen_validity, get_clingen_classification
-from pubmed_handler import get_pubmed_ids_from_clinvar, build_pubmed_links
+# The pipeline, pandas, reportlab and google.generativeai are imported where they are
+# first needed, so a fresh server process renders its first page quickly
 
 # Page configuration
 st.set_page_config(page_title="Genetic App", layout="wide")
@@ -16,8 +10,8 @@ st.set_page_config(page_title="Genetic App", layout="wide")
 # Define keys for session state
 if 'analysis_completed' not in st.session_state:
     st.session_state.analysis_completed = False
-if 'results_data' not in st.session_state:
-    st.session_state.results_data = None
+if 'results_token' not in st.session_state:
+    st.session_state.results_token = None
 if 'pdf_created' not in st.session_state:
     st.session_state.pdf_created = False
 
@@ -48,48 +42,211 @@ if selected == "Documentation":
     from docs import show_documentation
     show_documentation()
 else:
-    # Cached functions
-    @st.cache_data(ttl=24 * 3600, show_spinner=False)
-    def get_pubmed_ids_cached(variation_id: str):
-        return get_pubmed_ids_from_clinvar(variation_id)
+    import pandas as pd
 
-    @st.cache_data(ttl=24 * 3600, show_spinner=False)
-    def fetch_gnomad_cached(chrom: str, pos: str, ref: str, alt: str):
-        return fetch_gnomad_simple(chrom, pos, ref, alt)
+    from gemini_handler import GEMINI_BATCH_SIZE
+    from vcf_reader import iter_variant_batches
+    from pipeline import GEMINI_RPM, match_variants
+    from job_queue import JobStore, JobRunner, QUEUED, RUNNING, DONE
+    from session_results import SessionResultStore, compact_results, export_frame
+    from scheduler import LOW_PRIORITY_SCORE, TEMPLATE_PREFIX
+    import resources
+    import tracing
 
-    # Data loading and preparation
-    clinvar_df = enrich_clinvar_df(pd.read_parquet("sampled_100.parquet"))
-    clinvar_df = add_gnomad_links(clinvar_df, genome_build="GRCh38")
-    clingen_df = load_clingen_validity("Clingen-Gene-Disease-Summary-2025-07-01.csv")
+    # Reference data (ClinVar, ClinGen, annotation cache) loads in the background once per
+    # process; an analysis started before it finishes waits for the same load
+    @st.cache_resource(show_spinner=False)
+    def start_warm_up():
+        return resources.warm_up(background=True)
 
-    def parse_vcf_gz(uploaded_file):
-        rows = []
-        with gzip.open(io.BytesIO(uploaded_file.read()), 'rt') as f:
-            for line in f:
-                if line.startswith("#"): continue
-                p = line.strip().split("\t")
-                rows.append({"CHROM": p[0], "POS": int(p[1]), "REF": p[3], "ALT": p[4]})
-        return pd.DataFrame(rows)
+    start_warm_up()
 
-    def parse_vcf(uploaded_file):
-        content = uploaded_file.getvalue().decode().splitlines()
-        rows = []
-        for line in content:
-            if line.startswith("#"): continue
-            p = line.strip().split("\t")
-            rows.append({"CHROM": p[0], "POS": int(p[1]), "REF": p[3], "ALT": p[4]})
-        return pd.DataFrame(rows)
+    # Analyses run as background jobs, so they survive refreshes and dropped sessions
+    @st.cache_resource(show_spinner=False)
+    def get_job_runner():
+        return JobRunner(JobStore())
+
+    job_runner = get_job_runner()
+
+    # Result tables live here, not in session state; sessions keep only a token
+    @st.cache_resource(show_spinner=False)
+    def get_result_store():
+        return SessionResultStore()
+
+    result_store = get_result_store()
+
+    def show_results_table(results_df, export, partial=False):
+        """`export(fmt)` builds the download file; it only runs when a download button is clicked."""
+        st.subheader("📊 Analysis Results" + (" (so far)" if partial else ""))
+        st.dataframe(results_df)
+        stamp = pd.Timestamp.now().strftime('%Y%m%d_%H%M%S')
+        col1, col2 = st.columns(2)
+        with col1:
+            st.download_button(
+                label="📥 Download Results as CSV" + (" (completed variants)" if partial else ""),
+                data=lambda: export("csv"),
+                file_name=f"genetic_analysis_{stamp}.csv",
+                mime="text/csv"
+            )
+        with col2:
+            st.download_button(
+                label="📥 Download Results as Parquet" + (" (completed variants)" if partial else ""),
+                data=lambda: export("parquet"),
+                file_name=f"genetic_analysis_{stamp}.parquet",
+                mime="application/octet-stream"
+            )
+
+    def show_statistics(results_df):
+        st.subheader("📈 Analysis Statistics")
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric("Total Variants", len(results_df))
+        with col2:
+            pathogenic_count = len(results_df[results_df['CLNSIG'].str.contains('Pathogenic', na=False)])
+            st.metric("Pathogenic", pathogenic_count)
+        with col3:
+            benign_count = len(results_df[results_df['CLNSIG'].str.contains('Benign', na=False)])
+            st.metric("Benign", benign_count)
+        with col4:
+            uncertain_count = len(results_df[results_df['CLNSIG'].str.contains('Uncertain', na=False)])
+            st.metric("Uncertain", uncertain_count)
+        if 'Gemini_Interpretation' in results_df.columns:
+            templated = int(results_df['Gemini_Interpretation'].str.startswith(TEMPLATE_PREFIX, na=False).sum())
+            if templated:
+                st.caption(f"{TEMPLATE_PREFIX} {templated} of {len(results_df)} variants were summarized from their "
+                           f"evidence without a Gemini call (low priority or interpretation budget reached).")
+        if 'CLNSIG' in results_df.columns:
+            st.subheader("🔍 Clinical Significance Distribution")
+            st.bar_chart(results_df['CLNSIG'].value_counts())
+        if 'GENE' in results_df.columns:
+            st.subheader("🧬 Most Frequently Observed Genes")
+            st.bar_chart(results_df['GENE'].value_counts().head(10))
+
+    # Server-wide summary over up to MAX_SPANS spans: shared by all viewers, rebuilt at most every 30 s
+    @st.cache_data(ttl=30, show_spinner=False)
+    def server_trace_summary():
+        return tracing.tracer.summary()
+
+    def show_trace_metrics(run, server_wide=True):
+        """
+        Per-stage timings of `run` (this analysis) and, with `server_wide`, of everything
+        this server process has traced. Downloads are built only when clicked.
+        """
+        st.subheader("⏱️ Performance")
+        summary = tracing.tracer.summary(run) if run else None
+        if summary is None or summary.empty:
+            st.info("No timing data for this analysis (it may have run before the server restarted).")
+        else:
+            st.caption("This analysis: latency percentiles, total time and counters per stage and external call.")
+            st.dataframe(summary, hide_index=True)
+            st.bar_chart(summary.set_index("stage")["total_s"])
+        if server_wide:
+            with st.expander("All analyses on this server"):
+                st.dataframe(server_trace_summary(), hide_index=True)
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.download_button("📥 Timings (JSON)", data=lambda: tracing.tracer.to_json(run),
+                               file_name=f"trace_{run}.json", mime="application/json", disabled=not run)
+        with col2:
+            st.download_button("📥 Metrics (Prometheus)", data=tracing.tracer.to_prometheus,
+                               file_name="genetic_app.prom", mime="text/plain")
+        with col3:
+            st.download_button("📥 cProfile report", data=lambda: tracing.tracer.profile_report(run),
+                               file_name=f"profile_{run}.txt", mime="text/plain",
+                               disabled=not (run and tracing.tracer.has_profile(run)))
+
+    def job_trace_run():
+        job_id = st.query_params.get("job")
+        job = job_runner.store.get(job_id) if job_id else None
+        return job["params"].get("trace_run") if job else None
+
+    # Completed variants stream in (most significant first) while the job is still running
+    @st.fragment(run_every=2)
+    def show_job_progress(job_id):
+        job = job_runner.store.get(job_id)
+        if job["status"] not in (QUEUED, RUNNING):
+            st.rerun(scope="app")
+        partial = st.session_state.get("partial_results")
+        if partial is None or partial["job"] != job_id:
+            partial = st.session_state.partial_results = {"job": job_id, "seq": 0, "rows": {}, "df": None}
+        new_rows, partial["seq"] = job_runner.store.results_since(job_id, partial["seq"])
+        if new_rows or partial["df"] is None:
+            partial["rows"].update(new_rows)
+            partial["df"] = compact_results([partial["rows"][i] for i in sorted(partial["rows"])])
+        st.markdown(f"### 🧠 Job `{job_id}`: {job['done']}/{job['total']} variants interpreted")
+        st.progress(job['done'] / max(job['total'], 1))
+        st.caption("The analysis runs in the background. You can close this page and reopen this URL later.")
+        if partial["df"].empty:
+            st.info("⏳ Waiting for the first interpreted variant...")
+            return
+        tab1, tab2 = st.tabs(["📊 Results", "📈 Statistics"])
+        with tab1:
+            partial_df = partial["df"]
+            show_results_table(partial_df, lambda fmt: export_frame(partial_df, fmt), partial=True)
+        with tab2:
+            show_statistics(partial["df"])
+            # Refreshed every 2 s for every viewer, so only this job's timings
+            show_trace_metrics(job["params"].get("trace_run"), server_wide=False)
 
     # Main Application
     st.title("🧬 Gemini-Powered Genetic Variant Interpretation")
 
-    if st.session_state.analysis_completed and st.session_state.results_data is not None:
-        results_df = pd.DataFrame(st.session_state.results_data)
+    # A job attached via ?job=<id> is polled until it finishes, even after a browser refresh
+    job_id = st.query_params.get("job")
+    if job_id and not st.session_state.analysis_completed:
+        job = job_runner.store.get(job_id)
+        if job is None:
+            st.error(f"❌ Job {job_id} not found.")
+            if st.button("🔄 Start New Analysis", type="secondary"):
+                del st.query_params["job"]
+                st.rerun()
+            st.stop()
+        if job["status"] == DONE:
+            st.session_state.results_token = result_store.put(job_runner.store.results(job_id))
+            st.session_state.pop("partial_results", None)
+            st.session_state.analysis_completed = True
+        elif job["status"] in (QUEUED, RUNNING):
+            if job["status"] == QUEUED and not job_runner.has_credentials(job_id):
+                st.markdown(f"### 🧠 Job `{job_id}`: {job['done']}/{job['total']} variants interpreted")
+                st.warning("⏸️ This job was interrupted. Enter your Gemini API key to resume it.")
+                resume_key = st.text_input("Your Gemini API Key", type="password", key="resume_api_key")
+                resume_ncbi_key = st.text_input("NCBI API Key (optional)", type="password", key="resume_ncbi_key")
+                if st.button("▶️ Resume Job", type="primary", disabled=not resume_key):
+                    job_runner.resume(job_id, resume_key, resume_ncbi_key or None)
+                    st.rerun()
+                st.stop()
+            if st.button("⏹️ Cancel Job", type="secondary"):
+                job_runner.cancel(job_id)
+            show_job_progress(job_id)
+            st.stop()
+        else:
+            st.error(f"❌ Job {job_id} {job['status']}: {job['error'] or 'no further details'}")
+            col1, col2 = st.columns(2)
+            with col1:
+                if st.button(f"📊 Show {job['done']} Completed Variants", disabled=job['done'] == 0):
+                    st.session_state.results_token = result_store.put(job_runner.store.results(job_id))
+                    st.session_state.analysis_completed = True
+                    st.rerun()
+            with col2:
+                if st.button("🔄 Start New Analysis", type="secondary"):
+                    del st.query_params["job"]
+                    st.rerun()
+            st.stop()
+
+    results_token = st.session_state.results_token
+    results_df = result_store.get(results_token) if st.session_state.analysis_completed and results_token else None
+    if st.session_state.analysis_completed and results_df is None:
+        # Results expired from the store (long-idle session): reload them from the job, if any
+        st.session_state.analysis_completed = False
+        st.rerun()
+    if results_df is not None:
         st.success("✅ Analysis completed!")
 
         if st.button("🔄 Start New Analysis", type="secondary"):
+            st.query_params.pop("job", None)
+            result_store.discard(results_token)
             st.session_state.analysis_completed = False
-            st.session_state.results_data = None
+            st.session_state.results_token = None
             st.session_state.pdf_created = False
             st.rerun()
 
@@ -97,15 +254,7 @@ else:
 
         # Results Tab
         with tab1:
-            st.subheader("📊 Analysis Results")
-            st.dataframe(results_df)
-            csv_data = results_df.to_csv(index=False)
-            st.download_button(
-                label="📥 Download Results as CSV",
-                data=csv_data,
-                file_name=f"genetic_analysis_{pd.Timestamp.now().strftime('%Y%m%d_%H%M%S')}.csv",
-                mime="text/csv"
-            )
+            show_results_table(results_df, lambda fmt: result_store.export(results_token, fmt))
 
         # PDF Report Tab
         with tab2:
@@ -115,9 +264,9 @@ else:
                 st.success("✅ PDF report is ready!")
                 st.download_button(
                     label="📥 Download PDF Report",
-                    data=st.session_state['pdf_bytes'],
+                    data=lambda: result_store.get_blob(results_token, "pdf"),
                     file_name=st.session_state['pdf_filename'],
-                    mime="application/pdf"
+                    mime=st.session_state.get('pdf_mime', "application/pdf")
                 )
 
                 with st.expander("📋 Report Details", expanded=True):
@@ -148,50 +297,44 @@ else:
                     with col2:
                         patient_age = st.number_input("Age", min_value=0, max_value=150)
                         test_date = st.date_input("Test Date", value=pd.Timestamp.now().date())
+                    template = st.radio("Report Type", ["Summary Report", "Full Report"], horizontal=True,
+                                        help="Summary: statistics for all variants, AI comments for the 20 most "
+                                             "significant. Full: AI comments for every variant; large reports "
+                                             "are split into appendix volumes and downloaded as a ZIP.")
                     submitted = st.form_submit_button("🎯 Generate PDF Report")
                     if submitted:
-                        with st.spinner("🔄 Preparing PDF..."):
-                            patient_info = {
-                                'id': patient_id or f"RPT_{pd.Timestamp.now().strftime('%Y%m%d_%H%M%S')}" ,
-                                'name': patient_name or "Not specified",
-                                'age': str(patient_age) if patient_age > 0 else "Not specified",
-                                'test_date': test_date.strftime('%d.%m.%Y')
-                            }
-                            report_options = {
-                                'template': "Summary Report",
-                                'language': "English",
-                                'include_charts': True,
-                                'include_detailed_analysis': True
-                            }
-                            pdf_bytes = create_pdf_report_for_streamlit(results_df, patient_info, report_options)
-                            st.session_state['pdf_bytes'] = pdf_bytes
-                            st.session_state['pdf_filename'] = f"genetic_report_{patient_info['id']}.pdf"
-                            st.session_state.pdf_created = True
-                            st.session_state['pdf_patient_info'] = patient_info
-                            st.session_state['pdf_report_options'] = report_options
+                        progress_bar = st.progress(0.0, text="🔄 Preparing PDF...")
+                        patient_info = {
+                            'id': patient_id or f"RPT_{pd.Timestamp.now().strftime('%Y%m%d_%H%M%S')}" ,
+                            'name': patient_name or "Not specified",
+                            'age': str(patient_age) if patient_age > 0 else "Not specified",
+                            'test_date': test_date.strftime('%d.%m.%Y')
+                        }
+                        report_options = {
+                            'template': template,
+                            'language': "English",
+                            'include_charts': True,
+                            'include_detailed_analysis': True
+                        }
+                        from pdf_report_generator import build_report_volumes, package_report
+                        with tracing.trace_run(job_trace_run()):
+                            volumes = build_report_volumes(
+                                results_df, patient_info, report_options,
+                                on_progress=lambda done, total: progress_bar.progress(
+                                    done / total, text=f"🔄 Writing AI comments: {done}/{total} variants"))
+                        file_name, data, mime = package_report(volumes, f"genetic_report_{patient_info['id']}")
+                        result_store.put_blob(results_token, "pdf", data)
+                        st.session_state['pdf_filename'] = file_name
+                        st.session_state['pdf_mime'] = mime
+                        st.session_state.pdf_created = True
+                        st.session_state['pdf_patient_info'] = patient_info
+                        st.session_state['pdf_report_options'] = report_options
                         st.rerun()
 
         # Statistics Tab
         with tab3:
-            st.subheader("📈 Analysis Statistics")
-            col1, col2, col3, col4 = st.columns(4)
-            with col1:
-                st.metric("Total Variants", len(results_df))
-            with col2:
-                pathogenic_count = len(results_df[results_df['CLNSIG'].str.contains('Pathogenic', na=False)])
-                st.metric("Pathogenic", pathogenic_count)
-            with col3:
-                benign_count = len(results_df[results_df['CLNSIG'].str.contains('Benign', na=False)])
-                st.metric("Benign", benign_count)
-            with col4:
-                uncertain_count = len(results_df[results_df['CLNSIG'].str.contains('Uncertain', na=False)])
-                st.metric("Uncertain", uncertain_count)
-            if 'CLNSIG' in results_df.columns:
-                st.subheader("🔍 Clinical Significance Distribution")
-                st.bar_chart(results_df['CLNSIG'].value_counts())
-            if 'GENE' in results_df.columns:
-                st.subheader("🧬 Most Frequently Observed Genes")
-                st.bar_chart(results_df['GENE'].value_counts().head(10))
+            show_statistics(results_df)
+            show_trace_metrics(job_trace_run())
 
     else:
         # Initial analysis screen
@@ -201,76 +344,68 @@ else:
             st.warning("⚠️ API key not entered")
             st.info("💡 You can get a free key from Google AI Studio.")
             st.stop()
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            ncbi_api_key = st.text_input("NCBI API Key (optional)", type="password",
+                                         help="Raises the PubMed rate limit from 3 to 10 requests/second.")
+        with col2:
+            gemini_rpm = st.number_input("Gemini requests per minute", min_value=1, max_value=2000, value=GEMINI_RPM,
+                                         help="Starting rate; it is lowered automatically when Gemini answers 429.")
+        with col3:
+            gemini_batch_size = st.number_input("Variants per Gemini request", min_value=1, max_value=25,
+                                                value=GEMINI_BATCH_SIZE,
+                                                help="Several variants are interpreted in one request, returned as JSON.")
+        with st.expander("🎯 Interpretation Priority and Budget"):
+            st.caption("Variants are scored from ClinVar significance, review stars, ClinGen validity and gnomAD "
+                       "frequency and sent to Gemini highest first. Variants below the minimum score, and all "
+                       "variants left once a budget is used up, get a templated summary instead.")
+            col1, col2 = st.columns(2)
+            with col1:
+                summarize_low = st.checkbox("Summarize low-priority variants without Gemini", value=True)
+            with col2:
+                min_priority = st.number_input("Minimum priority score for Gemini", value=LOW_PRIORITY_SCORE,
+                                               disabled=not summarize_low,
+                                               help="Pathogenic ≈ 100, Uncertain ≈ 45, Benign ≈ 0; up to +20 for "
+                                                    "review stars, +15 for ClinGen validity, −50 if common in gnomAD.")
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                max_minutes = st.number_input("Time limit (minutes, 0 = none)", min_value=0.0, value=0.0, step=1.0)
+            with col2:
+                max_requests = st.number_input("Gemini requests (0 = none)", min_value=0, value=0)
+            with col3:
+                max_tokens = st.number_input("Gemini tokens, estimated (0 = none)", min_value=0, value=0,
+                                             step=10_000)
+        profile_run = st.checkbox("Profile this analysis (cProfile)",
+                                  help="Slower; the profile can be downloaded from the Statistics tab.")
         uploaded = st.file_uploader("📁 Upload file (.vcf/.vcf.gz/.csv)", type=["vcf","vcf.gz","csv"])
         if uploaded:
-            if uploaded.name.endswith(".vcf.gz"):
-                df = parse_vcf_gz(uploaded)
-            elif uploaded.name.endswith(".vcf"):
-                df = parse_vcf(uploaded)
-            else:
-                df = pd.read_csv(uploaded)
             required_cols = {"CHROM","POS","REF","ALT"}
-            if not required_cols.issubset(df.columns):
-                st.error("❌ Upload error: required columns missing.")
+            n_variants, preview = 0, None
+            for batch in iter_variant_batches(uploaded):
+                if preview is None:
+                    if not required_cols.issubset(batch.columns):
+                        st.error("❌ Upload error: required columns missing.")
+                        st.stop()
+                    preview = batch.head(20)
+                n_variants += len(batch)
+            if preview is None:
+                st.error("❌ Upload error: no variants found.")
                 st.stop()
-            st.success(f"✅ File uploaded: {len(df)} variants.")
+            st.success(f"✅ File uploaded: {n_variants} variants.")
             with st.expander("📋 Show Variants", expanded=False):
-                st.dataframe(df.head(20))
+                st.dataframe(preview)
             if st.button("🔎 Interpret with Gemini", type="primary"):
                 with st.spinner("🧠 Generating interpretations..."):
-                    for c in ["CHROM","POS","REF","ALT"]:
-                        df[c] = df[c].astype(str)
-                        clinvar_df[c] = clinvar_df[c].astype(str)
-                    merged = pd.merge(df, clinvar_df, on=["CHROM","POS","REF","ALT"], how="left")
-                    merged["ClinGen_Validity"] = merged["GENE"].apply(lambda g: get_clingen_classification(g, clingen_df))
-                    matched = merged[~merged["ID"].isna()].copy()
+                    with tracing.trace_run(profile=profile_run) as run:
+                        matched = match_variants(uploaded)
                     if matched.empty:
                         st.warning("⚠️ No matching variants found.")
                         st.stop()
-                    st.write(f"✅ {len(matched)} matches found.")
-                    with st.expander("🔍 Show Matches", expanded=True):
-                        st.dataframe(matched.head(30))
-                    status = st.empty()
-                    overall_pb = st.progress(0)
-                    total = len(matched)
-                    results = []
-                    for idx, (i,row) in enumerate(matched.iterrows(),1):
-                        status.markdown(f"### 🔍 Processing {idx}/{total}: {row['CHROM']}:{row['POS']} {row['REF']}>{row['ALT']}")
-                        pm_response = get_pubmed_ids_cached(str(int(row["ID"])))
-                        pmids = pm_response if not(isinstance(pm_response,dict) and "error" in pm_response) else []
-                        gnomad_response = fetch_gnomad_cached(row["CHROM"],row["POS"],row["REF"],row["ALT"])
-                        stats = gnomad_response if not(isinstance(gnomad_response,dict) and "error" in gnomad_response) else {}
-                        prompt = f"""
-You are a clinical geneticist. Based on the following variant and annotation data, provide a professional clinical interpretation.
-
-🧬 Variant:
-- Chr: {row['CHROM']}, Pos: {row['POS']}, {row['REF']}→{row['ALT']}
-
-📑 ClinVar:
-- Gene: {row.get('GENE','N/A')}, Sig: {row.get('CLNSIG','N/A')}, Dis: {row.get('DISEASE','N/A')}
-
-🧪 ClinGen Validity: {row.get('ClinGen_Validity','N/A')}
-
-📚 PubMed: {', '.join(pmids) if pmids else 'None'}
-
-📊 gnomAD:
-- Exome AC/AN: {stats.get('Exome_AC','N/A')}/{stats.get('Exome_AN','N/A')}
-- PopMax AF: {stats.get('PopMax_AF','N/A')} (Pop: {stats.get('PopMax_Pop','N/A')})
-
-🩺 Answer:
-1. Likely pathogenicity?
-2. Known disease?
-3. Clinical relevance?
-4. Plain-language summary (≤5 sents).
-"""
-                        try:
-                            interpretation = generate_with_gemini(prompt, api_key=api_key)
-                        except Exception as e:
-                            interpretation = f"❌ Error: {e}"
-                        pubmed_links = build_pubmed_links(pmids)
-                        results.append({**row.to_dict(),"PubMed_Links":", ".join(pubmed_links),**stats,"Gemini_Interpretation":interpretation})
-                        time.sleep(0.3)
-                        overall_pb.progress(idx/total)
-                    st.session_state.results_data = results
-                    st.session_state.analysis_completed = True
+                    params = {"gemini_rpm": gemini_rpm, "gemini_batch_size": gemini_batch_size,
+                              "trace_run": run, "profile": profile_run,
+                              "min_priority": min_priority if summarize_low else None,
+                              "budget": {"seconds": max_minutes * 60, "requests": max_requests,
+                                         "tokens": max_tokens}}
+                    job_id = job_runner.submit(matched.to_dict("records"), params, api_key, ncbi_api_key or None)
+                    st.query_params["job"] = job_id
                     st.rerun()
\ No newline at end of file
@@ -0,0 +1,210 @@
+import os
+import sys
+import glob
+import time
+import logging
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from gemini_handler import GEMINI_BATCH_SIZE
+from rate_limiter import set_rate_share
+from session_results import compact_results
+from scheduler import LOW_PRIORITY_SCORE, TEMPLATE_PREFIX, InterpretationBudget
+import resources
+import tracing
+from report_batch import DEFAULT_TEMPLATE, get_report_generator, patient_info_for, report_options_for, write_report
+from pipeline import GEMINI_RPM, GNOMAD_BACKEND, build_services, build_triage, match_variants, interpret_variants
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_SUFFIXES = (".vcf", ".vcf.gz", ".csv")
+
+
+# --- Sample Discovery ---
+def _sample_id(path):
+    name = os.path.basename(path)
+    for suffix in SAMPLE_SUFFIXES:
+        if name.endswith(suffix):
+            return name[:-len(suffix)]
+    return name
+
+
+def discover_samples(source):
+    """
+    Returns [{'sample_id', 'path', ...}] from a directory of .vcf/.vcf.gz/.csv files
+    or from a manifest. A manifest is either a CSV with `path` (and optionally
+    `sample_id`, `name`, `age`, `test_date`) columns or a plain list of paths.
+    Relative paths in a manifest are resolved against the manifest's directory.
+    """
+    if os.path.isdir(source):
+        paths = sorted(p for p in glob.glob(os.path.join(source, "*")) if p.endswith(SAMPLE_SUFFIXES))
+        return [{"sample_id": _sample_id(p), "path": p} for p in paths]
+
+    base = os.path.dirname(os.path.abspath(source))
+    with open(source) as fh:
+        header = fh.readline().strip().lower()
+    if "path" in [c.strip() for c in header.split(",")]:
+        manifest = pd.read_csv(source, dtype=str).fillna("")
+        manifest.columns = [c.strip().lower() for c in manifest.columns]
+        samples = manifest.to_dict("records")
+    else:
+        with open(source) as fh:
+            samples = [{"path": line.strip()} for line in fh if line.strip() and not line.startswith("#")]
+    for sample in samples:
+        sample["path"] = os.path.join(base, sample["path"])
+        sample["sample_id"] = sample.get("sample_id") or _sample_id(sample["path"])
+    return samples
+
+
+# --- Worker ---
+def _init_worker(workers):
+    # Each process gets 1/N of every public API rate, so the pool as a whole stays within limits
+    set_rate_share(1.0 / workers)
+    get_report_generator()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(processName)s %(levelname)s %(message)s")
+
+
+def process_sample(sample, options):
+    """Runs the full pipeline for one sample and writes its results and PDF. Returns a summary dict."""
+    started = time.perf_counter()
+    out_dir = os.path.join(options["out"], sample["sample_id"])
+    summary = {"sample_id": sample["sample_id"], "path": sample["path"], "matched": 0, "templated": 0, "error": ""}
+    profile = options.get("profile") == sample["sample_id"]
+    try:
+        with tracing.trace_run(sample["sample_id"], profile=profile):
+            _run_sample(sample, options, out_dir, summary)
+        stats = tracing.tracer.profile_stats(sample["sample_id"]) if profile else None
+        if stats is not None:
+            stats.dump_stats(os.path.join(out_dir, "profile.prof"))
+    except Exception as e:
+        logger.exception(f"Sample {sample['sample_id']} failed")
+        summary["error"] = f"{type(e).__name__}: {e}"
+    summary["seconds"] = round(time.perf_counter() - started, 2)
+    # Worker spans travel back with the summary so the parent can aggregate them
+    summary["spans"] = tracing.tracer.spans(sample["sample_id"])
+    return summary
+
+
+def _run_sample(sample, options, out_dir, summary):
+    """Matches, interprets and writes one sample; fills in summary["matched"]."""
+    os.makedirs(out_dir, exist_ok=True)
+    with open(sample["path"], "rb") as fh:
+        matched = match_variants(fh)
+    summary["matched"] = len(matched)
+    results = []
+    if not matched.empty:
+        services = build_services(options["api_key"], options["ncbi_api_key"], options["gemini_rpm"],
+                                  options["gemini_batch_size"], options.get("gnomad_backend"))
+        budget = InterpretationBudget.from_params(options.get("budget"), options["gemini_batch_size"])
+        results = interpret_variants(matched, services, triage=build_triage(budget, options.get("min_priority")))
+    results_df = compact_results(results)
+    summary["templated"] = sum(r["Gemini_Interpretation"].startswith(TEMPLATE_PREFIX) for r in results)
+
+    if "csv" in options["formats"]:
+        results_df.to_csv(os.path.join(out_dir, "results.csv"), index=False)
+    if "parquet" in options["formats"]:
+        results_df.to_parquet(os.path.join(out_dir, "results.parquet"), index=False)
+    if options["pdf"] and not results_df.empty:
+        write_report(results_df, patient_info_for(sample), report_options_for(options["template"]), out_dir)
+
+
+def _already_done(sample, options):
+    out_dir = os.path.join(options["out"], sample["sample_id"])
+    return all(os.path.exists(os.path.join(out_dir, f"results.{fmt}")) for fmt in options["formats"])
+
+
+def run_batch(samples, options, workers=None):
+    """
+    Processes samples in parallel on a process pool and returns one summary per
+    sample. The ClinVar reference and ClinGen index are opened before the pool
+    starts, so forked workers share their memory-mapped pages (as do the citation
+    index and the local gnomAD store); PubMed, gnomAD and Gemini results are shared through the
+    on-disk annotation cache.
+    """
+    workers = max(1, min(workers or os.cpu_count() or 1, len(samples) or 1))
+    # Not the annotation cache: its SQLite connections must be opened in each worker
+    shared = ["clinvar_reference", "clingen_index", "citation_index"]
+    if (options.get("gnomad_backend") or GNOMAD_BACKEND) == "local":
+        shared.append("gnomad_store")
+    resources.warm_up(shared)
+
+    summaries = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(workers,)) as pool:
+        futures = {pool.submit(process_sample, sample, options): sample for sample in samples}
+        for done, future in enumerate(as_completed(futures), 1):
+            summary = future.result()
+            for span in summary.pop("spans", []):
+                tracing.tracer.record(span)
+            summaries.append(summary)
+            status = f"failed: {summary['error']}" if summary["error"] else f"{summary['matched']} variants"
+            logger.info(f"[{done}/{len(samples)}] {summary['sample_id']}: {status} ({summary['seconds']}s)")
+    return summaries
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the variant interpretation pipeline over many samples.")
+    parser.add_argument("source", help="Directory of .vcf/.vcf.gz/.csv files, or a manifest file")
+    parser.add_argument("--out", default="batch_output", help="Output directory (one subdirectory per sample)")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--api-key", default=os.environ.get("GEMINI_API_KEY"),
+                        help="Gemini API key (default: $GEMINI_API_KEY)")
+    parser.add_argument("--ncbi-api-key", default=os.environ.get("NCBI_API_KEY"),
+                        help="NCBI API key (default: $NCBI_API_KEY)")
+    parser.add_argument("--gemini-rpm", type=float, default=GEMINI_RPM, help="Gemini requests per minute, all workers")
+    parser.add_argument("--gemini-batch-size", type=int, default=GEMINI_BATCH_SIZE, help="Variants per Gemini request")
+    parser.add_argument("--gnomad", choices=["api", "local"], default=GNOMAD_BACKEND, dest="gnomad_backend",
+                        help="gnomAD frequencies from the public API or the local gnomAD store "
+                             "(default: $GENETIC_APP_GNOMAD or api)")
+    parser.add_argument("--format", nargs="+", default=["csv"], choices=["csv", "parquet"], dest="formats")
+    parser.add_argument("--no-pdf", action="store_false", dest="pdf", help="Skip PDF reports")
+    parser.add_argument("--template", default=DEFAULT_TEMPLATE, choices=["Summary Report", "Full Report"],
+                        help="PDF report template")
+    parser.add_argument("--min-priority", type=float, default=LOW_PRIORITY_SCORE,
+                        help="Variants scoring below this get a templated summary instead of a Gemini call")
+    parser.add_argument("--interpret-all", action="store_true", help="Send every variant to Gemini")
+    parser.add_argument("--max-minutes", type=float, help="Per-sample time budget for Gemini interpretation")
+    parser.add_argument("--max-requests", type=int, help="Per-sample budget of Gemini requests")
+    parser.add_argument("--max-tokens", type=int, help="Per-sample budget of (estimated) Gemini tokens")
+    parser.add_argument("--skip-existing", action="store_true", help="Skip samples whose results already exist")
+    parser.add_argument("--profile", metavar="SAMPLE_ID",
+                        help="Capture a cProfile of this sample's run in <out>/<sample_id>/profile.prof")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    if not args.api_key:
+        parser.error("a Gemini API key is required (--api-key or $GEMINI_API_KEY)")
+
+    options = {
+        "out": args.out, "api_key": args.api_key, "ncbi_api_key": args.ncbi_api_key,
+        "gemini_rpm": args.gemini_rpm, "gemini_batch_size": args.gemini_batch_size,
+        "gnomad_backend": args.gnomad_backend,
+        "formats": args.formats, "pdf": args.pdf, "template": args.template, "profile": args.profile,
+        "min_priority": None if args.interpret_all else args.min_priority,
+        "budget": {"seconds": args.max_minutes * 60 if args.max_minutes else None,
+                   "requests": args.max_requests, "tokens": args.max_tokens},
+    }
+    samples = discover_samples(args.source)
+    if args.skip_existing:
+        samples = [s for s in samples if not _already_done(s, options)]
+    if not samples:
+        logger.warning("No samples to process")
+        return 0
+
+    os.makedirs(args.out, exist_ok=True)
+    summaries = run_batch(samples, options, args.workers)
+    pd.DataFrame(summaries).to_csv(os.path.join(args.out, "summary.csv"), index=False)
+    # Per-stage timings of all samples: spans as JSON, aggregates as a Prometheus text file
+    with open(os.path.join(args.out, "metrics.json"), "w") as fh:
+        fh.write(tracing.tracer.to_json())
+    tracing.export_metrics_file(os.path.join(args.out, "metrics.prom"))
+    logger.info("Time per stage:\n" + tracing.tracer.summary()[["stage", "calls", "p50_ms", "p95_ms", "total_s"]]
+                .to_string(index=False))
+    failed = sum(1 for s in summaries if s["error"])
+    logger.info(f"Processed {len(summaries)} samples, {failed} failed; summary in {args.out}/summary.csv")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
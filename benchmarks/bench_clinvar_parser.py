@@ -0,0 +1,91 @@
+"""
+Benchmark for ClinVar INFO extraction and gnomAD link building.
+
+Compares the previous per-column `Series.apply` / `df.apply(axis=1)` implementation
+with the current single-pass `enrich_clinvar_df` and vectorized `add_gnomad_links`.
+
+    python benchmarks/bench_clinvar_parser.py --rows 1000000
+"""
+import os
+import sys
+import time
+import argparse
+import urllib.parse
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from clinvar_parser import (  # noqa: E402
+    enrich_clinvar_df, add_gnomad_links,
+    extract_gene, extract_clnsig, extract_disease, extract_rs,
+    extract_clnvc, extract_clnhgvs, extract_clnrevstat,
+)
+
+
+def synthetic_clinvar(n_rows):
+    i = pd.RangeIndex(n_rows)
+    s = i.astype(str)
+    info = ("ALLELEID=" + s + ";CLNDISDB=MedGen:C0000" + s + ";CLNDN=Hereditary_cancer-predisposing_syndrome"
+            + ";CLNHGVS=NC_000017.11:g." + s + "G>A;CLNREVSTAT=criteria_provided,_multiple_submitters,_no_conflicts"
+            + ";CLNSIG=Pathogenic;CLNVC=single_nucleotide_variant;CLNVCSO=SO:0001483"
+            + ";GENEINFO=BRCA1:672;MC=SO:0001583|missense_variant;ORIGIN=1;RS=" + s)
+    return pd.DataFrame({
+        "CHROM": "17", "POS": 43000000 + i, "ID": i, "REF": "G", "ALT": "A", "INFO": info,
+    })
+
+
+def legacy_enrich(df):
+    df["GENE"] = df["INFO"].apply(extract_gene)
+    df["CLNSIG"] = df["INFO"].apply(extract_clnsig)
+    df["DISEASE"] = df["INFO"].apply(extract_disease)
+    df["RS"] = df["INFO"].apply(extract_rs)
+    df["CLNVC"] = df["INFO"].apply(extract_clnvc)
+    df["CLNHGVS"] = df["INFO"].apply(extract_clnhgvs)
+    df["CLNREVSTAT"] = df["INFO"].apply(extract_clnrevstat)
+    return df
+
+
+def legacy_gnomad_links(df, genome_build="GRCh37"):
+    def build_url(row):
+        chrom = str(row['CHROM']).replace("chr", "").strip()
+        pos = int(row['POS'])
+        ref = row['REF'].strip()
+        alt = row['ALT'].strip()
+        if not chrom or not ref or not alt:
+            return None
+        ds = "gnomad_r2_1" if genome_build == "GRCh37" else "gnomad_r4"
+        return f"https://gnomad.broadinstitute.org/variant/{chrom}-{pos}-{urllib.parse.quote(ref)}-{urllib.parse.quote(alt)}?dataset={ds}"
+
+    df["gnomAD_Link"] = df.apply(build_url, axis=1)
+    return df
+
+
+def timed(label, func, df):
+    start = time.perf_counter()
+    out = func(df.copy())
+    elapsed = time.perf_counter() - start
+    print(f"{label:<34} {elapsed:8.2f} s {len(df) / elapsed:14,.0f} rows/s")
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=500_000)
+    parser.add_argument("--workers", type=int, default=None, help="Process pool size for the new path")
+    args = parser.parse_args()
+
+    df = synthetic_clinvar(args.rows)
+    print(f"{args.rows:,} synthetic ClinVar rows")
+    before = timed("enrich_clinvar_df (before)", legacy_enrich, df)
+    after = timed("enrich_clinvar_df (after)", lambda d: enrich_clinvar_df(d, workers=args.workers), df)
+    cols = ["GENE", "CLNSIG", "DISEASE", "RS", "CLNVC", "CLNHGVS", "CLNREVSTAT"]
+    assert before[cols].astype(object).equals(after[cols].astype(object)), "INFO extraction mismatch"
+
+    before = timed("add_gnomad_links (before)", legacy_gnomad_links, df)
+    after = timed("add_gnomad_links (after)", add_gnomad_links, df)
+    assert before["gnomAD_Link"].astype(object).equals(after["gnomAD_Link"].astype(object)), "gnomAD link mismatch"
+
+
+if __name__ == "__main__":
+    main()
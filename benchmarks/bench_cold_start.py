@@ -0,0 +1,120 @@
+"""
+Cold-start budget: how long a fresh server process takes to serve its first page.
+
+Every measurement runs in a new interpreter, so nothing is already imported:
+
+  - import time of the modules each page needs (`python -X importtime`), per module;
+  - the first run of app.py (Streamlit AppTest, Application page without an API
+    key) and which heavy modules it loaded. The PDF renderer (reportlab,
+    matplotlib) and google.generativeai must not be among them;
+  - how long the background warm-up then takes to load the reference data.
+
+Exits with status 1 when the first page is over budget or loads a deferred module,
+so it can gate a deployment:
+
+    python benchmarks/bench_cold_start.py --budget 2.5
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# Imported by the first page of each kind
+PAGE_MODULES = {
+    "documentation": ["streamlit", "streamlit_option_menu", "docs"],
+    "application": ["streamlit", "streamlit_option_menu", "pandas", "gemini_handler", "vcf_reader", "pipeline",
+                    "job_queue", "session_results", "resources"],
+}
+# Only imported when a PDF is built or Gemini is called
+DEFERRED_MODULES = ("google.generativeai", "reportlab.platypus", "matplotlib.pyplot")
+DEFAULT_BUDGET_S = 3.0
+
+
+def import_times(modules):
+    """Fresh-interpreter import of `modules`: (total seconds, [(cumulative seconds, module)] heaviest first)."""
+    code = "; ".join(f"import {m}" for m in modules)
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=ROOT, capture_output=True,
+                          text=True, check=True)
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((int(cumulative) / 1e6, name.strip(), depth))
+    # Interpreter start-up (site, encodings, ...) is not counted
+    top_level = [(seconds, name) for seconds, name, depth in rows if depth == 0 and name in modules]
+    return sum(s for s, _ in top_level), sorted(top_level, reverse=True)
+
+
+def first_page():
+    """Child process: times the first AppTest run of app.py and reports loaded modules and warm-up timings."""
+    sys.path.insert(0, ROOT)
+    started = time.perf_counter()
+    from streamlit.testing.v1 import AppTest
+    framework = time.perf_counter() - started
+    app = AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=120)
+    started = time.perf_counter()
+    app.run()
+    render = time.perf_counter() - started
+    loaded = [m for m in DEFERRED_MODULES if m in sys.modules]
+    import resources
+    started = time.perf_counter()
+    warm = resources.warm_up()  # waits for whatever the background warm-up has not finished
+    json.dump({"render_s": render, "framework_s": framework, "deferred_loaded": loaded,
+               "errors": [e.value for e in app.exception], "warm_up_wait_s": time.perf_counter() - started,
+               "warm_up": warm}, sys.stdout)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--budget", type=float, default=DEFAULT_BUDGET_S,
+                        help="Seconds allowed for the first page of a fresh process")
+    parser.add_argument("--json", help="Also write the results to this JSON file")
+    parser.add_argument("--first-page", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.first_page:
+        return first_page()
+
+    report = {"budget_s": args.budget, "imports": {}}
+    for page, modules in PAGE_MODULES.items():
+        total, heaviest = import_times(modules)
+        report["imports"][page] = {"seconds": round(total, 3), "heaviest": heaviest[:8]}
+        print(f"{page:<14} imports {total:6.2f} s  "
+              + ", ".join(f"{name} {seconds:.2f}" for seconds, name in heaviest[:6]))
+    for module in DEFERRED_MODULES:
+        total, _ = import_times([module])
+        print(f"{'(deferred)':<14} {module:<20} {total:6.2f} s")
+
+    proc = subprocess.run([sys.executable, os.path.abspath(__file__), "--first-page"], cwd=ROOT,
+                          capture_output=True, text=True)
+    if proc.returncode:
+        print(proc.stderr)
+        sys.exit(proc.returncode)
+    page = json.loads(proc.stdout.strip().splitlines()[-1])
+    report["first_page"] = page
+    print(f"first page     {page['render_s']:6.2f} s  (+{page['framework_s']:.2f} s test harness import); "
+          f"warm-up finished {page['warm_up_wait_s']:.2f} s later: {page['warm_up']}")
+
+    problems = []
+    if page["render_s"] > args.budget:
+        problems.append(f"first page took {page['render_s']:.2f} s, budget {args.budget:.2f} s")
+    if page["deferred_loaded"]:
+        problems.append(f"first page imported {', '.join(page['deferred_loaded'])}")
+    if page["errors"]:
+        problems.append(f"app raised: {page['errors']}")
+    report["problems"] = problems
+    if args.json:
+        with open(args.json, "w") as fh:
+            json.dump(report, fh, indent=2)
+    for problem in problems:
+        print(f"OVER BUDGET: {problem}")
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
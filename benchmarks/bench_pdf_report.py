@@ -0,0 +1,81 @@
+"""
+Benchmark for the PDF report summary charts.
+
+Builds the same report with the legacy matplotlib chart (PNG rasterized at 300 dpi)
+and with the native reportlab vector drawing, and reports build time and PDF size.
+
+    python benchmarks/bench_pdf_report.py --variants 200 --repeat 3
+"""
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from pdf_report_generator import GeneticReportGenerator, create_pdf_report_for_streamlit  # noqa: E402
+
+CLNSIG_VALUES = ["Pathogenic", "Likely_pathogenic", "Uncertain_significance", "Likely_benign", "Benign",
+                 "Conflicting_classifications_of_pathogenicity", "risk_factor"]
+GENES = ["BRCA1", "BRCA2", "TP53", "MLH1", "MSH2", "APC", "PTEN", "ATM", "CHEK2", "PALB2", "CFTR", "LDLR"]
+
+
+def synthetic_results(n_variants, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "CHROM": rng.choice([str(c) for c in range(1, 23)] + ["X"], n_variants),
+        "POS": rng.integers(1_000_000, 200_000_000, n_variants),
+        "REF": rng.choice(list("ACGT"), n_variants),
+        "ALT": rng.choice(list("ACGT"), n_variants),
+        "GENE": rng.choice(GENES, n_variants),
+        "CLNSIG": rng.choice(CLNSIG_VALUES, n_variants),
+        "PopMax_AF": rng.beta(0.5, 20, n_variants),
+        "Gemini_Interpretation": ["1. Likely pathogenic. 2. Hereditary cancer. 3. Relevant. " * 8] * n_variants,
+    })
+
+
+def bench(label, func, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    best = min(times)
+    print(f"{label:<34} {best * 1000:9.1f} ms (best of {repeat})")
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--variants", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    df = synthetic_results(args.variants)
+    generator = GeneticReportGenerator()
+    patient = {"id": "BENCH", "name": "Benchmark", "age": "40", "test_date": "01.01.2025"}
+    print(f"{args.variants} variants")
+
+    # First matplotlib call includes its import and font setup, as in a fresh worker
+    start = time.perf_counter()
+    generator.create_summary_chart(df)
+    print(f"{'matplotlib chart (first call)':<34} {(time.perf_counter() - start) * 1000:9.1f} ms")
+    bench("matplotlib chart", lambda: generator.create_summary_chart(df), args.repeat)
+    bench("vector chart", lambda: generator.create_summary_drawing(df), args.repeat)
+
+    sizes = {}
+    for renderer in ("matplotlib", "vector"):
+        options = {"template": "Summary Report", "include_charts": True, "include_detailed_analysis": True,
+                   "chart_renderer": renderer}
+        _, pdf = bench(f"full report ({renderer})", lambda: create_pdf_report_for_streamlit(df, patient, options),
+                       args.repeat)
+        sizes[renderer] = len(pdf)
+    for renderer, size in sizes.items():
+        print(f"{'PDF size (' + renderer + ')':<34} {size / 1024:9.1f} KiB")
+
+
+if __name__ == "__main__":
+    main()
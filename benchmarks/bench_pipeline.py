@@ -0,0 +1,227 @@
+"""
+End-to-end pipeline benchmark against local stand-ins for elink, gnomAD and Gemini.
+
+Generates a ClinVar-like reference and a patient file (synthetic_vcf.py), starts
+the stub servers (stub_services.py), then runs and measures each stage:
+
+    parse     stream the upload through vcf_reader
+    merge     ClinVar join + ClinGen + prioritization (match_variants, parses again)
+    annotate  PubMed / gnomAD / Gemini lookups and interpretation
+    pdf       PDF report with its appendix volumes
+
+For each stage it reports wall time, variants per second and peak RSS, followed by
+the p50/p95 latency of every traced stage and external call (tracing.py).
+
+    python benchmarks/bench_pipeline.py --variants 100000 --match-rate 0.01 --latency-ms 80
+    python benchmarks/bench_pipeline.py --variants 5000000 --skip annotate pdf --json parse_5m.json
+
+Public API rate limits apply as configured; `--rate-scale 100` lifts them (all
+limits x100) to measure the pipeline rather than the limiter.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+import threading
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from stub_services import StubServer, StubConfig, SERVICES, gnomad_sites, var_citations  # noqa: E402
+from synthetic_vcf import synthetic_clinvar, write_sample  # noqa: E402
+
+STAGES = ("parse", "merge", "annotate", "pdf")
+
+
+def _rss():
+    try:
+        with open("/proc/self/statm") as fh:
+            return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class PeakMemory:
+    """Samples the process RSS on a background thread while the `with` block runs."""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.peak = 0
+
+    def __enter__(self):
+        self.start = _rss()
+        self.peak = self.start
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, _rss())
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, _rss())
+
+
+def run_stage(name, variants, func, report):
+    with PeakMemory() as memory:
+        started = time.perf_counter()
+        result = func()
+        seconds = time.perf_counter() - started
+    report[name] = {"seconds": round(seconds, 3), "variants": variants,
+                    "variants_per_s": round(variants / seconds, 1) if seconds else None,
+                    "peak_rss_mib": round(memory.peak / 2 ** 20, 1),
+                    "rss_growth_mib": round((memory.peak - memory.start) / 2 ** 20, 1)}
+    print(f"{name:<9} {seconds:9.2f} s {report[name]['variants_per_s'] or 0:12.0f} variants/s "
+          f"{report[name]['peak_rss_mib']:9.1f} MiB peak RSS (+{report[name]['rss_growth_mib']:.1f})")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--variants", type=int, default=10_000)
+    parser.add_argument("--match-rate", type=float, default=0.05)
+    parser.add_argument("--format", default="vcf.gz", choices=["vcf", "vcf.gz", "csv"])
+    parser.add_argument("--reference", help="ClinVar source parquet (default: synthetic)")
+    parser.add_argument("--reference-size", type=int, default=100_000)
+    parser.add_argument("--latency-ms", type=float, default=50, help="Mean stub latency for every service")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Stub 503 probability")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Stub 429 probability")
+    parser.add_argument("--gemini-rpm", type=float, default=600)
+    parser.add_argument("--gemini-batch-size", type=int, default=None)
+    parser.add_argument("--gnomad", choices=["api", "local"], default="api",
+                        help="gnomAD from the stub API or from a local gnomAD store with the same values")
+    parser.add_argument("--pubmed", choices=["api", "local"], default="api",
+                        help="PubMed IDs from the stub elink or from a local citation index with the same values")
+    parser.add_argument("--rate-scale", type=float, default=1.0, help="Multiply every API rate limit")
+    parser.add_argument("--min-priority", type=float, default=None,
+                        help="Template variants below this priority score (default: scheduler default)")
+    parser.add_argument("--interpret-all", action="store_true", help="Send every matched variant to Gemini")
+    parser.add_argument("--max-requests", type=int, help="Gemini request budget")
+    parser.add_argument("--max-tokens", type=int, help="Gemini token budget (estimated)")
+    parser.add_argument("--template", default="Summary Report", choices=["Summary Report", "Full Report"])
+    parser.add_argument("--skip", nargs="*", default=[], choices=STAGES, help="Stages to leave out")
+    parser.add_argument("--json", help="Also write the results to this JSON file")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--verbose", action="store_true", help="Keep the pipeline's per-variant log output")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="bench_pipeline_")
+    stub = StubServer(configs={name: StubConfig(args.latency_ms / 1000, args.error_rate, args.throttle_rate)
+                               for name in SERVICES}).start()
+    # Must be in place before the pipeline modules read them at import
+    os.environ.update(stub.env())
+    os.environ["GENETIC_APP_CACHE"] = os.path.join(tmp, "annotation_cache.sqlite3")
+    os.environ["GENETIC_APP_GNOMAD_STORE"] = os.path.join(tmp, "gnomad_store")
+    os.environ["GENETIC_APP_CITATIONS"] = os.path.join(tmp, "citation_index")
+
+    import pandas as pd
+    import tracing
+    from rate_limiter import set_rate_share
+    from clinvar_store import load_clinvar_index
+    from clingen_handler import load_clingen_index
+    from vcf_reader import iter_variant_batches
+    from gemini_handler import GEMINI_BATCH_SIZE
+    from session_results import compact_results
+    from pdf_report_generator import build_report_volumes
+    from scheduler import LOW_PRIORITY_SCORE, TEMPLATE_PREFIX, InterpretationBudget
+    from gnomad_store import build_gnomad_store
+    from citation_index import build_citation_index
+    from pipeline import CLINGEN_PATH, build_services, build_triage, match_variants, interpret_variants
+
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.ERROR)
+    set_rate_share(args.rate_scale)
+    source = args.reference
+    if not source:
+        source = os.path.join(tmp, "clinvar_source.parquet")
+        synthetic_clinvar(args.reference_size, args.seed).to_parquet(source, index=False)
+    reference = load_clinvar_index(os.path.join(tmp, "clinvar_store"), source=source)
+    if args.gnomad == "local":
+        started = time.perf_counter()
+        sites = os.path.join(tmp, "gnomad_sites.csv")
+        variants = pd.read_parquet(source, columns=["CHROM", "POS", "REF", "ALT"]).itertuples(index=False)
+        pd.DataFrame(gnomad_sites(variants), columns=["CHROM", "POS", "REF", "ALT", "Exome_AC", "Exome_AN",
+                                                      "PopMax_AF", "PopMax_Pop"]).to_csv(sites, index=False)
+        build_gnomad_store(sites)
+        print(f"local gnomAD store built in {time.perf_counter() - started:.1f} s")
+    if args.pubmed == "local":
+        started = time.perf_counter()
+        citations = os.path.join(tmp, "var_citations.txt")
+        ids = pd.read_parquet(source, columns=["ID"])["ID"].dropna().astype(int).astype(str)
+        pd.DataFrame(var_citations(ids), columns=["#AlleleID", "VariationID", "citation_source", "citation_id"]
+                     ).to_csv(citations, sep="\t", index=False)
+        build_citation_index(citations)
+        print(f"local citation index built in {time.perf_counter() - started:.1f} s")
+    clingen_index = load_clingen_index(os.path.join(ROOT, CLINGEN_PATH))
+    sample = os.path.join(tmp, f"sample.{args.format}")
+    started = time.perf_counter()
+    expected = write_sample(sample, args.variants, pd.read_parquet(source, columns=["CHROM", "POS", "REF", "ALT"]),
+                            args.match_rate, args.seed)
+    print(f"{args.variants} variants ({expected} in ClinVar), {os.path.getsize(sample) / 2 ** 20:.1f} MiB "
+          f"{args.format}, generated in {time.perf_counter() - started:.1f} s; stub latency {args.latency_ms} ms")
+
+    report = {"config": vars(args)}
+    results_df = None
+    with tracing.trace_run("bench") as run:
+        if "parse" not in args.skip:
+            def parse():
+                with open(sample, "rb") as fh:
+                    return sum(len(batch) for batch in iter_variant_batches(fh))
+            parsed = run_stage("parse", args.variants, parse, report)
+            # The synthetic VCF has IDs starting with '"'; no record may be merged or lost
+            assert parsed == args.variants, f"parsed {parsed} of {args.variants} variants"
+        matched = None
+        if "merge" not in args.skip or "annotate" not in args.skip:
+            def merge():
+                with open(sample, "rb") as fh:
+                    return match_variants(fh, reference, clingen_index)
+            matched = run_stage("merge", args.variants, merge, report)
+            report["merge"]["matched"] = len(matched)
+        if "annotate" not in args.skip and len(matched):
+            batch_size = args.gemini_batch_size or GEMINI_BATCH_SIZE
+            services = build_services("bench-key", None, args.gemini_rpm, batch_size, args.gnomad)
+            budget = InterpretationBudget.from_params({"requests": args.max_requests, "tokens": args.max_tokens},
+                                                      batch_size)
+            min_priority = None if args.interpret_all else (args.min_priority if args.min_priority is not None
+                                                            else LOW_PRIORITY_SCORE)
+            triage = build_triage(budget, min_priority)
+            results = run_stage("annotate", len(matched),
+                                lambda: interpret_variants(matched, services, triage=triage), report)
+            results_df = compact_results(results)
+            interpretations = results_df["Gemini_Interpretation"]
+            report["annotate"]["failed"] = int(interpretations.str.startswith(("❌", "🛑")).sum())
+            report["annotate"]["templated"] = int(interpretations.str.startswith(TEMPLATE_PREFIX).sum())
+            print(f"{'':<9} {report['annotate']['templated']} of {len(matched)} variants templated, "
+                  f"{report['annotate']['failed']} failed")
+        if "pdf" not in args.skip and results_df is not None:
+            options = {"template": args.template, "include_charts": True, "include_detailed_analysis": True}
+            volumes = run_stage("pdf", len(results_df),
+                                lambda: build_report_volumes(results_df, {"id": "BENCH"}, options), report)
+            report["pdf"]["bytes"] = sum(len(data) for _, data in volumes)
+
+    summary = tracing.tracer.summary(run)
+    report["spans"] = summary.to_dict("records")
+    report["stub_requests"] = stub.stats
+    print()
+    print(summary[["stage", "calls", "errors", "p50_ms", "p95_ms", "total_s", "retries", "cache_hits",
+                   "wait_seconds"]].to_string(index=False))
+    print(f"\nstub requests: {stub.stats}")
+    if args.json:
+        with open(args.json, "w") as fh:
+            json.dump(report, fh, indent=2, default=str)
+    stub.shutdown()
+    shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Benchmark for batch PDF rendering.
+
+Renders N patient reports one after another with a fresh GeneticReportGenerator
+each (the old per-report path) and then through report_batch.render_reports on a
+process pool, and reports wall time and per-report latency.
+
+    python benchmarks/bench_report_batch.py --reports 100 --variants 150 --workers 4
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from bench_pdf_report import synthetic_results  # noqa: E402
+from pdf_report_generator import GeneticReportGenerator  # noqa: E402
+from report_batch import render_reports, report_options_for, patient_info_for  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--reports", type=int, default=40)
+    parser.add_argument("--variants", type=int, default=150)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        jobs = []
+        for i in range(args.reports):
+            path = os.path.join(tmp, f"P{i:04d}.parquet")
+            synthetic_results(args.variants, seed=i).to_parquet(path)
+            jobs.append({"report_id": f"P{i:04d}", "results": path, "out_dir": os.path.join(tmp, f"P{i:04d}"),
+                         "patient_info": patient_info_for({"sample_id": f"P{i:04d}"}),
+                         "report_options": report_options_for()})
+        print(f"{args.reports} reports x {args.variants} variants, {args.workers} workers")
+
+        start = time.perf_counter()
+        for job in jobs:
+            df = pd.read_parquet(job["results"])
+            GeneticReportGenerator().generate_report(df, job["patient_info"], os.path.join(tmp, "seq.pdf"),
+                                                     {**job["report_options"], "comment_limit": 20})
+        sequential = time.perf_counter() - start
+        print(f"{'sequential, generator per report':<34} {sequential:8.2f} s")
+
+        start = time.perf_counter()
+        summaries = render_reports(jobs, args.workers)
+        parallel = time.perf_counter() - start
+        latencies = np.array([s["seconds"] for s in summaries])
+        print(f"{'render_reports':<34} {parallel:8.2f} s")
+        print(f"{'per report p50 / p95':<34} {np.percentile(latencies, 50) * 1000:8.0f} / "
+              f"{np.percentile(latencies, 95) * 1000:.0f} ms")
+        print(f"{'failed':<34} {sum(1 for s in summaries if s['error']):8d}")
+
+
+if __name__ == "__main__":
+    main()
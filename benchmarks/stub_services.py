@@ -0,0 +1,202 @@
+"""
+Local stand-ins for the external APIs the pipeline calls, for benchmarks.
+
+One threaded HTTP server answers
+  - NCBI elink         POST /elink          (form-encoded id=... parameters)
+  - gnomAD GraphQL     POST /gnomad         (aliased v0, v1, ... variant queries)
+  - Gemini             POST /v1beta/models/<model>:generateContent   (REST transport)
+with deterministic fake data. Each service has its own latency, error rate and
+429 rate. Point the pipeline at it with the environment variables from `env()`
+(set before the pipeline modules are imported):
+
+    python benchmarks/stub_services.py --port 8765 --latency-ms 80 --throttle-rate 0.02
+"""
+import re
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+from urllib.parse import parse_qsl
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+SERVICES = ("elink", "gnomad", "gemini")
+
+
+class StubConfig:
+    """Behaviour of one stand-in: mean latency (seconds, ±50% uniform jitter), 5xx and 429 probabilities."""
+
+    def __init__(self, latency=0.05, error_rate=0.0, throttle_rate=0.0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+
+
+def _digest(text):
+    return int(hashlib.md5(str(text).encode()).hexdigest()[:8], 16)
+
+
+# --- Fake responses ---
+def _elink_pmids(vid):
+    return [str(30_000_000 + (_digest(f"{vid}:{i}") % 5_000_000)) for i in range(_digest(vid) % 4)]
+
+
+def elink_response(ids):
+    linksets = []
+    for vid in ids:
+        links = _elink_pmids(vid)
+        linkset = {"dbfrom": "clinvar", "ids": [vid]}
+        if links:
+            linkset["linksetdbs"] = [{"dbto": "pubmed", "linkname": "clinvar_pubmed", "links": links}]
+        linksets.append(linkset)
+    return {"header": {"type": "elink"}, "linksets": linksets}
+
+
+def var_citations(ids):
+    """The stub's elink answers for ClinVar variation IDs as var_citations.txt rows (for citation_index.py)."""
+    return [(vid, vid, "PubMed", pmid) for vid in ids for pmid in _elink_pmids(vid)]
+
+
+def _gnomad_exome(vid):
+    h = _digest(vid)
+    if h % 10 == 0:
+        return None  # not in gnomAD
+    an = 250_000 + h % 1000
+    ac = h % 500
+    return {"ac": ac, "an": an, "faf95": {"popmax": round(ac / an, 6), "popmax_population": ("nfe", "afr", "eas")[h % 3]}}
+
+
+def gnomad_response(variables):
+    data = {}
+    for alias, vid in variables.items():
+        exome = _gnomad_exome(vid)
+        data[alias] = exome and {"variant_id": vid, "exome": exome}
+    return {"data": data}
+
+
+def gnomad_sites(variants):
+    """The stub's gnomAD answers for CHROM/POS/REF/ALT rows as a sites extract (for gnomad_store.py)."""
+    rows = []
+    for chrom, pos, ref, alt in variants:
+        exome = _gnomad_exome(f"{chrom}-{pos}-{ref}-{alt}")
+        if exome:
+            rows.append((chrom, pos, ref, alt, exome["ac"], exome["an"], exome["faf95"]["popmax"],
+                         exome["faf95"]["popmax_population"]))
+    return rows
+
+
+def gemini_response(body):
+    prompt = "".join(part.get("text", "")
+                     for content in body.get("contents", []) for part in content.get("parts", []))
+    config = body.get("generationConfig") or body.get("generation_config") or {}
+    ids = re.findall(r"^### Variant (\S+)$", prompt, flags=re.MULTILINE)
+    canned = ("1. Likely pathogenic. 2. Hereditary cancer predisposition. 3. Clinically actionable; "
+              "confirm and offer cascade testing. 4. This change probably affects how the gene works. ") * 3
+    if ids and "json" in str(config.get("responseMimeType") or config.get("response_mime_type") or ""):
+        text = json.dumps({vid: f"{vid}: {canned}" for vid in ids})
+    else:
+        text = canned
+    return {"candidates": [{"content": {"role": "model", "parts": [{"text": text}]}, "finishReason": "STOP",
+                            "index": 0}],
+            "usageMetadata": {"promptTokenCount": len(prompt) // 4, "candidatesTokenCount": len(text) // 4}}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def _send(self, status, payload):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        path = self.path.split("?")[0]
+        if path.startswith("/elink"):
+            service = "elink"
+        elif path.startswith("/gnomad"):
+            service = "gnomad"
+        elif path.endswith(":generateContent"):
+            service = "gemini"
+        else:
+            return self._send(404, {"error": {"code": 404, "message": f"unknown path {path}"}})
+
+        server = self.server
+        config = server.configs[service]
+        rng = random.Random()
+        time.sleep(config.latency * rng.uniform(0.5, 1.5))
+        server.count(service)
+        roll = rng.random()
+        if roll < config.throttle_rate:
+            server.count(f"{service}_429")
+            return self._send(429, {"error": {"code": 429, "message": "Resource has been exhausted",
+                                              "status": "RESOURCE_EXHAUSTED"}})
+        if roll < config.throttle_rate + config.error_rate:
+            server.count(f"{service}_5xx")
+            return self._send(503, {"error": {"code": 503, "message": "Service unavailable", "status": "UNAVAILABLE"}})
+
+        if service == "elink":
+            ids = [v for k, v in parse_qsl(body.decode()) if k == "id"]
+            return self._send(200, elink_response(ids))
+        payload = json.loads(body or b"{}")
+        if service == "gnomad":
+            return self._send(200, gnomad_response(payload.get("variables") or {}))
+        return self._send(200, gemini_response(payload))
+
+
+class StubServer(ThreadingHTTPServer):
+    """The stand-in server; `start()` runs it on a daemon thread, `stats` counts requests per outcome."""
+
+    daemon_threads = True
+
+    def __init__(self, port=0, configs=None):
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.configs = {name: StubConfig() for name in SERVICES}
+        self.configs.update(configs or {})
+        self.stats = {}
+        self._lock = threading.Lock()
+
+    def count(self, key):
+        with self._lock:
+            self.stats[key] = self.stats.get(key, 0) + 1
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def env(self):
+        """Environment variables that route the pipeline's API calls to this server."""
+        return {"NCBI_ELINK_URL": f"{self.url}/elink", "GNOMAD_API_URL": f"{self.url}/gnomad",
+                "GEMINI_API_ENDPOINT": self.url}
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name="stub-services", daemon=True).start()
+        return self
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run local stand-ins for elink, gnomAD and Gemini.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=50, help="Mean latency of every service")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Probability of a 503 response")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Probability of a 429 response")
+    args = parser.parse_args()
+    config = StubConfig(args.latency_ms / 1000, args.error_rate, args.throttle_rate)
+    server = StubServer(args.port, {name: config for name in SERVICES})
+    for key, value in server.env().items():
+        print(f"export {key}={value}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
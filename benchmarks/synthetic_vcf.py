@@ -0,0 +1,126 @@
+"""
+Synthetic inputs for pipeline benchmarks.
+
+  - a ClinVar-like reference (raw VCF columns with GENEINFO/CLNSIG/... INFO) that
+    clinvar_store can build its store from, and
+  - patient VCF/VCF.gz/CSV files of 1k to millions of variants, of which a chosen
+    fraction matches the reference exactly (CHROM, POS, REF, ALT).
+
+Files are written in chunks, so multi-million-variant inputs need little memory.
+
+    python benchmarks/synthetic_vcf.py sample.vcf.gz --variants 1000000 --match-rate 0.02
+"""
+import os
+import gzip
+import argparse
+
+import numpy as np
+import pandas as pd
+
+CHROMS = [str(c) for c in range(1, 23)] + ["X", "Y"]
+GENES = ["BRCA1", "BRCA2", "TP53", "MLH1", "MSH2", "MSH6", "PMS2", "APC", "PTEN", "ATM", "CHEK2", "PALB2",
+         "CFTR", "LDLR", "MYH7", "KCNQ1", "SCN5A", "RYR1", "FBN1", "COL1A1"]
+CLNSIG = ["Pathogenic", "Likely_pathogenic", "Uncertain_significance", "Likely_benign", "Benign",
+          "Conflicting_classifications_of_pathogenicity", "risk_factor"]
+CLNSIG_WEIGHTS = [0.08, 0.07, 0.4, 0.2, 0.15, 0.08, 0.02]
+REVSTAT = ["criteria_provided,_single_submitter", "criteria_provided,_multiple_submitters,_no_conflicts",
+           "reviewed_by_expert_panel", "no_assertion_criteria_provided"]
+BASES = np.array(list("ACGT"))
+WRITE_CHUNK = 500_000
+# Every Nth VCF record has an ID starting with '"'; VCF has no quoting, so readers must take it literally
+QUOTED_EVERY = 1000
+# Reference records on this chromosome carry no RS/CLNVC/CLNHGVS, as on small real-world contigs,
+# so stores must not type columns from one chromosome's data
+SPARSE_CHROM = "Y"
+
+
+def synthetic_clinvar(n_variants, seed=0):
+    """A ClinVar-like reference in the raw VCF layout (CHROM, POS, ID, REF, ALT, QUAL, FILTER, INFO)."""
+    rng = np.random.default_rng(seed)
+    chrom = rng.choice(CHROMS, n_variants)
+    pos = rng.integers(10_000, 150_000_000, n_variants)
+    ref = rng.integers(0, 4, n_variants)
+    alt = (ref + rng.integers(1, 4, n_variants)) % 4
+    gene = rng.choice(GENES, n_variants)
+    clnsig = rng.choice(CLNSIG, n_variants, p=CLNSIG_WEIGHTS)
+    revstat = rng.choice(REVSTAT, n_variants)
+    ids = np.arange(100_000, 100_000 + n_variants)
+    info = [f"GENEINFO={g}:{1000 + i % 9000};CLNSIG={s};CLNDN=Hereditary_{g}_related_disorder;"
+            + ("" if c == SPARSE_CHROM else
+               f"RS={i};CLNVC=single_nucleotide_variant;CLNHGVS=NC_0000{c}.11:g.{p}{BASES[r]}>{BASES[a]};")
+            + f"CLNREVSTAT={rv}"
+            for i, g, s, c, p, r, a, rv in zip(ids, gene, clnsig, chrom, pos, ref, alt, revstat)]
+    return pd.DataFrame({"CHROM": chrom, "POS": pos, "ID": ids, "REF": BASES[ref], "ALT": BASES[alt],
+                         "QUAL": ".", "FILTER": ".", "INFO": info})
+
+
+def _chunk(reference, n, match_rate, rng):
+    matched = rng.random(n) < match_rate
+    n_matched = int(matched.sum())
+    chrom = rng.choice(CHROMS, n).astype(object)
+    # Positions beyond the synthetic reference's range, so unmatched rows do not collide with it by chance
+    pos = rng.integers(160_000_000, 240_000_000, n)
+    ref = rng.integers(0, 4, n)
+    ref_base, alt_base = BASES[ref], BASES[(ref + rng.integers(1, 4, n)) % 4]
+    if n_matched:
+        picks = reference.iloc[rng.integers(0, len(reference), n_matched)]
+        chrom[matched] = picks["CHROM"].astype(str).to_numpy()
+        pos[matched] = picks["POS"].to_numpy()
+        ref_base[matched] = picks["REF"].astype(str).to_numpy()
+        alt_base[matched] = picks["ALT"].astype(str).to_numpy()
+    return pd.DataFrame({"CHROM": chrom, "POS": pos, "REF": ref_base, "ALT": alt_base}), n_matched
+
+
+def write_sample(path, n_variants, reference, match_rate=0.05, seed=0, chunk_size=WRITE_CHUNK):
+    """
+    Writes a patient file of `n_variants` to `path` (.vcf, .vcf.gz or .csv); about
+    `match_rate` of them are drawn from `reference`. Returns the number of matching rows.
+    """
+    rng = np.random.default_rng(seed)
+    is_csv = path.endswith(".csv")
+    matched = 0
+    with (gzip.open(path, "wt", compresslevel=3) if path.endswith(".gz") else open(path, "w")) as fh:
+        if is_csv:
+            fh.write("CHROM,POS,REF,ALT\n")
+        else:
+            fh.write("##fileformat=VCFv4.2\n##source=synthetic_vcf.py\n")
+            fh.write("#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n")
+        for start in range(0, n_variants, chunk_size):
+            df, n_matched = _chunk(reference, min(chunk_size, n_variants - start), match_rate, rng)
+            matched += n_matched
+            if is_csv:
+                df.to_csv(fh, header=False, index=False)
+            else:
+                quoted = (np.arange(start, start + len(df)) % QUOTED_EVERY) == QUOTED_EVERY - 1
+                df.insert(2, "ID", np.where(quoted, '"rs' + df["POS"].astype(str), "."))
+                df["QUAL"], df["FILTER"], df["INFO"] = "50", "PASS", "DP=30"
+                # Written as plain tab-joined lines: to_csv would wrap the '"' fields in quotes
+                fh.write("\n".join(df.astype(str).agg("\t".join, axis=1)) + "\n")
+    return matched
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a synthetic patient VCF/CSV (and optionally a reference).")
+    parser.add_argument("out", help="Output file: .vcf, .vcf.gz or .csv")
+    parser.add_argument("--variants", type=int, default=10_000)
+    parser.add_argument("--match-rate", type=float, default=0.05, help="Fraction of variants found in ClinVar")
+    parser.add_argument("--reference", help="ClinVar source parquet to draw matches from "
+                                            "(default: a synthetic one, see --reference-out)")
+    parser.add_argument("--reference-size", type=int, default=100_000)
+    parser.add_argument("--reference-out", help="Also write the synthetic reference to this parquet file")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.reference:
+        reference = pd.read_parquet(args.reference, columns=["CHROM", "POS", "REF", "ALT"])
+    else:
+        reference = synthetic_clinvar(args.reference_size, args.seed)
+        if args.reference_out:
+            reference.to_parquet(args.reference_out, index=False)
+    matched = write_sample(args.out, args.variants, reference, args.match_rate, args.seed)
+    print(f"{args.out}: {args.variants} variants, {matched} in the reference "
+          f"({os.path.getsize(args.out) / 2 ** 20:.1f} MiB)")
+
+
+if __name__ == "__main__":
+    main()
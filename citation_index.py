@@ -0,0 +1,107 @@
+import os
+import logging
+import argparse
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CITATION_INDEX_DIR = os.environ.get("GENETIC_APP_CITATIONS", "citation_index")
+# NCBI's bulk export: ftp.ncbi.nlm.nih.gov/pub/clinvar/tab_delimited/var_citations.txt
+DEFAULT_CITATIONS_SOURCE = "var_citations.txt"
+BUILD_CHUNK_SIZE = 500_000
+
+_ARRAYS = ("variation_ids", "offsets", "pmids")
+
+
+def _array_path(index_dir, name):
+    return os.path.join(index_dir, f"{name}.npy")
+
+
+# --- Build Step ---
+def _iter_pubmed_citations(source, chunksize=BUILD_CHUNK_SIZE):
+    """Streams (VariationID, PMID) int64 pairs of the PubMed citations in var_citations.txt(.gz)."""
+    for chunk in pd.read_csv(source, sep="\t", dtype=str, chunksize=chunksize,
+                             usecols=lambda c: c.lstrip("#") in ("VariationID", "citation_source", "citation_id")):
+        chunk.columns = [c.lstrip("#") for c in chunk.columns]
+        chunk = chunk[chunk["citation_source"].str.strip().str.lower() == "pubmed"]
+        ids = pd.to_numeric(chunk["VariationID"], errors="coerce")
+        pmids = pd.to_numeric(chunk["citation_id"], errors="coerce")
+        keep = ids.notna() & pmids.notna()
+        yield ids[keep].to_numpy(dtype=np.int64), pmids[keep].to_numpy(dtype=np.int64)
+
+
+def build_citation_index(source=DEFAULT_CITATIONS_SOURCE, index_dir=DEFAULT_CITATION_INDEX_DIR):
+    """
+    Converts ClinVar's var_citations.txt into a compact citation index: the sorted,
+    unique variation IDs, an offsets array and all PubMed IDs grouped by variation
+    (CSR layout), stored as three .npy files. Non-PubMed citations (PMC, NCBI
+    Bookshelf) and duplicate rows are dropped.
+    """
+    pairs = list(_iter_pubmed_citations(source))
+    ids = np.concatenate([p[0] for p in pairs]) if pairs else np.empty(0, dtype=np.int64)
+    pmids = np.concatenate([p[1] for p in pairs]) if pairs else np.empty(0, dtype=np.int64)
+    # Sort by (variation ID, PMID) and drop repeated citations
+    order = np.lexsort((pmids, ids))
+    ids, pmids = ids[order], pmids[order]
+    unique = np.ones(len(ids), dtype=bool)
+    unique[1:] = (ids[1:] != ids[:-1]) | (pmids[1:] != pmids[:-1])
+    ids, pmids = ids[unique], pmids[unique]
+    variation_ids, starts = np.unique(ids, return_index=True)
+    offsets = np.append(starts, len(ids)).astype(np.int64)
+
+    os.makedirs(index_dir, exist_ok=True)
+    for name, values in zip(_ARRAYS, (variation_ids, offsets, pmids)):
+        np.save(_array_path(index_dir, name), values)
+    logger.info(f"Citation index built in {index_dir}: {len(pmids)} PubMed citations "
+                f"for {len(variation_ids)} ClinVar variations")
+    return index_dir
+
+
+# --- Lookups ---
+class CitationIndex:
+    """
+    ClinVar variation ID -> PubMed IDs, memory-mapped. IDs are found with one
+    vectorized binary search per batch, so answering a whole upload takes
+    milliseconds and needs no network access.
+    """
+
+    def __init__(self, index_dir=DEFAULT_CITATION_INDEX_DIR):
+        self.index_dir = index_dir
+        try:
+            self.variation_ids, self.offsets, self.pmids = (np.load(_array_path(index_dir, name), mmap_mode="r")
+                                                            for name in _ARRAYS)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"No citation index found in {index_dir}") from None
+        if len(self.offsets) != len(self.variation_ids) + 1:
+            raise ValueError(f"Citation index in {index_dir} is incomplete; rebuild it")
+
+    def __len__(self):
+        return len(self.variation_ids)
+
+    def get_many(self, variation_ids):
+        """
+        {variation_id: [pmid, ...]} (PMIDs as strings, like elink) for the IDs that
+        are in the index. IDs without any PubMed citation in the source file are left out.
+        """
+        keys = [str(v) for v in variation_ids]
+        if not keys or not len(self.variation_ids):
+            return {}
+        query = pd.to_numeric(pd.Series(keys, dtype=object), errors="coerce").fillna(-1).to_numpy(dtype=np.int64)
+        slots = np.searchsorted(self.variation_ids, query).clip(max=len(self.variation_ids) - 1)
+        found = np.asarray(self.variation_ids[slots]) == query
+        results = {}
+        for key, slot in zip(np.asarray(keys, dtype=object)[found], slots[found]):
+            results[key] = [str(p) for p in self.pmids[self.offsets[slot]:self.offsets[slot + 1]]]
+        return results
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Build the local ClinVar -> PubMed citation index.")
+    parser.add_argument("--source", default=DEFAULT_CITATIONS_SOURCE,
+                        help="ClinVar var_citations.txt (or .txt.gz) from NCBI's tab_delimited downloads")
+    parser.add_argument("--out", default=DEFAULT_CITATION_INDEX_DIR, help="Output directory")
+    args = parser.parse_args()
+    build_citation_index(args.source, args.out)
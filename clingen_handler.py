@@ -1,18 +1,75 @@
+import functools
+from collections import namedtuple
+
 import pandas as pd
 
+# Strongest first; unknown labels sort after all of these
+CLASSIFICATION_RANK = {
+    "Definitive": 0,
+    "Strong": 1,
+    "Moderate": 2,
+    "Limited": 3,
+    "Disputed": 4,
+    "Refuted": 5,
+    "No Known Disease Relationship": 6,
+}
+
+ClinGenRecord = namedtuple("ClinGenRecord", ["disease", "moi", "classification", "date"])
+
 def load_clingen_validity(path="Clingen-Gene-Disease-Summary-2025-07-01.csv"):
     try:
-        df_raw = pd.read_csv(path, header=None)
-        df = df_raw.iloc[5:]  # Data starts from 6th row
-        df.columns = df_raw.iloc[4]  # Get actual headers from 5th row
-        df = df[["GENE SYMBOL", "DISEASE LABEL", "CLASSIFICATION"]].dropna()
-        return df
+        # Rows 1-4 are the file banner, row 6 is a "+++" separator under the header
+        df = pd.read_csv(
+            path,
+            skiprows=[0, 1, 2, 3, 5],
+            usecols=["GENE SYMBOL", "DISEASE LABEL", "MOI", "CLASSIFICATION", "CLASSIFICATION DATE"],
+            dtype=str,
+        )
+        return df.dropna(subset=["GENE SYMBOL", "DISEASE LABEL", "CLASSIFICATION"])
     except Exception as e:
         print("ClinGen file could not be read:", e)
         return pd.DataFrame()
 
-def get_clingen_classification(gene_symbol, df_clingen):
-    gene_row = df_clingen[df_clingen["GENE SYMBOL"] == gene_symbol]
-    if not gene_row.empty:
-        return gene_row.iloc[0]["CLASSIFICATION"]
-    return "None"
\ No newline at end of file
+def format_clingen_records(records):
+    return "; ".join(f"{r.disease} ({r.moi}): {r.classification}" for r in records)
+
+@functools.lru_cache(maxsize=None)
+def load_clingen_index(path="Clingen-Gene-Disease-Summary-2025-07-01.csv"):
+    """
+    Parses the ClinGen summary once per process into a gene-symbol index with
+    ClinGen_Validity (strongest classification), ClinGen_Diseases (all disease
+    classifications as text) and ClinGen_Records (tuple of ClinGenRecord sorted
+    strongest first, then most recent date).
+    """
+    columns = ["ClinGen_Validity", "ClinGen_Diseases", "ClinGen_Records"]
+    df = load_clingen_validity(path)
+    if df.empty:
+        return pd.DataFrame(columns=columns)
+    df = df.assign(
+        _rank=df["CLASSIFICATION"].map(CLASSIFICATION_RANK).fillna(len(CLASSIFICATION_RANK)),
+        _date=df["CLASSIFICATION DATE"].str[:10].fillna(""),
+    ).sort_values(["GENE SYMBOL", "_rank", "_date"], ascending=[True, True, False])
+    grouped = {}
+    for gene, disease, moi, classification, date in zip(
+        df["GENE SYMBOL"], df["DISEASE LABEL"], df["MOI"], df["CLASSIFICATION"], df["_date"]
+    ):
+        grouped.setdefault(gene, []).append(ClinGenRecord(disease, moi, classification, date))
+    return pd.DataFrame.from_dict(
+        {gene: (records[0].classification, format_clingen_records(records), tuple(records))
+         for gene, records in grouped.items()},
+        orient="index", columns=columns,
+    )
+
+def get_clingen_classification(gene_symbol, clingen_index):
+    """Returns the strongest ClinGen classification for a gene, or "None"."""
+    return clingen_index["ClinGen_Validity"].get(gene_symbol, "None")
+
+def map_clingen_validity(genes, clingen_index):
+    """
+    Vectorized ClinGen lookup over a GENE column. Returns ClinGen_Validity and
+    ClinGen_Diseases aligned to `genes`; genes without a curation get "None" / "".
+    """
+    return pd.DataFrame({
+        "ClinGen_Validity": genes.map(clingen_index["ClinGen_Validity"]).fillna("None"),
+        "ClinGen_Diseases": genes.map(clingen_index["ClinGen_Diseases"]).fillna(""),
+    }, index=genes.index)
@@ -1,8 +1,14 @@
+import os
+import numpy as np
 import pandas as pd
 import re
 import requests
 import logging
 import urllib.parse
+from concurrent.futures import ProcessPoolExecutor
+from requests.adapters import HTTPAdapter
+
+import tracing
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
@@ -46,34 +52,129 @@ def extract_clnrevstat(info_str):
 
 
 # --- ClinVar Data Enrichment ---
-def enrich_clinvar_df(df):
-    df["GENE"] = df["INFO"].apply(extract_gene)
-    df["CLNSIG"] = df["INFO"].apply(extract_clnsig)
-    df["DISEASE"] = df["INFO"].apply(extract_disease)
-    df["RS"] = df["INFO"].apply(extract_rs)
-    df["CLNVC"] = df["INFO"].apply(extract_clnvc)
-    df["CLNHGVS"] = df["INFO"].apply(extract_clnhgvs)
-    df["CLNREVSTAT"] = df["INFO"].apply(extract_clnrevstat)
+INFO_KEYS = ("GENEINFO", "CLNSIG", "CLNDN", "RS", "CLNVC", "CLNHGVS", "CLNREVSTAT")
+INFO_CHUNK_SIZE = 100_000
+PARALLEL_MIN_ROWS = 500_000
+
+def _split_info_chunk(infos):
+    """Splits each INFO string once into key=value pairs and keeps the ClinVar keys."""
+    rows = []
+    for info in infos:
+        if not isinstance(info, str):
+            rows.append((None,) * len(INFO_KEYS))
+            continue
+        fields = dict(kv.split("=", 1) for kv in info.split(";") if "=" in kv)
+        rows.append(tuple(fields.get(k) or None for k in INFO_KEYS))
+    return rows
+
+def _split_info_column(info, workers=None):
+    values = info.tolist()
+    workers = workers or os.cpu_count() or 1
+    if len(values) < PARALLEL_MIN_ROWS or workers == 1:
+        return _split_info_chunk(values)
+    chunks = [values[i:i + INFO_CHUNK_SIZE] for i in range(0, len(values), INFO_CHUNK_SIZE)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return [row for part in pool.map(_split_info_chunk, chunks) for row in part]
+
+def enrich_clinvar_df(df, workers=None):
+    """
+    Extracts GENE, CLNSIG, DISEASE, RS, CLNVC, CLNHGVS and CLNREVSTAT from INFO in a
+    single pass. Large frames are split into chunks and parsed in a process pool.
+    """
+    raw = pd.DataFrame(_split_info_column(df["INFO"], workers), columns=INFO_KEYS, index=df.index, dtype=object)
+    df["GENE"] = raw["GENEINFO"].str.extract(r'^([A-Z0-9\-]+)', expand=False)
+    df["CLNSIG"] = raw["CLNSIG"]
+    df["DISEASE"] = raw["CLNDN"].str.replace("_", " ", regex=False)
+    df["RS"] = raw["RS"].str.extract(r'^([0-9]+)', expand=False)
+    df["CLNVC"] = raw["CLNVC"]
+    df["CLNHGVS"] = raw["CLNHGVS"]
+    df["CLNREVSTAT"] = raw["CLNREVSTAT"].str.replace("_", " ", regex=False)
     return df
 
 
+# --- Clinical Significance Priority ---
+# Most clinically significant first; a CLNSIG gets the rank of the first pattern it matches
+CLNSIG_PRIORITY = (
+    (r'^pathogenic', 0),
+    (r'likely_pathogenic', 1),
+    (r'conflicting', 2),
+    (r'uncertain', 3),
+    (r'likely_benign', 5),
+    (r'benign', 6),
+)
+CLNSIG_OTHER_RANK = 4   # risk factor, drug response, association, ...
+CLNSIG_MISSING_RANK = 7
+
+def clnsig_priority(clnsig):
+    """Vectorized CLNSIG -> rank (0 = Pathogenic ... 6 = Benign, 7 = missing)."""
+    sig = clnsig.astype(object).fillna("").astype(str).str.lower().str.replace(" ", "_", regex=False)
+    ranks = np.select([sig.str.contains(pattern, regex=True) for pattern, _ in CLNSIG_PRIORITY],
+                      [rank for _, rank in CLNSIG_PRIORITY], default=CLNSIG_OTHER_RANK)
+    return pd.Series(np.where(sig == "", CLNSIG_MISSING_RANK, ranks), index=clnsig.index)
+
+
 # --- gnomAD Link Generator ---
+_URL_SAFE_ALLELE = r'[A-Za-z0-9_.\-~/]*'
+
+def _quote_alleles(alleles):
+    needs_quoting = ~alleles.str.fullmatch(_URL_SAFE_ALLELE, na=True)
+    if needs_quoting.any():
+        alleles = alleles.copy()
+        alleles[needs_quoting] = alleles[needs_quoting].map(urllib.parse.quote)
+    return alleles
+
 def add_gnomad_links(df, genome_build="GRCh37"):
-    def build_url(row):
-        chrom = str(row['CHROM']).replace("chr", "").strip()
-        pos = int(row['POS'])
-        ref = row['REF'].strip()
-        alt = row['ALT'].strip()
-        if not chrom or not ref or not alt:
-            return None
-        ds = "gnomad_r2_1" if genome_build == "GRCh37" else "gnomad_r4"
-        return f"https://gnomad.broadinstitute.org/variant/{chrom}-{pos}-{urllib.parse.quote(ref)}-{urllib.parse.quote(alt)}?dataset={ds}"
-
-    df["gnomAD_Link"] = df.apply(build_url, axis=1)
+    chrom = df["CHROM"].astype(str).str.replace("chr", "", regex=False).str.strip()
+    pos = df["POS"].astype("int64").astype(str)
+    ref = df["REF"].str.strip()
+    alt = df["ALT"].str.strip()
+    ds = "gnomad_r2_1" if genome_build == "GRCh37" else "gnomad_r4"
+    urls = ("https://gnomad.broadinstitute.org/variant/" + chrom + "-" + pos + "-"
+            + _quote_alleles(ref) + "-" + _quote_alleles(alt) + f"?dataset={ds}")
+    valid = (chrom != "") & ref.fillna("").ne("") & alt.fillna("").ne("")
+    df["gnomAD_Link"] = urls.astype(object).where(valid, None)
     return df
 
 
 # --- gnomAD GraphQL API Handler ---
+GNOMAD_API_URL = os.environ.get("GNOMAD_API_URL", "https://gnomad.broadinstitute.org/api")
+GNOMAD_BATCH_SIZE = 50
+
+_VARIANT_FIELDS = """
+        exome {
+          ac
+          an
+          faf95 { popmax popmax_population }
+        }
+"""
+
+_session = None
+
+def gnomad_session():
+    """Process-wide requests.Session with keep-alive connection pooling for the gnomAD API."""
+    global _session
+    if _session is None:
+        session = requests.Session()
+        session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
+        _session = session
+    return _session
+
+def _parse_gnomad_variant(data, vid):
+    if data is None:
+        # The variant is not in gnomAD: a definitive answer, cached briefly (annotation_cache.NEGATIVE_TTL)
+        logger.warning(f"No data returned for gnomAD variant {vid}")
+        return {'error': 'No data returned', 'not_found': True}
+
+    ex = data.get("exome") or {}
+    faf = ex.get("faf95") or {}
+
+    return {
+        "Exome_AC": ex.get("ac"),
+        "Exome_AN": ex.get("an"),
+        "PopMax_AF": faf.get("popmax"),
+        "PopMax_Pop": faf.get("popmax_population"),
+    }
+
 def fetch_gnomad_simple(chrom, pos, ref, alt, genome_build="GRCh38"):
     """
     Fetches exome AC/AN and popmax AF via GraphQL using CHROM, POS, REF, ALT information.
@@ -84,38 +185,17 @@ def fetch_gnomad_simple(chrom, pos, ref, alt, genome_build="GRCh38"):
       "PopMax_Pop": str
     } or {'error': str} if error/missing data
     """
-    url = "https://gnomad.broadinstitute.org/api"
     query = """
     query ($variantId: String!) {
-      variant(variantId: $variantId, dataset: gnomad_r4) {
-        exome {
-          ac
-          an
-          faf95 { popmax popmax_population }
-        }
-      }
+      variant(variantId: $variantId, dataset: gnomad_r4) {""" + _VARIANT_FIELDS + """      }
     }
     """
     vid = f"{chrom}-{pos}-{ref}-{alt}"
 
     try:
-        resp = requests.post(url, json={"query": query, "variables": {"variantId": vid}}, timeout=20)
+        resp = gnomad_session().post(GNOMAD_API_URL, json={"query": query, "variables": {"variantId": vid}}, timeout=20)
         resp.raise_for_status()
-        data = resp.json().get("data", {}).get("variant")
-
-        if data is None:
-            logger.warning(f"No data returned for gnomAD variant {vid}")
-            return {'error': 'No data returned'}
-
-        ex = data.get("exome", {})
-        faf = ex.get("faf95") or {}
-
-        return {
-            "Exome_AC": ex.get("ac"),
-            "Exome_AN": ex.get("an"),
-            "PopMax_AF": faf.get("popmax"),
-            "PopMax_Pop": faf.get("popmax_population"),
-        }
+        return _parse_gnomad_variant((resp.json().get("data") or {}).get("variant"), vid)
 
     except requests.exceptions.RequestException as req_err:
         logger.error(f"HTTP error fetching gnomAD stats for {vid}: {req_err}")
@@ -127,4 +207,49 @@ def fetch_gnomad_simple(chrom, pos, ref, alt, genome_build="GRCh38"):
 
     except Exception as e:
         logger.error(f"Unexpected error in gnomAD handler for {vid}: {e}")
-        return {'error': f"Unexpected error: {e}"}
\ No newline at end of file
+        return {'error': f"Unexpected error: {e}"}
+
+def _post_gnomad_batch(vids):
+    """Sends one aliased GraphQL query (v0, v1, ...) for all variant IDs; raises on HTTP/JSON errors."""
+    declarations = ", ".join(f"$v{i}: String!" for i in range(len(vids)))
+    fields = "".join(
+        f"  v{i}: variant(variantId: $v{i}, dataset: gnomad_r4) {{{_VARIANT_FIELDS}  }}\n" for i in range(len(vids))
+    )
+    query = f"query ({declarations}) {{\n{fields}}}"
+    variables = {f"v{i}": vid for i, vid in enumerate(vids)}
+    resp = gnomad_session().post(GNOMAD_API_URL, json={"query": query, "variables": variables}, timeout=30)
+    tracing.add(bytes=len(resp.content))
+    resp.raise_for_status()
+    data = resp.json().get("data")
+    if data is None:
+        # Whole-query failure (e.g. complexity limit) rather than per-variant misses
+        raise ValueError(f"gnomAD returned no data: {resp.json().get('errors')}")
+    return [_parse_gnomad_variant(data.get(f"v{i}"), vid) for i, vid in enumerate(vids)]
+
+def fetch_gnomad_batch(variants, batch_size=GNOMAD_BATCH_SIZE, genome_build="GRCh38", limiter=None):
+    """
+    Fetches gnomAD stats for many (chrom, pos, ref, alt) tuples, packing up to
+    `batch_size` variants into one aliased GraphQL request over a pooled session.
+    A failing batch is retried as two halves down to single variants, so one bad
+    variant or an overloaded server only costs extra round trips for that slice.
+    Returns one result per input, in order, each in the fetch_gnomad_simple shape.
+    """
+    vids = [f"{chrom}-{pos}-{ref}-{alt}" for chrom, pos, ref, alt in variants]
+    results = []
+    for start in range(0, len(vids), batch_size):
+        results.extend(_fetch_gnomad_slice(vids[start:start + batch_size], limiter))
+    return results
+
+def _fetch_gnomad_slice(vids, limiter):
+    if limiter is not None:
+        limiter.acquire()
+    try:
+        return _post_gnomad_batch(vids)
+    except (requests.exceptions.RequestException, ValueError) as err:
+        if len(vids) == 1:
+            logger.error(f"Error fetching gnomAD stats for {vids[0]}: {err}")
+            return [{'error': f"HTTP error: {err}"}]
+        logger.warning(f"gnomAD batch of {len(vids)} failed, retrying in halves: {err}")
+        tracing.add(retries=2)
+        mid = len(vids) // 2
+        return _fetch_gnomad_slice(vids[:mid], limiter) + _fetch_gnomad_slice(vids[mid:], limiter)
@@ -0,0 +1,263 @@
+import os
+import glob
+import logging
+import argparse
+import functools
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from clinvar_parser import enrich_clinvar_df, add_gnomad_links
+from vcf_reader import iter_vcf_batches
+from variant_keys import VariantIndex, encode_chrom, encode_locus, frame_variant_keys
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SOURCE = "sampled_100.parquet"
+DEFAULT_STORE_DIR = "clinvar_store"
+DEFAULT_DATASET_DIR = "clinvar_dataset"
+# Precomputed variant key column of the store (variant_keys.frame_variant_keys), not part of the records
+KEY_COLUMN = "_variant_key"
+# Rows per Parquet row group; each row group is one position bucket of a chromosome
+DATASET_ROW_GROUP_SIZE = 10_000
+# Fixed schema of the full-scale dataset, so every batch of a chromosome writes the same
+# types even when a column is entirely missing in that batch
+DATASET_SCHEMA = pa.schema([("CHROM", pa.string()), ("POS", pa.int64()), ("REF", pa.string()),
+                            ("ALT", pa.string()), ("ID", pa.int64())]
+                           + [(col, pa.string()) for col in ("GENE", "CLNSIG", "DISEASE", "RS", "CLNVC", "CLNHGVS",
+                                                             "CLNREVSTAT", "gnomAD_Link")])
+
+
+def _partition_path(store_dir, chrom):
+    safe = str(chrom).replace(os.sep, "_")
+    return os.path.join(store_dir, f"chr_{safe}.arrow")
+
+
+# --- Build Step ---
+def _store_schema(df):
+    """
+    One schema for every partition of the store: DATASET_SCHEMA, any other source
+    columns (typed from the whole source, string when entirely missing) and the key.
+    A partition's own data cannot decide it: a field missing on a small chromosome
+    would be typed null there.
+    """
+    fields = []
+    for col in df.columns:
+        if col in DATASET_SCHEMA.names:
+            fields.append(DATASET_SCHEMA.field(col))
+            continue
+        field = pa.Schema.from_pandas(df[[col]], preserve_index=False).field(col)
+        fields.append(field.with_type(pa.string()) if pa.types.is_null(field.type) else field)
+    return pa.schema(fields + [(KEY_COLUMN, pa.int64())])
+
+
+def build_clinvar_store(source=DEFAULT_SOURCE, store_dir=DEFAULT_STORE_DIR, genome_build="GRCh38"):
+    """
+    Converts a raw ClinVar parquet file into the precompiled reference store:
+    INFO fields are extracted once, gnomAD links are prebuilt, the raw INFO string
+    is dropped and one uncompressed Arrow IPC file is written per chromosome so it
+    can be memory-mapped at load time, together with each record's variant key.
+    """
+    df = enrich_clinvar_df(pd.read_parquet(source))
+    df = add_gnomad_links(df, genome_build=genome_build)
+    df = df.drop(columns=["INFO"])
+    df["CHROM"] = df["CHROM"].astype(str)
+    df["POS"] = df["POS"].astype("int64")
+    df["ID"] = pd.to_numeric(df["ID"], errors="coerce").astype("Int64")
+    schema = _store_schema(df)
+
+    os.makedirs(store_dir, exist_ok=True)
+    for old in glob.glob(os.path.join(store_dir, "chr_*.arrow")):
+        os.remove(old)
+    for chrom, part in df.groupby("CHROM", sort=False):
+        part = part.sort_values("POS")
+        part[KEY_COLUMN] = frame_variant_keys(part)
+        table = pa.Table.from_pandas(part[schema.names], schema=schema, preserve_index=False)
+        with pa.OSFile(_partition_path(store_dir, chrom), "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+    logger.info(f"ClinVar store built in {store_dir}: {len(df)} records")
+    return store_dir
+
+
+# --- Loading ---
+@functools.lru_cache(maxsize=None)
+def open_clinvar_store(store_dir=DEFAULT_STORE_DIR):
+    """
+    Opens every chromosome partition memory-mapped and returns {chrom: pyarrow.Table}.
+    Cached per process, so the files are mapped once and shared by all callers.
+    """
+    partitions = {}
+    for path in sorted(glob.glob(os.path.join(store_dir, "chr_*.arrow"))):
+        table = pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+        if table.num_rows:
+            partitions[table.column("CHROM")[0].as_py()] = table
+    if not partitions:
+        raise FileNotFoundError(f"No ClinVar store found in {store_dir}")
+    return partitions
+
+
+def _store_tables(store_dir, source, chroms):
+    try:
+        partitions = open_clinvar_store(store_dir)
+    except FileNotFoundError:
+        build_clinvar_store(source, store_dir)
+        open_clinvar_store.cache_clear()
+        partitions = open_clinvar_store(store_dir)
+    tables = [t for c, t in partitions.items() if chroms is None or c in chroms]
+    # Stores written before the fixed schema may type a column null in some partitions
+    return pa.concat_tables(tables, promote_options="default") if tables else next(iter(partitions.values())).schema.empty_table()
+
+
+def load_clinvar_df(store_dir=DEFAULT_STORE_DIR, source=DEFAULT_SOURCE, chroms=None):
+    """
+    Returns the precompiled ClinVar reference as a DataFrame, building the store
+    from `source` first if it does not exist yet. `chroms` restricts the load to
+    the given chromosome partitions. Columns are Arrow-backed views of the
+    memory-mapped store, so records are only paged in when they are read.
+    """
+    table = _store_tables(store_dir, source, chroms)
+    if KEY_COLUMN in table.column_names:
+        table = table.drop_columns([KEY_COLUMN])
+    return table.to_pandas(types_mapper=pd.ArrowDtype)
+
+
+def load_clinvar_index(store_dir=DEFAULT_STORE_DIR, source=DEFAULT_SOURCE, chroms=None):
+    """
+    VariantIndex over the precompiled store, built from its stored variant keys
+    (computed here only for stores built without them). Nothing but the keys is
+    copied out of the memory-mapped files.
+    """
+    table = _store_tables(store_dir, source, chroms)
+    keys = None
+    if KEY_COLUMN in table.column_names:
+        keys = table.column(KEY_COLUMN).to_numpy()
+        table = table.drop_columns([KEY_COLUMN])
+    return VariantIndex(table.to_pandas(types_mapper=pd.ArrowDtype), keys=keys)
+
+
+# --- Full-Scale Dataset ---
+def _prepare_vcf_batch(batch, genome_build):
+    batch = enrich_clinvar_df(batch)
+    batch = add_gnomad_links(batch, genome_build=genome_build).drop(columns=["INFO"])
+    batch["ID"] = pd.to_numeric(batch["ID"], errors="coerce").astype("Int64")
+    for col in DATASET_SCHEMA.names:
+        if col not in batch:
+            batch[col] = None
+    return batch[DATASET_SCHEMA.names]
+
+
+def _sort_dataset_file(path, row_group_size):
+    """Second pass for a chromosome whose records did not arrive in position order."""
+    table = pq.read_table(path)
+    table = table.take(pc.sort_indices(table, sort_keys=[("POS", "ascending")]))
+    with pq.ParquetWriter(path, DATASET_SCHEMA, compression="zstd") as writer:
+        writer.write_table(table, row_group_size=row_group_size)
+
+
+def build_clinvar_dataset(vcf_path, out_dir=DEFAULT_DATASET_DIR, genome_build="GRCh38",
+                          row_group_size=DATASET_ROW_GROUP_SIZE):
+    """
+    Streams the full ClinVar VCF into one Parquet file per chromosome, sorted by
+    POS and written in fixed-size row groups, so each row group covers one
+    position bucket and carries min/max POS statistics for pushdown.
+    Only one batch of records is held in memory at a time; a chromosome whose
+    records are not in position order (unsorted input) is re-sorted at the end.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    for old in glob.glob(os.path.join(out_dir, "chr_*.parquet")):
+        os.remove(old)
+    writers = {}
+    last_pos = {}
+    unsorted = set()
+    total = 0
+    try:
+        with open(vcf_path, "rb") as fh:
+            for batch in iter_vcf_batches(fh, split_multiallelic=False, extra_columns=("ID", "INFO")):
+                batch = _prepare_vcf_batch(batch, genome_build)
+                total += len(batch)
+                for chrom, part in batch.groupby("CHROM", sort=False):
+                    part = part.sort_values("POS", kind="stable")
+                    table = pa.Table.from_pandas(part, schema=DATASET_SCHEMA, preserve_index=False)
+                    writer = writers.get(chrom)
+                    if writer is None:
+                        path = os.path.join(out_dir, f"chr_{chrom}.parquet")
+                        writer = writers[chrom] = pq.ParquetWriter(path, DATASET_SCHEMA, compression="zstd")
+                    if part["POS"].iloc[0] < last_pos.get(chrom, -1):
+                        unsorted.add(chrom)
+                    last_pos[chrom] = max(last_pos.get(chrom, -1), int(part["POS"].iloc[-1]))
+                    writer.write_table(table, row_group_size=row_group_size)
+    finally:
+        for writer in writers.values():
+            writer.close()
+    for chrom in unsorted:
+        logger.info(f"ClinVar dataset: sorting chromosome {chrom}")
+        _sort_dataset_file(os.path.join(out_dir, f"chr_{chrom}.parquet"), row_group_size)
+    logger.info(f"ClinVar dataset built in {out_dir}: {total} records in {len(writers)} chromosomes")
+    return out_dir
+
+
+class ClinVarDataset:
+    """
+    Chromosome- and position-bucketed ClinVar Parquet dataset. On open only the
+    footers are read, giving a small in-memory position index (min/max POS of every
+    row group). A join reads just the row groups that can contain an uploaded
+    position, so I/O scales with the upload rather than with ClinVar.
+    """
+
+    def __init__(self, dataset_dir=DEFAULT_DATASET_DIR):
+        self.files = {}
+        for path in sorted(glob.glob(os.path.join(dataset_dir, "chr_*.parquet"))):
+            pf = pq.ParquetFile(pa.memory_map(path, "r"))
+            meta = pf.metadata
+            pos_col = pf.schema_arrow.get_field_index("POS")
+            bounds = np.array([
+                (meta.row_group(i).column(pos_col).statistics.min, meta.row_group(i).column(pos_col).statistics.max)
+                for i in range(meta.num_row_groups)
+            ], dtype=np.int64).reshape(-1, 2)
+            chrom = os.path.basename(path)[len("chr_"):-len(".parquet")]
+            self.files[int(encode_chrom(pd.Series([chrom]))[0])] = (pf, bounds)
+        if not self.files:
+            raise FileNotFoundError(f"No ClinVar dataset found in {dataset_dir}")
+
+    def read_overlapping(self, query_df):
+        """Reads the ClinVar rows of every row group whose POS range covers an uploaded variant."""
+        codes = encode_chrom(query_df["CHROM"])
+        positions = encode_locus(query_df["CHROM"], query_df["POS"]) & 0xFFFFFFFF
+        tables = []
+        for code in np.unique(codes):
+            entry = self.files.get(int(code))
+            if entry is None:
+                continue
+            pf, bounds = entry
+            pos = np.unique(positions[codes == code])
+            # A row group is needed if any uploaded position falls inside [min, max]
+            first = np.searchsorted(pos, bounds[:, 0], side="left")
+            last = np.searchsorted(pos, bounds[:, 1], side="right")
+            groups = np.flatnonzero(last > first).tolist()
+            if groups:
+                tables.append(pf.read_row_groups(groups))
+        if not tables:
+            schema = next(iter(self.files.values()))[0].schema_arrow
+            return schema.empty_table().to_pandas()
+        return pa.concat_tables(tables, promote_options="default").to_pandas()
+
+    def join(self, query_df):
+        return VariantIndex(self.read_overlapping(query_df)).join(query_df)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the precompiled ClinVar reference store.")
+    parser.add_argument("--source", default=DEFAULT_SOURCE, help="Raw ClinVar parquet file, or clinvar.vcf.gz with --vcf")
+    parser.add_argument("--out", default=None, help="Output directory")
+    parser.add_argument("--vcf", action="store_true",
+                        help="Build the full-scale, position-bucketed Parquet dataset from a ClinVar VCF")
+    parser.add_argument("--genome-build", default="GRCh38", choices=["GRCh37", "GRCh38"])
+    args = parser.parse_args()
+    if args.vcf:
+        build_clinvar_dataset(args.source, args.out or DEFAULT_DATASET_DIR, args.genome_build)
+    else:
+        build_clinvar_store(args.source, args.out or DEFAULT_STORE_DIR, args.genome_build)
@@ -1,26 +1,230 @@
 # === gemini_handler.py ===
 
-import google.generativeai as genai
+import os
+import json
+import hashlib
+import logging
+import functools
+import threading
 
-def generate_with_gemini(prompt: str, api_key: str = None) -> str:
+import tracing
+from rate_limiter import key_fingerprint
+from annotation_cache import normalize_variant_key
+
+logger = logging.getLogger(__name__)
+
+GEMINI_MODEL = "gemini-1.5-flash"
+GEMINI_BATCH_SIZE = 8
+# Alternative API endpoint (e.g. a local stand-in for benchmarks); reached over REST, so http:// works
+GEMINI_API_ENDPOINT = os.environ.get("GEMINI_API_ENDPOINT")
+
+
+# Bump whenever PROMPT_TEMPLATE or build_variant_prompt changes, so cached interpretations are invalidated
+PROMPT_VERSION = "1"
+
+PROMPT_TEMPLATE = """
+You are a clinical geneticist. Based on the following variant and annotation data, provide a professional clinical interpretation.
+
+🧬 Variant:
+- Chr: {CHROM}, Pos: {POS}, {REF}→{ALT}
+
+📑 ClinVar:
+- Gene: {GENE}, Sig: {CLNSIG}, Dis: {DISEASE}
+
+🧪 ClinGen Validity: {ClinGen_Validity}
+- All curations: {ClinGen_Diseases}
+
+📚 PubMed: {pmids}
+
+📊 gnomAD:
+- Exome AC/AN: {Exome_AC}/{Exome_AN}
+- PopMax AF: {PopMax_AF} (Pop: {PopMax_Pop})
+
+🩺 Answer:
+1. Likely pathogenicity?
+2. Known disease?
+3. Clinical relevance?
+4. Plain-language summary (≤5 sents).
+"""
+
+
+def build_variant_prompt(row, pmids, stats) -> str:
+    """Fills the interpretation prompt from a merged variant row, its PubMed IDs and gnomAD stats."""
+    return PROMPT_TEMPLATE.format(
+        CHROM=row['CHROM'], POS=row['POS'], REF=row['REF'], ALT=row['ALT'],
+        GENE=row.get('GENE', 'N/A'), CLNSIG=row.get('CLNSIG', 'N/A'), DISEASE=row.get('DISEASE', 'N/A'),
+        ClinGen_Validity=row.get('ClinGen_Validity', 'N/A'),
+        ClinGen_Diseases=row.get('ClinGen_Diseases') or 'None',
+        pmids=', '.join(pmids) if pmids else 'None',
+        Exome_AC=stats.get('Exome_AC', 'N/A'), Exome_AN=stats.get('Exome_AN', 'N/A'),
+        PopMax_AF=stats.get('PopMax_AF', 'N/A'), PopMax_Pop=stats.get('PopMax_Pop', 'N/A'),
+    )
+
+
+CLINVAR_EVIDENCE_FIELDS = ("GENE", "CLNSIG", "DISEASE")
+CLINGEN_EVIDENCE_FIELDS = ("ClinGen_Validity", "ClinGen_Diseases")
+GNOMAD_EVIDENCE_FIELDS = ("Exome_AC", "Exome_AN", "PopMax_AF", "PopMax_Pop")
+
+
+def _evidence_value(value):
+    # NaN and None both render as missing evidence
+    return None if value is None or value != value else value
+
+
+def interpretation_fingerprint(row, pmids, stats, model_name: str = GEMINI_MODEL) -> str:
     """
-    Generates content with Gemini 1.5 Flash model.
-    Only uses the api_key passed as parameter to the function;
-    if api_key is missing, throws an error.
+    Hash of everything that determines an interpretation: the normalized variant,
+    the ClinVar/ClinGen/PubMed/gnomAD evidence fed to build_variant_prompt, the
+    prompt version and the model. Any change in these yields a new fingerprint.
+    """
+    evidence = {
+        "variant": normalize_variant_key(row['CHROM'], row['POS'], row['REF'], row['ALT']),
+        "clinvar": {f: _evidence_value(row.get(f)) for f in CLINVAR_EVIDENCE_FIELDS},
+        "clingen": {f: _evidence_value(row.get(f)) for f in CLINGEN_EVIDENCE_FIELDS},
+        "pubmed": sorted(str(p) for p in pmids or []),
+        "gnomad": {f: _evidence_value(stats.get(f)) for f in GNOMAD_EVIDENCE_FIELDS},
+        "prompt_version": PROMPT_VERSION,
+        "model": model_name,
+    }
+    return hashlib.sha256(json.dumps(evidence, sort_keys=True, default=str).encode()).hexdigest()
+
+
+# google.generativeai takes most of a second to import, so it is loaded on the first model request
+@functools.lru_cache(maxsize=None)
+def rate_limit_errors():
+    """Quota errors: gRPC reports RESOURCE_EXHAUSTED, the REST transport HTTP 429."""
+    from google.api_core import exceptions as google_exceptions
+    return google_exceptions.ResourceExhausted, google_exceptions.TooManyRequests
+
+
+class GeminiRateLimitError(RuntimeError):
+    """Raised when Gemini rejects a request with HTTP 429 / quota exhausted."""
+
+
+_models = {}
+_models_lock = threading.Lock()
+
+
+def _check_client_hook(model):
+    """
+    Fails loudly if this google-generativeai version no longer creates its service client
+    lazily in `GenerativeModel._client`, which get_gemini_model relies on (tested with 0.8.6).
+    """
+    if getattr(model, "_client", False) is not None:
+        import google.generativeai as genai
+        raise RuntimeError(
+            f"google-generativeai {getattr(genai, '__version__', '?')} is not supported: GenerativeModel has no "
+            "lazily created _client to attach a per-key client to. Install the version pinned in requirements.txt."
+        )
+
+
+def get_gemini_model(api_key: str, model_name: str = GEMINI_MODEL, json_output: bool = False):
+    """
+    Returns a long-lived GenerativeModel for this API key, created on first use.
+    Each key gets its own service client, so sessions with different keys never
+    race on the process-global `genai.configure`.
     """
     if not api_key:
         raise ValueError(
             "Gemini API key not found. "
             "Please enter your own key from the sidebar."
         )
+    cache_key = (key_fingerprint(api_key), model_name, json_output)
+    with _models_lock:
+        model = _models.get(cache_key)
+        if model is None:
+            import google.generativeai as genai
+            from google.ai import generativelanguage as glm
+            generation_config = {"response_mime_type": "application/json"} if json_output else None
+            model = genai.GenerativeModel(model_name=model_name, generation_config=generation_config)
+            # Deliberately replaces the SDK's private client: the public route, genai.configure,
+            # is process-global and would let concurrent sessions use each other's keys
+            _check_client_hook(model)
+            if GEMINI_API_ENDPOINT:
+                model._client = glm.GenerativeServiceClient(
+                    client_options={"api_key": api_key, "api_endpoint": GEMINI_API_ENDPOINT}, transport="rest")
+            else:
+                model._client = glm.GenerativeServiceClient(client_options={"api_key": api_key})
+            _models[cache_key] = model
+        return model
 
-    # Configure with user-provided key only
-    genai.configure(api_key=api_key)
 
-    # Create model instance and generate content
-    model = genai.GenerativeModel(model_name="gemini-1.5-flash")
+def generate_with_gemini(prompt: str, api_key: str = None) -> str:
+    """
+    Generates content with Gemini 1.5 Flash model.
+    Only uses the api_key passed as parameter to the function;
+    if api_key is missing, throws an error.
+    """
+    model = get_gemini_model(api_key)
     try:
         response = model.generate_content(prompt)
+        tracing.add(bytes=len((response.text or "").encode()))
         return response.text or "🛑 No response received."
+    except rate_limit_errors() as e:
+        # Surfaced to the caller so rate limiters can back off and retry
+        raise GeminiRateLimitError(str(e)) from e
     except Exception as e:
-        return f"❌ Error occurred: {e}"
\ No newline at end of file
+        return f"❌ Error occurred: {e}"
+
+
+BATCH_PROMPT_HEADER = """
+You will receive {count} independent variant interpretation requests, each under a "### Variant <ID>" heading.
+Answer each one separately and completely, exactly as if it had been asked on its own.
+Return only a JSON object whose keys are the variant IDs ({ids}) and whose values are the
+interpretation texts as strings.
+"""
+
+
+def build_batch_prompt(items) -> str:
+    """Packs [(variant_id, prompt), ...] into one request asking for JSON keyed by variant ID."""
+    ids = [vid for vid, _ in items]
+    parts = [BATCH_PROMPT_HEADER.format(count=len(items), ids=", ".join(ids))]
+    parts.extend(f"### Variant {vid}\n{prompt.strip()}\n" for vid, prompt in items)
+    return "\n".join(parts)
+
+
+def parse_batch_response(text: str, ids) -> dict:
+    """Returns {variant_id: interpretation} for the IDs answered with a non-empty string."""
+    try:
+        data = json.loads(text)
+    except (TypeError, ValueError):
+        return {}
+    if not isinstance(data, dict):
+        return {}
+    return {vid: data[vid].strip() for vid in ids if isinstance(data.get(vid), str) and data[vid].strip()}
+
+
+def generate_batch_with_gemini(items, api_key: str = None, limiter=None) -> list:
+    """
+    Interprets several variants with one Gemini request. `items` is a list of
+    (variant_id, prompt); the model is asked for JSON keyed by variant ID and the
+    answer is validated and split back per variant. Variants missing from (or
+    malformed in) the response fall back to single-variant calls, which take a
+    token from `limiter` when one is given.
+    Returns one interpretation per item, in order.
+    """
+    items = list(items)
+    unique = dict(items)
+    answers = {}
+    if len(unique) > 1:
+        model = get_gemini_model(api_key, json_output=True)
+        try:
+            response = model.generate_content(build_batch_prompt(list(unique.items())))
+            tracing.add(bytes=len(response.text.encode()))
+            answers = parse_batch_response(response.text, unique)
+        except rate_limit_errors() as e:
+            raise GeminiRateLimitError(str(e)) from e
+        except Exception as e:
+            logger.warning(f"Gemini batch of {len(unique)} failed, falling back to single calls: {e}")
+        missing = len(unique) - len(answers)
+        if missing:
+            logger.warning(f"Gemini batch response missing {missing}/{len(unique)} variants, retrying singly")
+    for vid, prompt in unique.items():
+        if vid not in answers:
+            # A lone variant is sent as-is on the request the caller already paid for
+            if limiter is not None and len(unique) > 1:
+                limiter.acquire()
+            if len(unique) > 1:
+                tracing.add(retries=1)
+            answers[vid] = generate_with_gemini(prompt, api_key=api_key)
+    return [answers[vid] for vid, _ in items]
@@ -0,0 +1,257 @@
+import os
+import glob
+import logging
+import argparse
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from vcf_reader import iter_vcf_batches
+from variant_keys import encode_chrom, frame_variant_keys, normalize_chrom
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_GNOMAD_STORE_DIR = os.environ.get("GENETIC_APP_GNOMAD_STORE", "gnomad_store")
+FIELDS = ["Exome_AC", "Exome_AN", "PopMax_AF", "PopMax_Pop"]
+BUILD_BATCH_SIZE = 200_000
+
+# Sites VCF INFO keys, first one present wins (gnomAD v4.1, v4.0, v3/v2 naming)
+INFO_FIELDS = {
+    "Exome_AC": ("AC",),
+    "Exome_AN": ("AN",),
+    "PopMax_AF": ("fafmax_faf95_max", "faf95_max", "faf95_popmax", "AF_popmax"),
+    "PopMax_Pop": ("fafmax_faf95_max_gen_anc", "faf95_max_gen_anc", "faf95_popmax_population", "popmax"),
+}
+# Column names accepted in a columnar extract (e.g. from `bcftools query`)
+EXTRACT_COLUMNS = {"#CHROM": "CHROM", "chrom": "CHROM", "pos": "POS", "ref": "REF", "alt": "ALT",
+                   **{key: field for field, keys in INFO_FIELDS.items() for key in keys}}
+
+_SCHEMA = pa.schema([("POS", pa.int64()), ("REF", pa.string()), ("ALT", pa.string()), ("Exome_AC", pa.int64()),
+                     ("Exome_AN", pa.int64()), ("PopMax_AF", pa.float64()), ("PopMax_Pop", pa.string())])
+
+
+def _partition_path(store_dir, chrom, ext):
+    safe = str(chrom).replace(os.sep, "_")
+    return os.path.join(store_dir, f"chr_{safe}.{ext}")
+
+
+# --- Build Step ---
+def _info_fields(info):
+    """Vectorized extraction of the gnomAD fields from a column of INFO strings."""
+    fields = {}
+    for field, keys in INFO_FIELDS.items():
+        values = pd.Series(np.nan, index=info.index, dtype=object)
+        for key in keys:
+            values = values.fillna(info.str.extract(rf"(?:^|;){key}=([^;]*)", expand=False))
+        fields[field] = values
+    return pd.DataFrame(fields)
+
+
+def _normalize_batch(df):
+    """CHROM/POS/REF/ALT plus FIELDS with the store's dtypes; '.' and empty values become missing."""
+    df = df.copy()
+    df["CHROM"] = normalize_chrom(df["CHROM"])
+    df["POS"] = pd.to_numeric(df["POS"], errors="coerce").astype("int64")
+    for col in ("REF", "ALT"):
+        df[col] = df[col].astype(str).str.strip().str.upper()
+    for col in ("Exome_AC", "Exome_AN"):
+        df[col] = pd.to_numeric(df.get(col), errors="coerce").astype("Int64") if col in df else pd.NA
+    df["PopMax_AF"] = pd.to_numeric(df["PopMax_AF"], errors="coerce") if "PopMax_AF" in df else np.nan
+    pop = df["PopMax_Pop"].astype(object) if "PopMax_Pop" in df else pd.Series(None, index=df.index, dtype=object)
+    df["PopMax_Pop"] = pop.where(~pop.isin(["", ".", "nan", "None"]) & pop.notna(), None)
+    return df[["CHROM", "POS", "REF", "ALT"] + FIELDS]
+
+
+def _iter_source_batches(path, batch_size=BUILD_BATCH_SIZE):
+    """Streams a sites VCF (.vcf, .vcf.gz, .vcf.bgz) or a Parquet/CSV/TSV extract as normalized batches."""
+    name = path.lower()
+    if ".vcf" in name:
+        with open(path, "rb") as fh:
+            for batch in iter_vcf_batches(fh, batch_size, split_multiallelic=False, extra_columns=("INFO",)):
+                yield _normalize_batch(pd.concat([batch.drop(columns=["INFO"]), _info_fields(batch["INFO"])],
+                                                 axis=1))
+    elif name.endswith(".parquet"):
+        for record_batch in pq.ParquetFile(path).iter_batches(batch_size=batch_size):
+            yield _normalize_batch(record_batch.to_pandas().rename(columns=EXTRACT_COLUMNS))
+    else:
+        sep = "\t" if ".tsv" in name or ".txt" in name else ","
+        for chunk in pd.read_csv(path, sep=sep, dtype=str, chunksize=batch_size):
+            yield _normalize_batch(chunk.rename(columns=EXTRACT_COLUMNS))
+
+
+class _PartitionWriter:
+    """Appends one chromosome's records: values to an Arrow IPC file, POS and variant keys to raw int64 files."""
+
+    def __init__(self, store_dir, chrom):
+        self.paths = {ext: _partition_path(store_dir, chrom, ext) for ext in ("arrow", "pos", "key")}
+        self.sink = pa.OSFile(self.paths["arrow"], "wb")
+        self.writer = pa.ipc.new_file(self.sink, _SCHEMA)
+        self.pos = open(self.paths["pos"], "wb")
+        self.key = open(self.paths["key"], "wb")
+        self.last_pos = -1
+        self.ordered = True
+        self.rows = 0
+
+    def write(self, part):
+        part = part.sort_values("POS", kind="stable")
+        positions = part["POS"].to_numpy(dtype="<i8")
+        self.ordered = self.ordered and positions[0] >= self.last_pos
+        self.last_pos = max(self.last_pos, int(positions[-1]))
+        self.writer.write_table(pa.Table.from_pandas(part.drop(columns=["CHROM"]), schema=_SCHEMA,
+                                                     preserve_index=False))
+        positions.tofile(self.pos)
+        frame_variant_keys(part).astype("<i8").tofile(self.key)
+        self.rows += len(part)
+
+    def close(self):
+        self.writer.close()
+        self.sink.close()
+        self.pos.close()
+        self.key.close()
+
+
+def _sort_partition(paths):
+    """Second pass for a chromosome whose records did not arrive in position order."""
+    table = pa.ipc.open_file(pa.memory_map(paths["arrow"], "r")).read_all()
+    positions = np.fromfile(paths["pos"], dtype="<i8")
+    keys = np.fromfile(paths["key"], dtype="<i8")
+    order = np.argsort(positions, kind="stable")
+    table = table.take(pa.array(order))
+    with pa.OSFile(paths["arrow"], "wb") as sink:
+        with pa.ipc.new_file(sink, _SCHEMA) as writer:
+            writer.write_table(table)
+    positions[order].tofile(paths["pos"])
+    keys[order].tofile(paths["key"])
+
+
+def build_gnomad_store(sources, store_dir=DEFAULT_GNOMAD_STORE_DIR):
+    """
+    Converts gnomAD sites VCFs or columnar extracts into the local frequency store:
+    per chromosome, an uncompressed Arrow IPC file with POS, REF, ALT and the
+    Exome_AC, Exome_AN, PopMax_AF and PopMax_Pop fields, plus raw int64 POS and
+    variant-key arrays in the same order that serve as the position index. Input is
+    streamed; chromosomes that arrive out of position order are sorted at the end.
+    """
+    sources = [sources] if isinstance(sources, str) else list(sources)
+    os.makedirs(store_dir, exist_ok=True)
+    for old in glob.glob(os.path.join(store_dir, "chr_*.*")):
+        os.remove(old)
+    writers = {}
+    try:
+        for source in sources:
+            for batch in _iter_source_batches(source):
+                for chrom, part in batch.groupby("CHROM", sort=False):
+                    writer = writers.get(chrom)
+                    if writer is None:
+                        writer = writers[chrom] = _PartitionWriter(store_dir, chrom)
+                    writer.write(part)
+            logger.info(f"gnomAD store: read {source}")
+    finally:
+        for writer in writers.values():
+            writer.close()
+    for writer in writers.values():
+        if not writer.ordered:
+            logger.info(f"gnomAD store: sorting {writer.paths['arrow']}")
+            _sort_partition(writer.paths)
+    total = sum(w.rows for w in writers.values())
+    logger.info(f"gnomAD store built in {store_dir}: {total} sites in {len(writers)} chromosomes")
+    return store_dir
+
+
+# --- Lookups ---
+class GnomadStore:
+    """
+    Local gnomAD frequencies, memory-mapped. Each chromosome's sorted POS array is
+    the position index: a batch of variants is located with one vectorized binary
+    search, and the few records at each position are told apart by variant key,
+    so lookups cost microseconds per variant and opening the store reads no data.
+    """
+
+    def __init__(self, store_dir=DEFAULT_GNOMAD_STORE_DIR):
+        self.store_dir = store_dir
+        self.partitions = {}
+        for path in sorted(glob.glob(os.path.join(store_dir, "chr_*.arrow"))):
+            chrom = os.path.basename(path)[len("chr_"):-len(".arrow")]
+            table = pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+            positions = np.memmap(_partition_path(store_dir, chrom, "pos"), dtype="<i8", mode="r")
+            keys = np.memmap(_partition_path(store_dir, chrom, "key"), dtype="<i8", mode="r")
+            if not (len(positions) == len(keys) == table.num_rows):
+                raise ValueError(f"gnomAD store partition {chrom} is incomplete; rebuild {store_dir}")
+            if table.num_rows:
+                self.partitions[int(encode_chrom(pd.Series([chrom]))[0])] = (table, positions, keys)
+        if not self.partitions:
+            raise FileNotFoundError(f"No gnomAD store found in {store_dir}")
+
+    def __len__(self):
+        return sum(table.num_rows for table, _, _ in self.partitions.values())
+
+    def locate(self, df):
+        """Returns (query_positions, (chrom_code, row)) of the CHROM/POS/REF/ALT rows of `df` found in the store."""
+        codes = encode_chrom(df["CHROM"])
+        positions = pd.to_numeric(df["POS"], errors="coerce").fillna(-1).to_numpy(dtype=np.int64)
+        keys = frame_variant_keys(df)
+        found = []
+        for code in np.unique(codes):
+            entry = self.partitions.get(int(code))
+            if entry is None:
+                continue
+            _, store_pos, store_keys = entry
+            query = np.flatnonzero(codes == code)
+            first = np.searchsorted(store_pos, positions[query], side="left")
+            last = np.searchsorted(store_pos, positions[query], side="right")
+            rows = np.full(len(query), -1, dtype=np.int64)
+            # Usually one record per position; multi-allelic sites have a few
+            for offset in range(int((last - first).max(initial=0))):
+                candidate = first + offset
+                open_ = (candidate < last) & (rows < 0)
+                if not open_.any():
+                    break
+                match = open_.copy()
+                match[open_] = store_keys[candidate[open_]] == keys[query[open_]]
+                rows[match] = candidate[match]
+            hit = rows >= 0
+            found.append((int(code), query[hit], rows[hit]))
+        return found
+
+    def lookup(self, df):
+        """FIELDS for every row of `df`, aligned to its index; variants not in gnomAD get missing values."""
+        return self._lookup(df)[1]
+
+    def _lookup(self, df):
+        found = np.zeros(len(df), dtype=bool)
+        out = pd.DataFrame({"Exome_AC": pd.array([pd.NA] * len(df), dtype="Int64"),
+                            "Exome_AN": pd.array([pd.NA] * len(df), dtype="Int64"),
+                            "PopMax_AF": np.full(len(df), np.nan),
+                            "PopMax_Pop": pd.Series([None] * len(df), dtype=object)})
+        for code, query, rows in self.locate(df):
+            found[query] = True
+            values = self.partitions[code][0].select(FIELDS).take(pa.array(rows)).to_pandas()
+            for field in FIELDS:
+                out.loc[query, field] = values[field].to_numpy()
+        out.index = df.index
+        return found, out
+
+    def fetch_batch(self, variants):
+        """
+        Stats for [(chrom, pos, ref, alt), ...] in the fetch_gnomad_batch shape: one dict
+        per variant with Exome_AC, Exome_AN, PopMax_AF and PopMax_Pop, or {'error': ...}.
+        """
+        if not variants:
+            return []
+        found, stats = self._lookup(pd.DataFrame(list(variants), columns=["CHROM", "POS", "REF", "ALT"]))
+        stats = stats.astype(object).where(stats.notna(), None)
+        return [dict(zip(FIELDS, values)) if hit else {'error': 'Not in local gnomAD store', 'not_found': True}
+                for hit, values in zip(found, stats.itertuples(index=False, name=None))]
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Build the local gnomAD frequency store.")
+    parser.add_argument("sources", nargs="+",
+                        help="gnomAD sites VCFs (.vcf/.vcf.gz/.vcf.bgz) or Parquet/CSV/TSV extracts "
+                             "with CHROM, POS, REF, ALT and AC, AN, popmax AF/population columns")
+    parser.add_argument("--out", default=DEFAULT_GNOMAD_STORE_DIR, help="Output directory")
+    args = parser.parse_args()
+    build_gnomad_store(args.sources, args.out)
@@ -0,0 +1,330 @@
+import os
+import json
+import time
+import uuid
+import socket
+import sqlite3
+import logging
+import threading
+
+from pipeline import GEMINI_RPM, build_services, build_prompt, build_triage, evidence_fingerprint, result_record
+from annotation_engine import annotate_variants
+from gemini_handler import GEMINI_BATCH_SIZE
+from scheduler import InterpretationBudget
+import tracing
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_JOBS_PATH = os.environ.get("GENETIC_APP_JOBS", "jobs.sqlite3")
+# A running job whose worker has not sent a heartbeat for this long is requeued
+STALE_AFTER = 120
+POLL_INTERVAL = 2.0
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    params TEXT NOT NULL,
+    total INTEGER NOT NULL,
+    done INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    owner TEXT,
+    created REAL NOT NULL,
+    heartbeat REAL
+);
+CREATE TABLE IF NOT EXISTS job_variants (
+    job_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    row TEXT NOT NULL,
+    result TEXT,
+    seq INTEGER,
+    PRIMARY KEY (job_id, idx)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status);
+"""
+
+
+def _json_default(value):
+    # numpy scalars -> plain Python numbers; pd.NA / NaT -> null
+    if hasattr(value, "item"):
+        return value.item()
+    if str(value) in ("<NA>", "NaT"):
+        return None
+    return str(value)
+
+
+def _dumps(value):
+    return json.dumps(value, default=_json_default)
+
+
+def _owner_alive(owner):
+    """False only when `owner` is a worker on this host whose process no longer exists."""
+    host, pid, _ = (owner or "::").split(":")
+    if host != socket.gethostname() or not pid.isdigit():
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class JobStore:
+    """
+    SQLite-backed job queue. A job is a list of matched variants; each variant's
+    result is checkpointed as soon as it completes, so an interrupted job resumes
+    with only the unfinished variants. API keys are never written to the store.
+    """
+
+    def __init__(self, path=DEFAULT_JOBS_PATH):
+        self.path = path
+        self._local = threading.local()
+        conn = self._connect()
+        conn.executescript(_SCHEMA)
+        # Queues created before results were numbered in completion order. Results already
+        # checkpointed are numbered 1..done per job in variant order, so they stay visible
+        # to results_since() and later checkpoints (done + 1, ...) continue the sequence.
+        if "seq" not in [col[1] for col in conn.execute("PRAGMA table_info(job_variants)")]:
+            self._transaction([
+                ("ALTER TABLE job_variants ADD COLUMN seq INTEGER", ()),
+                ("UPDATE job_variants SET seq = (SELECT COUNT(*) FROM job_variants AS v "
+                 "WHERE v.job_id = job_variants.job_id AND v.result IS NOT NULL AND v.idx <= job_variants.idx) "
+                 "WHERE result IS NOT NULL AND seq IS NULL", ()),
+            ])
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _transaction(self, statements):
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for sql, args in statements:
+                conn.execute(sql, args)
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    # --- Submission and progress ---
+    def submit(self, rows, params=None):
+        """Queues a job for `rows` (JSON-serializable dicts) and returns its ID."""
+        job_id = uuid.uuid4().hex[:12]
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("INSERT INTO jobs (id, status, params, total, created) VALUES (?, ?, ?, ?, ?)",
+                         (job_id, QUEUED, json.dumps(params or {}), len(rows), time.time()))
+            conn.executemany("INSERT INTO job_variants (job_id, idx, row) VALUES (?, ?, ?)",
+                             [(job_id, i, _dumps(row)) for i, row in enumerate(rows)])
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return job_id
+
+    def get(self, job_id):
+        """Returns the job as a dict (without variants), or None if it does not exist."""
+        row = self._connect().execute(
+            "SELECT id, status, params, total, done, error, created FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        keys = ("id", "status", "params", "total", "done", "error", "created")
+        job = dict(zip(keys, row))
+        job["params"] = json.loads(job["params"])
+        return job
+
+    def pending_variants(self, job_id):
+        """Returns [(idx, row)] of the variants without a checkpointed result."""
+        rows = self._connect().execute(
+            "SELECT idx, row FROM job_variants WHERE job_id = ? AND result IS NULL ORDER BY idx", (job_id,))
+        return [(idx, json.loads(row)) for idx, row in rows]
+
+    def results(self, job_id):
+        """Returns the checkpointed results in variant order (unfinished variants are skipped)."""
+        return [result for _, result in self.results_since(job_id)[0]]
+
+    def results_since(self, job_id, seq=0):
+        """
+        Returns ([(idx, result)], last_seq) for results checkpointed after completion
+        number `seq`, in variant order. Pass last_seq back in to fetch only newer ones.
+        """
+        rows = self._connect().execute(
+            "SELECT idx, result, seq FROM job_variants WHERE job_id = ? AND seq > ? ORDER BY idx",
+            (job_id, seq)).fetchall()
+        return [(idx, json.loads(result)) for idx, result, _ in rows], max((r[2] for r in rows), default=seq)
+
+    def checkpoint(self, job_id, idx, result):
+        """
+        Stores one variant's result and numbers it in completion order. Returns the
+        job's status, so its worker sees a cancel made by another process.
+        """
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            updated = conn.execute(
+                "UPDATE job_variants SET result = ?, seq = (SELECT done + 1 FROM jobs WHERE id = ?) "
+                "WHERE job_id = ? AND idx = ? AND result IS NULL", (_dumps(result), job_id, job_id, idx)).rowcount
+            conn.execute("UPDATE jobs SET done = done + ?, heartbeat = ? WHERE id = ?", (updated, time.time(), job_id))
+            row = conn.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return row[0] if row else None
+
+    # --- Worker side ---
+    def claim(self, owner, job_ids):
+        """Atomically moves the oldest queued job among `job_ids` to running; returns its ID or None."""
+        if not job_ids:
+            return None
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                f"SELECT id FROM jobs WHERE status = ? AND id IN ({','.join('?' * len(job_ids))}) "
+                f"ORDER BY created LIMIT 1", [QUEUED, *job_ids]).fetchone()
+            if row:
+                conn.execute("UPDATE jobs SET status = ?, owner = ?, heartbeat = ? WHERE id = ?",
+                             (RUNNING, owner, time.time(), row[0]))
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return row[0] if row else None
+
+    def heartbeat(self, owner):
+        self._transaction([("UPDATE jobs SET heartbeat = ? WHERE owner = ? AND status = ?",
+                            (time.time(), owner, RUNNING))])
+
+    def requeue_stale(self, stale_after=STALE_AFTER):
+        """
+        Puts running jobs back in the queue when their worker is gone: its process on
+        this host has exited, or it has not sent a heartbeat for `stale_after` seconds.
+        Returns the requeued job IDs.
+        """
+        cutoff = time.time() - stale_after
+        conn = self._connect()
+        stale = [job_id for job_id, owner, heartbeat in conn.execute(
+            "SELECT id, owner, heartbeat FROM jobs WHERE status = ?", (RUNNING,))
+            if heartbeat < cutoff or not _owner_alive(owner)]
+        if stale:
+            self._transaction([("UPDATE jobs SET status = ?, owner = NULL WHERE id = ? AND status = ?",
+                                (QUEUED, job_id, RUNNING)) for job_id in stale])
+            logger.warning(f"Requeued {len(stale)} interrupted jobs: {', '.join(stale)}")
+        return stale
+
+    def finish(self, job_id, status, error=None):
+        """Sets the job's final status; a cancelled job stays cancelled (the cancel may come from another process)."""
+        self._transaction([("UPDATE jobs SET status = ?, error = ?, owner = NULL WHERE id = ? AND status != ?",
+                            (status, error, job_id, CANCELLED))])
+
+
+class JobRunner:
+    """
+    Background worker that runs queued jobs in this process, up to `max_jobs` at a
+    time. Keys for a job are held in memory only; after a restart an interrupted
+    job waits in the queue until `resume(job_id, api_key, ...)` supplies them again.
+    """
+
+    def __init__(self, store, max_jobs=2, poll_interval=POLL_INTERVAL):
+        self.store = store
+        self.max_jobs = max_jobs
+        self.poll_interval = poll_interval
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self._credentials = {}
+        self._active = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        threading.Thread(target=self._loop, name="job-runner", daemon=True).start()
+
+    def submit(self, rows, params, api_key, ncbi_api_key=None):
+        job_id = self.store.submit(rows, params)
+        self.resume(job_id, api_key, ncbi_api_key)
+        return job_id
+
+    def resume(self, job_id, api_key, ncbi_api_key=None):
+        """Provides the keys for a queued or interrupted job so this runner can pick it up."""
+        with self._lock:
+            self._credentials[job_id] = (api_key, ncbi_api_key)
+        self._wake.set()
+
+    def has_credentials(self, job_id):
+        with self._lock:
+            return job_id in self._credentials
+
+    def cancel(self, job_id):
+        with self._lock:
+            stop = self._active.get(job_id)
+        if stop is not None:
+            stop.set()
+        else:
+            self.store.finish(job_id, CANCELLED)
+
+    def _loop(self):
+        while True:
+            try:
+                self.store.heartbeat(self.owner)
+                self.store.requeue_stale()
+                while True:
+                    with self._lock:
+                        if len(self._active) >= self.max_jobs:
+                            break
+                        candidates = [j for j in self._credentials if j not in self._active]
+                    job_id = self.store.claim(self.owner, candidates)
+                    if job_id is None:
+                        break
+                    stop = threading.Event()
+                    with self._lock:
+                        self._active[job_id] = stop
+                    threading.Thread(target=self._run, args=(job_id, stop), name=f"job-{job_id}",
+                                     daemon=True).start()
+            except Exception as e:
+                logger.error(f"Job runner poll failed: {e}")
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+    def _run(self, job_id, stop):
+        try:
+            job = self.store.get(job_id)
+            api_key, ncbi_api_key = self._credentials[job_id]
+            params = job["params"]
+            pending = self.store.pending_variants(job_id)
+            logger.info(f"Job {job_id}: {len(pending)}/{job['total']} variants left")
+            batch_size = params.get("gemini_batch_size", GEMINI_BATCH_SIZE)
+            services = build_services(api_key, ncbi_api_key, params.get("gemini_rpm", GEMINI_RPM), batch_size)
+            # The time budget restarts when an interrupted job is resumed
+            triage = build_triage(InterpretationBudget.from_params(params.get("budget"), batch_size),
+                                  params.get("min_priority"))
+            with tracing.trace_run(params.get("trace_run") or job_id, profile=params.get("profile", False)), \
+                    tracing.span("annotate", items=len(pending)):
+                annotations = annotate_variants([row for _, row in pending], build_prompt, *services,
+                                                fingerprint=evidence_fingerprint, triage=triage)
+                try:
+                    for item in annotations:
+                        status = self.store.checkpoint(job_id, pending[item["index"]][0], result_record(item))
+                        if status == CANCELLED:
+                            stop.set()
+                        if stop.is_set():
+                            break
+                finally:
+                    annotations.close()
+            self.store.finish(job_id, CANCELLED if stop.is_set() else DONE)
+        except Exception as e:
+            logger.exception(f"Job {job_id} failed")
+            self.store.finish(job_id, FAILED, f"{type(e).__name__}: {e}")
+        finally:
+            with self._lock:
+                self._active.pop(job_id, None)
+                self._credentials.pop(job_id, None)
+            tracing.export_metrics_file()
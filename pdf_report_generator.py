@@ -6,11 +6,57 @@ from reportlab.lib.colors import HexColor, black, white
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image, PageBreak
 from reportlab.lib.enums import TA_CENTER, TA_JUSTIFY, TA_LEFT
 from reportlab.pdfgen import canvas
+from reportlab.graphics.shapes import Drawing, String
+from reportlab.graphics.charts.piecharts import Pie
+from reportlab.graphics.charts.barcharts import VerticalBarChart, HorizontalBarChart
+from reportlab.graphics.charts.legends import Legend
 from datetime import datetime
 import io
-import matplotlib.pyplot as plt
+import zipfile
 import numpy as np
 
+import resources
+import tracing
+
+# Summary chart palette (matplotlib's default cycle, so reports keep their look)
+CHART_COLORS = [HexColor(c) for c in ('#1F77B4', '#FF7F0E', '#2CA02C', '#D62728', '#9467BD',
+                                      '#8C564B', '#E377C2', '#7F7F7F', '#BCBD22', '#17BECF')]
+CHART_WIDTH, CHART_HEIGHT = 6.5 * inch, 5 * inch
+# Pie slices beyond this many are merged into "Other"
+MAX_PIE_SLICES = 6
+# Variants per generated chunk of AI comment flowables, and the story size that triggers the next chunk
+STORY_CHUNK_SIZE = 25
+STORY_LOW_WATER = 50
+# Variants per appendix volume of a full report
+REPORT_VOLUME_SIZE = 500
+
+
+def _short(label, length=18):
+    label = str(label)
+    return label if len(label) <= length else label[:length - 3] + "..."
+
+
+def _panel_title(drawing, x, y, text):
+    drawing.add(String(x, y, text, fontName='Helvetica-Bold', fontSize=9, textAnchor='middle'))
+
+
+def _no_data(drawing, x, y, text):
+    drawing.add(String(x, y, text, fontName='Helvetica', fontSize=8, textAnchor='middle',
+                       fillColor=HexColor('#7F8C8D')))
+
+
+def _bar_chart(chart, x, y, width, height, values, names, color):
+    chart.x, chart.y, chart.width, chart.height = x, y, width, height
+    chart.data = [list(values)]
+    chart.categoryAxis.categoryNames = [str(n) for n in names]
+    chart.categoryAxis.labels.fontSize = 6
+    chart.valueAxis.valueMin = 0
+    chart.valueAxis.labels.fontSize = 6
+    chart.valueAxis.forceZero = True
+    chart.bars[0].fillColor = color
+    chart.bars[0].strokeColor = None
+    return chart
+
 class GeneticReportGenerator:
     def __init__(self):
         self.styles = getSampleStyleSheet()
@@ -84,6 +130,42 @@ class GeneticReportGenerator:
             alignment=TA_JUSTIFY
         )
 
+        # Table styles - built once and shared by every report from this generator
+        self.patient_table_style = TableStyle([
+            ('BACKGROUND', (0, 0), (-1, -1), HexColor('#F8F9FA')),
+            ('TEXTCOLOR', (0, 0), (-1, -1), black),
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+            ('FONTNAME', (1, 0), (1, -1), 'Helvetica'),
+            ('FONTSIZE', (0, 0), (-1, -1), 10),
+            ('GRID', (0, 0), (-1, -1), 1, HexColor('#DEE2E6')),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('TOPPADDING', (0, 0), (-1, -1), 6),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+        ])
+
+        self.variant_table_style = TableStyle([
+            # Header style
+            ('BACKGROUND', (0, 0), (-1, 0), HexColor('#3498DB')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), white),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 9),
+            ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+            
+            # Data style
+            ('BACKGROUND', (0, 1), (-1, -1), HexColor('#F8F9FA')),
+            ('TEXTCOLOR', (0, 1), (-1, -1), black),
+            ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+            ('FONTSIZE', (0, 1), (-1, -1), 8),
+            ('ALIGN', (0, 1), (-1, -1), 'CENTER'),
+            
+            # General
+            ('GRID', (0, 0), (-1, -1), 1, HexColor('#DEE2E6')),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('TOPPADDING', (0, 0), (-1, -1), 4),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
+        ])
+
     def create_header_footer(self, canvas_obj, doc):
         canvas_obj.saveState()
         
@@ -107,7 +189,95 @@ class GeneticReportGenerator:
         
         canvas_obj.restoreState()
 
+    def create_summary_drawing(self, results_df):
+        """
+        The 2x2 analysis summary (clinical significance, chromosomes, allele
+        frequencies, genes) as native reportlab vector graphics. The Drawing is a
+        flowable, so it goes straight into the story without rasterization.
+        """
+        d = Drawing(CHART_WIDTH, CHART_HEIGHT)
+        d.add(String(CHART_WIDTH / 2, CHART_HEIGHT - 14, 'Genetic Variant Analysis Summary',
+                     fontName='Helvetica-Bold', fontSize=12, textAnchor='middle'))
+        col_w, row_h = CHART_WIDTH / 2, (CHART_HEIGHT - 30) / 2
+        # Lower-left corners of the four panels: top-left, top-right, bottom-left, bottom-right
+        panels = [(0, row_h), (col_w, row_h), (0, 0), (col_w, 0)]
+
+        # Clinical significance distribution
+        x0, y0 = panels[0]
+        _panel_title(d, x0 + col_w / 2, y0 + row_h - 12, 'Clinical Significance Distribution')
+        cl_counts = results_df['CLNSIG'].value_counts() if 'CLNSIG' in results_df.columns else pd.Series(dtype=int)
+        if not cl_counts.empty:
+            if len(cl_counts) > MAX_PIE_SLICES:
+                other = cl_counts.iloc[MAX_PIE_SLICES - 1:].sum()
+                cl_counts = pd.concat([cl_counts.iloc[:MAX_PIE_SLICES - 1], pd.Series({'Other': other})])
+            total = cl_counts.sum()
+            size = min(col_w * 0.4, row_h - 50)
+            pie = Pie()
+            pie.x, pie.y, pie.width, pie.height = x0 + 18, y0 + (row_h - 20 - size) / 2, size, size
+            pie.data = [int(v) for v in cl_counts.values]
+            pie.labels = [f"{100 * v / total:.1f}%" for v in cl_counts.values]
+            pie.simpleLabels = 1
+            pie.slices.fontSize = 6
+            pie.slices.strokeColor = white
+            pie.startAngle = 90
+            for i in range(len(cl_counts)):
+                pie.slices[i].fillColor = CHART_COLORS[i % len(CHART_COLORS)]
+            d.add(pie)
+            legend = Legend()
+            legend.x, legend.y = x0 + size + 36, y0 + row_h - 30
+            legend.fontSize = 6
+            legend.boxAnchor = 'nw'
+            legend.columnMaximum = MAX_PIE_SLICES
+            legend.dx = legend.dy = 6
+            legend.colorNamePairs = [(CHART_COLORS[i % len(CHART_COLORS)], _short(name))
+                                     for i, name in enumerate(cl_counts.index)]
+            d.add(legend)
+        else:
+            _no_data(d, x0 + col_w / 2, y0 + row_h / 2, 'CLNSIG data not found')
+
+        # Chromosome distribution
+        x0, y0 = panels[1]
+        _panel_title(d, x0 + col_w / 2, y0 + row_h - 12, 'Chromosome Distribution')
+        chr_counts = results_df['CHROM'].value_counts().head(10) if 'CHROM' in results_df.columns else pd.Series(dtype=int)
+        if not chr_counts.empty:
+            d.add(_bar_chart(VerticalBarChart(), x0 + 30, y0 + 20, col_w - 45, row_h - 45,
+                             chr_counts.values, chr_counts.index, CHART_COLORS[0]))
+        else:
+            _no_data(d, x0 + col_w / 2, y0 + row_h / 2, 'No data')
+
+        # Allele frequency distribution
+        x0, y0 = panels[2]
+        _panel_title(d, x0 + col_w / 2, y0 + row_h - 12, 'Allele Frequency Distribution')
+        af_data = (pd.to_numeric(results_df['PopMax_AF'], errors='coerce').dropna()
+                   if 'PopMax_AF' in results_df.columns else pd.Series(dtype=float))
+        if len(af_data) > 1:
+            counts, edges = np.histogram(af_data, bins=min(20, len(af_data)))
+            # Label every few bins with its lower edge so the axis stays readable
+            step = max(1, len(counts) // 5)
+            names = [f"{edges[i]:.2g}" if i % step == 0 else "" for i in range(len(counts))]
+            chart = _bar_chart(VerticalBarChart(), x0 + 30, y0 + 20, col_w - 45, row_h - 45,
+                               counts, names, CHART_COLORS[0])
+            chart.groupSpacing = 0
+            d.add(chart)
+        else:
+            _no_data(d, x0 + col_w / 2, y0 + row_h / 2, 'Insufficient AF data')
+
+        # Gene-based distribution
+        x0, y0 = panels[3]
+        _panel_title(d, x0 + col_w / 2, y0 + row_h - 12, 'Most Frequent Genes')
+        gene_counts = results_df['GENE'].value_counts().head(10) if 'GENE' in results_df.columns else pd.Series(dtype=int)
+        if not gene_counts.empty:
+            # Reversed so the most frequent gene is drawn at the top
+            d.add(_bar_chart(HorizontalBarChart(), x0 + 55, y0 + 20, col_w - 70, row_h - 45,
+                             gene_counts.values[::-1], [_short(g, 10) for g in gene_counts.index[::-1]],
+                             CHART_COLORS[0]))
+        else:
+            _no_data(d, x0 + col_w / 2, y0 + row_h / 2, 'No gene data')
+        return d
+
     def create_summary_chart(self, results_df):
+        """Legacy raster version of the summary (matplotlib PNG at 300 dpi); returns a PNG buffer."""
+        import matplotlib.pyplot as plt
         plt.rcParams['font.family'] = ['DejaVu Sans']
         
         fig, axes = plt.subplots(2, 2, figsize=(10, 8))  # Size reduced
@@ -173,20 +343,8 @@ class GeneticReportGenerator:
         
         return buf
 
-    def generate_report(self, results_df, patient_info=None, output_filename="genetic_report.pdf", report_options=None):
-        if report_options is None:
-            report_options = {'template': 'Standard Report', 'include_charts': True, 'include_detailed_analysis': True}
-        
-        # Page settings - margins optimized
-        doc = SimpleDocTemplate(
-            output_filename, 
-            pagesize=A4,
-            rightMargin=50, 
-            leftMargin=50,
-            topMargin=70,   # Space for header
-            bottomMargin=50
-        )
-        
+    def _summary_story(self, results_df, patient_info, report_options):
+        """Title, patient data, charts, significance counts and the variant table; independent of comment count."""
         story = []
         
         # Main title
@@ -207,18 +365,7 @@ class GeneticReportGenerator:
             ]
             
             patient_table = Table(table_data, colWidths=[2.2*inch, 3.3*inch])
-            patient_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, -1), HexColor('#F8F9FA')),
-                ('TEXTCOLOR', (0, 0), (-1, -1), black),
-                ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-                ('FONTNAME', (1, 0), (1, -1), 'Helvetica'),
-                ('FONTSIZE', (0, 0), (-1, -1), 10),
-                ('GRID', (0, 0), (-1, -1), 1, HexColor('#DEE2E6')),
-                ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-                ('TOPPADDING', (0, 0), (-1, -1), 6),
-                ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-            ]))
+            patient_table.setStyle(self.patient_table_style)
             
             story.append(patient_table)
             story.append(Spacer(1, 20))  # Reduced
@@ -228,9 +375,11 @@ class GeneticReportGenerator:
             story.append(Paragraph("Analysis Summary", self.subtitle_style))
             
             try:
-                img_buf = self.create_summary_chart(results_df)
-                img = Image(img_buf, width=6*inch, height=4*inch)  # Size reduced
-                story.append(img)
+                if report_options.get('chart_renderer', 'vector') == 'matplotlib':
+                    img_buf = self.create_summary_chart(results_df)
+                    story.append(Image(img_buf, width=6*inch, height=4*inch))  # Size reduced
+                else:
+                    story.append(self.create_summary_drawing(results_df))
                 story.append(Spacer(1, 15))  # Reduced
             except Exception as e:
                 error_msg = f"Chart could not be created: {str(e)}"
@@ -294,27 +443,7 @@ class GeneticReportGenerator:
                 col_widths = [inch * 1.2] * len(available_columns)
             
             variant_table = Table(table_data, colWidths=col_widths, repeatRows=1)
-            variant_table.setStyle(TableStyle([
-                # Header style
-                ('BACKGROUND', (0, 0), (-1, 0), HexColor('#3498DB')),
-                ('TEXTCOLOR', (0, 0), (-1, 0), white),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 9),
-                ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
-                
-                # Data style
-                ('BACKGROUND', (0, 1), (-1, -1), HexColor('#F8F9FA')),
-                ('TEXTCOLOR', (0, 1), (-1, -1), black),
-                ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-                ('FONTSIZE', (0, 1), (-1, -1), 8),
-                ('ALIGN', (0, 1), (-1, -1), 'CENTER'),
-                
-                # General
-                ('GRID', (0, 0), (-1, -1), 1, HexColor('#DEE2E6')),
-                ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-                ('TOPPADDING', (0, 0), (-1, -1), 4),
-                ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
-            ]))
+            variant_table.setStyle(self.variant_table_style)
             
             story.append(variant_table)
             
@@ -329,41 +458,47 @@ class GeneticReportGenerator:
         
         story.append(PageBreak())
         
+        return story
+
+    @staticmethod
+    def _comment_column(results_df):
         # AI comments - check for both possible column names
-        ai_comment_column = None
-        if 'Gemini_Interpretation' in results_df.columns:
-            ai_comment_column = 'Gemini_Interpretation'
-        elif 'Gemini_Comment' in results_df.columns:
-            ai_comment_column = 'Gemini_Comment'
-        elif 'AI_Comment' in results_df.columns:
-            ai_comment_column = 'AI_Comment'
-        elif 'Comment' in results_df.columns:
-            ai_comment_column = 'Comment'
-        
-        if report_options.get('include_detailed_analysis', True) and ai_comment_column:
-            story.append(Paragraph("AI Comments", self.subtitle_style))
-            
-            for idx, (_, row) in enumerate(results_df.iterrows(), 1):
+        for column in ('Gemini_Interpretation', 'Gemini_Comment', 'AI_Comment', 'Comment'):
+            if column in results_df.columns:
+                return column
+        return None
+
+    def _comment_chunks(self, results_df, column, start=0, stop=None, on_progress=None):
+        """
+        Yields the AI comment flowables in chunks of STORY_CHUNK_SIZE variants, so only
+        one chunk of rows and paragraphs is materialized at a time.
+        """
+        stop = len(results_df) if stop is None else min(stop, len(results_df))
+        for chunk_start in range(start, stop, STORY_CHUNK_SIZE):
+            chunk_stop = min(chunk_start + STORY_CHUNK_SIZE, stop)
+            flowables = []
+            for idx, row in enumerate(results_df.iloc[chunk_start:chunk_stop].to_dict('records'), chunk_start + 1):
                 # Variant title
                 variant_info = f"Variant {idx}: {row.get('CHROM', 'N/A')}:{row.get('POS', 'N/A')} {row.get('REF', 'N/A')}>{row.get('ALT', 'N/A')}"
-                if 'GENE' in row and pd.notna(row['GENE']):
+                if pd.notna(row.get('GENE')):
                     variant_info += f" ({row['GENE']})"
-                
-                story.append(Paragraph(variant_info, self.subtitle_style))
-                
+
+                flowables.append(Paragraph(variant_info, self.subtitle_style))
+
                 # Comment text
-                comment_text = str(row.get(ai_comment_column, 'Comment not found'))
+                comment_text = str(row.get(column, 'Comment not found'))
                 # Truncate very long comments
                 if len(comment_text) > 2000:
                     comment_text = comment_text[:2000] + "... (Comment truncated)"
-                
-                story.append(Paragraph(comment_text, self.comment_style))
-                story.append(Spacer(1, 12))
-        
-        # Add page break only if comments exist
-        if report_options.get('include_detailed_analysis', True) and ai_comment_column:
-            story.append(PageBreak())
-        
+
+                flowables.append(Paragraph(comment_text, self.comment_style))
+                flowables.append(Spacer(1, 12))
+            yield flowables
+            if on_progress:
+                on_progress(chunk_stop - start, stop - start)
+
+    def _closing_story(self, results_df):
+        story = []
         # Conclusion and recommendations
         story.append(Paragraph("Conclusion and Recommendations", self.subtitle_style))
         
@@ -393,53 +528,175 @@ class GeneticReportGenerator:
         )
         story.append(Paragraph(footer_text, footer_style))
         
-        # Create PDF
-        doc.build(story, onFirstPage=self.create_header_footer, onLaterPages=self.create_header_footer)
-        
-        return output_filename
+        return story
 
-# Helper function for Streamlit
-def create_pdf_report_for_streamlit(results_df, patient_info=None, report_options=None):
-    """Optimized PDF report generator for Streamlit"""
-    generator = GeneticReportGenerator()
-    
-    if report_options is None:
-        report_options = {
-            'template': 'Standard Report', 
-            'include_charts': True, 
-            'include_detailed_analysis': True
-        }
-    
-    import tempfile
-    import os
-    
-    # Create temporary file
-    with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as tmp_file:
-        temp_filename = tmp_file.name
-    
-    try:
-        # Generate report
-        if report_options['template'] == 'Standard Report':
-            # Standard report with first 20 variants
-            df_to_use = results_df.head(20)
-        else:
-            # Full report with all variants
-            df_to_use = results_df
-        
-        generator.generate_report(
-            df_to_use, 
-            patient_info, 
-            temp_filename, 
-            report_options
+    def _build(self, output, chunks):
+        """Renders an iterable of flowable lists into `output` (a path or a writable binary file object)."""
+        # Page settings - margins optimized
+        doc = SimpleDocTemplate(
+            output,
+            pagesize=A4,
+            rightMargin=50,
+            leftMargin=50,
+            topMargin=70,   # Space for header
+            bottomMargin=50
         )
-        
-        # Read PDF data
-        with open(temp_filename, 'rb') as f:
-            pdf_data = f.read()
-        
-        return pdf_data
-        
-    finally:
-        # Clean up temporary file
-        if os.path.exists(temp_filename):
-            os.remove(temp_filename)
\ No newline at end of file
+        doc.build(_LazyStory(chunks), onFirstPage=self.create_header_footer, onLaterPages=self.create_header_footer)
+        return output
+
+    def generate_report(self, results_df, patient_info=None, output_filename="genetic_report.pdf", report_options=None,
+                        on_progress=None):
+        """
+        Writes the report to `output_filename` (a path or a binary file object such as
+        BytesIO). Summary sections cover every variant; AI comments are included for
+        the first `report_options['comment_limit']` variants (all when None) and are
+        generated page by page while the PDF is written.
+        `on_progress(done, total)` is called as comment chunks are laid out.
+        """
+        if report_options is None:
+            report_options = {'template': 'Standard Report', 'include_charts': True, 'include_detailed_analysis': True}
+        comment_limit = report_options.get('comment_limit')
+        column = self._comment_column(results_df)
+
+        def chunks():
+            yield self._summary_story(results_df, patient_info, report_options)
+            if report_options.get('include_detailed_analysis', True) and column:
+                shown = len(results_df) if comment_limit is None else min(comment_limit, len(results_df))
+                yield [Paragraph("AI Comments", self.subtitle_style)]
+                yield from self._comment_chunks(results_df, column, stop=shown, on_progress=on_progress)
+                if shown < len(results_df):
+                    yield [Paragraph(report_options.get('omitted_note') or
+                                     f"Note: AI comments are shown for the first {shown} of {len(results_df)} variants.",
+                                     self.body_style)]
+                # Add page break only if comments exist
+                yield [PageBreak()]
+            yield self._closing_story(results_df)
+
+        return self._build(output_filename, chunks())
+
+    def generate_appendix(self, results_df, output, start, stop, volume, volumes, patient_info=None, on_progress=None):
+        """One appendix volume with the AI comments of variants start+1 .. stop."""
+        column = self._comment_column(results_df)
+        patient = f" – Patient {patient_info.get('id', 'N/A')}" if patient_info else ""
+
+        def chunks():
+            yield [Paragraph(f"Appendix {volume}/{volumes}: AI Comments{patient}", self.title_style),
+                   Paragraph(f"Variants {start + 1}–{min(stop, len(results_df))} of {len(results_df)}", self.body_style),
+                   Spacer(1, 15)]
+            if column:
+                yield from self._comment_chunks(results_df, column, start, stop, on_progress=on_progress)
+
+        return self._build(output, chunks())
+
+
+class _LazyStory(list):
+    """
+    Story list that platypus consumes from the front. It is refilled from an
+    iterator of flowable chunks whenever it runs low, so the whole report never
+    exists as flowables at once.
+    """
+
+    def __init__(self, chunks, low_water=STORY_LOW_WATER):
+        super().__init__()
+        self._chunks = iter(chunks)
+        self._low_water = low_water
+        self._refill()
+
+    def _refill(self):
+        while len(self) < self._low_water:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return
+            self.extend(chunk)
+
+    def __delitem__(self, index):
+        super().__delitem__(index)
+        self._refill()
+
+    def pop(self, index=-1):
+        item = super().pop(index)
+        self._refill()
+        return item
+
+
+# --- Report Templates ---
+# Variants with AI comments in the main report, per template (None = all)
+TEMPLATE_COMMENT_LIMITS = {
+    'Standard Report': 20,
+    'Summary Report': 20,
+    'Full Report': None,
+}
+
+
+@resources.shared("report_generator", warm=False)
+def get_report_generator():
+    """
+    Process-wide generator: style sheets and table styles are built once and reused
+    by every report. Generators hold no per-report state, so sharing is safe.
+    """
+    return GeneticReportGenerator()
+
+
+def build_report_volumes(results_df, patient_info=None, report_options=None, on_progress=None):
+    """
+    Builds the report in memory and returns [(name, pdf_bytes)]. 'Summary Report'
+    (and the older 'Standard Report') comment on the first 20 variants only; a
+    'Full Report' with more than REPORT_VOLUME_SIZE variants puts all AI comments
+    into appendix volumes of REPORT_VOLUME_SIZE variants each, so no single PDF
+    (or its memory footprint) grows without bound.
+    `on_progress(done, total)` counts variants whose comments have been laid out.
+    """
+    report_options = dict(report_options or {'template': 'Standard Report', 'include_charts': True,
+                                             'include_detailed_analysis': True})
+    generator = get_report_generator()
+    template = report_options.get('template', 'Standard Report')
+    limit = TEMPLATE_COMMENT_LIMITS.get(template, TEMPLATE_COMMENT_LIMITS['Standard Report'])
+    volume_size = report_options.get('volume_size', REPORT_VOLUME_SIZE)
+    detailed = report_options.get('include_detailed_analysis', True)
+
+    appendices = []
+    if limit is None and detailed and len(results_df) > volume_size:
+        appendices = [(start, start + volume_size) for start in range(0, len(results_df), volume_size)]
+        report_options['comment_limit'] = 0
+        report_options['omitted_note'] = (f"AI comments for all {len(results_df)} variants are provided in "
+                                          f"{len(appendices)} appendix volumes.")
+    else:
+        report_options['comment_limit'] = limit
+    if appendices or limit is None:
+        total = len(results_df)
+    else:
+        total = min(limit, len(results_df))
+
+    def progress(chunk_done, chunk_total, offset=0):
+        if on_progress:
+            on_progress(offset + chunk_done, total)
+
+    with tracing.span("pdf_report", items=len(results_df)) as span:
+        buffer = io.BytesIO()
+        generator.generate_report(results_df, patient_info, buffer, report_options,
+                                  on_progress=None if appendices else progress)
+        volumes = [("report", buffer.getvalue())]
+        for volume, (start, stop) in enumerate(appendices, 1):
+            buffer = io.BytesIO()
+            generator.generate_appendix(results_df, buffer, start, stop, volume, len(appendices), patient_info,
+                                        on_progress=lambda d, t, offset=start: progress(d, t, offset))
+            volumes.append((f"appendix_{volume}", buffer.getvalue()))
+        span["bytes"] = sum(len(data) for _, data in volumes)
+    return volumes
+
+
+def package_report(volumes, basename="genetic_report"):
+    """Returns (file_name, data, mime): the PDF itself for one volume, otherwise a ZIP of all volumes."""
+    if len(volumes) == 1:
+        return f"{basename}.pdf", volumes[0][1], "application/pdf"
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_STORED) as archive:
+        for name, data in volumes:
+            archive.writestr(f"{basename}_{name}.pdf", data)
+    return f"{basename}.zip", buffer.getvalue(), "application/zip"
+
+
+# Helper function for Streamlit
+def create_pdf_report_for_streamlit(results_df, patient_info=None, report_options=None, on_progress=None):
+    """Builds the main PDF report in memory and returns its bytes (appendix volumes are not included)."""
+    return build_report_volumes(results_df, patient_info, report_options, on_progress)[0][1]
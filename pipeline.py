@@ -0,0 +1,283 @@
+import os
+import time
+import logging
+
+import pandas as pd
+
+from clinvar_parser import fetch_gnomad_batch, GNOMAD_BATCH_SIZE
+from clinvar_store import load_clinvar_index, ClinVarDataset, DEFAULT_DATASET_DIR, DEFAULT_STORE_DIR, DEFAULT_SOURCE
+from gnomad_store import GnomadStore, DEFAULT_GNOMAD_STORE_DIR
+from citation_index import CitationIndex, DEFAULT_CITATION_INDEX_DIR
+from gemini_handler import (generate_batch_with_gemini, build_variant_prompt, interpretation_fingerprint,
+                            GeminiRateLimitError, GEMINI_BATCH_SIZE)
+from clingen_handler import load_clingen_index, map_clingen_validity
+from pubmed_handler import get_pubmed_ids_batch, build_pubmed_links, ELINK_BATCH_SIZE
+from vcf_reader import iter_variant_batches
+from variant_keys import KEY_COLUMNS
+from annotation_engine import Service, annotate_variants
+from annotation_cache import AnnotationCache, DEFAULT_CACHE_PATH, normalize_variant_key
+from rate_limiter import get_rate_limiter, key_fingerprint
+from scheduler import LOW_PRIORITY_SCORE, priority_scores, frequency_points, template_interpretation
+import resources
+import tracing
+
+logger = logging.getLogger(__name__)
+
+CLINGEN_PATH = "Clingen-Gene-Disease-Summary-2025-07-01.csv"
+# Batched requests per second for the public gnomAD API, shared by all sessions
+GNOMAD_RATE = 2.0
+GEMINI_RPM = 15
+# "api": public gnomAD GraphQL API; "local": gnomAD store built by gnomad_store.py (offline)
+GNOMAD_BACKEND = os.environ.get("GENETIC_APP_GNOMAD", "api")
+# Variants per local gnomAD lookup; no network round-trip, so much larger than API batches
+LOCAL_GNOMAD_BATCH_SIZE = 1000
+# With a citation index, ask elink about variation IDs missing from it (e.g. newer than the index)
+PUBMED_LIVE_FALLBACK = os.environ.get("GENETIC_APP_PUBMED_FALLBACK", "0") == "1"
+
+
+# --- Shared Resources ---
+# Loaded once per process (resources.warm_up() loads them ahead of the first request)
+@resources.shared("annotation_cache")
+def get_annotation_cache(path=DEFAULT_CACHE_PATH):
+    """Persistent annotation cache, shared by all sessions and worker processes on this host."""
+    return AnnotationCache(path)
+
+
+@resources.shared("clinvar_reference")
+def get_clinvar_reference(dataset_dir=DEFAULT_DATASET_DIR, store_dir=DEFAULT_STORE_DIR, source=DEFAULT_SOURCE):
+    """
+    ClinVar reference, opened once per process. The full, position-bucketed dataset
+    is used when it has been built; otherwise the sampled store. Both expose `.join`.
+    """
+    if os.path.isdir(dataset_dir):
+        try:
+            return ClinVarDataset(dataset_dir)
+        except FileNotFoundError:
+            pass
+    return load_clinvar_index(store_dir, source=source)
+
+
+@resources.shared("clingen_index")
+def get_clingen_index(path=CLINGEN_PATH):
+    return load_clingen_index(path)
+
+
+@resources.shared("gnomad_store", warm=GNOMAD_BACKEND == "local")
+def get_gnomad_store(store_dir=DEFAULT_GNOMAD_STORE_DIR):
+    """Local gnomAD frequencies (memory-mapped), used when GNOMAD_BACKEND is "local"."""
+    return GnomadStore(store_dir)
+
+
+@resources.shared("citation_index")
+def get_citation_index(index_dir=DEFAULT_CITATION_INDEX_DIR):
+    """Local ClinVar -> PubMed citation index, or None when it has not been built (PubMed is then asked live)."""
+    if not os.path.isdir(index_dir):
+        return None
+    try:
+        return CitationIndex(index_dir)
+    except FileNotFoundError:
+        return None
+
+
+# --- Cached Lookups ---
+def get_pubmed_ids_cached(variation_ids, ncbi_api_key=None, live_fallback=None):
+    """
+    PubMed IDs for each ClinVar variation ID. With a citation index they come from
+    the index: IDs it does not list have no citations, or are asked live (through
+    the annotation cache) with `live_fallback` (default PUBMED_LIVE_FALLBACK).
+    Without an index every ID goes to elink through the cache.
+    """
+    variation_ids = [str(vid) for vid in variation_ids]
+    index = get_citation_index()
+    if index is None:
+        return _get_pubmed_ids_live(variation_ids, ncbi_api_key)
+    found = index.get_many(variation_ids)
+    missing = [vid for vid in variation_ids if vid not in found]
+    live_fallback = PUBMED_LIVE_FALLBACK if live_fallback is None else live_fallback
+    if missing and live_fallback:
+        found.update(zip(missing, _get_pubmed_ids_live(missing, ncbi_api_key)))
+    return [found.get(vid, []) for vid in variation_ids]
+
+
+def _get_pubmed_ids_live(variation_ids, ncbi_api_key=None):
+    def fetch(args):
+        pmids = get_pubmed_ids_batch([vid for vid, in args], api_key=ncbi_api_key)
+        return [pmids[vid] for vid, in args]
+    return get_annotation_cache().lookup("pubmed", variation_ids, [(vid,) for vid in variation_ids], fetch)
+
+
+def fetch_gnomad_batch_cached(variants):
+    keys = [normalize_variant_key(*v) for v in variants]
+    fetch = lambda args: fetch_gnomad_batch(args, limiter=get_rate_limiter("gnomad", GNOMAD_RATE))
+    return get_annotation_cache().lookup("gnomad", keys, list(variants), fetch)
+
+
+def fetch_gnomad_local(variants):
+    """gnomAD stats from the local store; as fast as the cache itself, so not cached."""
+    return get_gnomad_store().fetch_batch(variants)
+
+
+def generate_with_gemini_cached(items, api_key, limiter):
+    """
+    Batched Gemini interpretations for [(variant_id, prompt, fingerprint), ...].
+    Interpretations are cached under their evidence fingerprint, so identical
+    evidence is answered instantly and any evidence change misses the cache.
+    """
+    cache = get_annotation_cache()
+    keys = [key for _, _, key in items]
+    cached = cache.get_many("gemini", keys)
+    misses = [i for i, key in enumerate(keys) if not cached.get(key, (None, False))[1]]
+    tracing.add(cache_hits=len(keys) - len(misses), cache_misses=len(misses))
+    interpretations = {key: hit[0] for key, hit in cached.items() if hit[1]}
+    if misses:
+        # Rate-limit only real requests; fully cached batches never wait for a token
+        limiter.acquire()
+        try:
+            fresh = generate_batch_with_gemini([items[i][:2] for i in misses], api_key=api_key, limiter=limiter)
+        except GeminiRateLimitError:
+            limiter.throttled()
+            raise
+        limiter.succeeded()
+        for i, interpretation in zip(misses, fresh):
+            interpretations[keys[i]] = interpretation
+        cache.set_many("gemini", {keys[i]: text for i, text in zip(misses, fresh)
+                                  if not text.startswith(("❌", "🛑"))})
+    return [interpretations[key] for key in keys]
+
+
+# --- Prompting ---
+def usable_pmids(pm_response):
+    return pm_response if not(isinstance(pm_response,dict) and "error" in pm_response) else []
+
+
+def usable_stats(gnomad_response):
+    return gnomad_response if not(isinstance(gnomad_response,dict) and "error" in gnomad_response) else {}
+
+
+def build_prompt(row, pm_response, gnomad_response):
+    return build_variant_prompt(row, usable_pmids(pm_response), usable_stats(gnomad_response))
+
+
+def evidence_fingerprint(row, pm_response, gnomad_response):
+    return interpretation_fingerprint(row, usable_pmids(pm_response), usable_stats(gnomad_response))
+
+
+def build_services(api_key, ncbi_api_key=None, gemini_rpm=GEMINI_RPM, gemini_batch_size=GEMINI_BATCH_SIZE,
+                   gnomad_backend=None):
+    """
+    PubMed, gnomAD and Gemini services with their own concurrency and shared rate
+    limits. `gnomad_backend` ("api" or "local") defaults to GNOMAD_BACKEND.
+    """
+    gnomad_backend = gnomad_backend or GNOMAD_BACKEND
+    gemini_limiter = get_rate_limiter(f"gemini:{key_fingerprint(api_key)}", gemini_rpm / 60, adaptive=True)
+    pubmed = Service("pubmed", lambda ids: get_pubmed_ids_cached([vid for vid, in ids], ncbi_api_key or None),
+                     None, concurrency=2, batch_size=ELINK_BATCH_SIZE)
+    if gnomad_backend == "local":
+        gnomad = Service("gnomad", fetch_gnomad_local, None, concurrency=1, batch_size=LOCAL_GNOMAD_BATCH_SIZE)
+    elif gnomad_backend == "api":
+        gnomad = Service("gnomad", fetch_gnomad_batch_cached, None, concurrency=2, batch_size=GNOMAD_BATCH_SIZE)
+    else:
+        raise ValueError(f"Unknown gnomAD backend {gnomad_backend!r} (expected 'api' or 'local')")
+    gemini = Service("gemini", lambda items: generate_with_gemini_cached(items, api_key, gemini_limiter),
+                     None, concurrency=8, throttle_errors=(GeminiRateLimitError,),
+                     batch_size=gemini_batch_size)
+    return pubmed, gnomad, gemini
+
+
+# --- Scheduling ---
+def build_triage(budget=None, min_priority=LOW_PRIORITY_SCORE):
+    """
+    Per-variant decision, made once its lookups are back, whether Gemini is called.
+    Variants whose Priority_Score (plus the gnomAD frequency adjustment) is below
+    `min_priority` get a templated summary, and so does every variant once the
+    InterpretationBudget `budget` is spent. Fresh cached interpretations cost nothing.
+    Returns None when there is neither a budget nor a threshold.
+    """
+    if budget is None and min_priority is None:
+        return None
+
+    def triage(row, pm_response, gnomad_response, prompt, cache_key):
+        stats = usable_stats(gnomad_response)
+        # Rows queued before scores existed are scored here
+        score = row["Priority_Score"] if "Priority_Score" in row else priority_scores(pd.DataFrame([row])).iloc[0]
+        if "PopMax_AF" not in row:
+            score += frequency_points(stats.get("PopMax_AF"))
+        if min_priority is not None and score < min_priority:
+            return template_interpretation(row, stats, "low_priority")
+        if budget is None or (cache_key and get_annotation_cache().get("gemini", cache_key) is not None):
+            return None
+        return None if budget.admit(prompt) else template_interpretation(row, stats, "budget")
+    return triage
+
+
+# --- Pipeline Steps ---
+def _upload_size(uploaded):
+    # Streamlit uploads know their size; plain files are asked via fstat
+    size = getattr(uploaded, "size", None)
+    if size is None and hasattr(uploaded, "fileno"):
+        size = os.fstat(uploaded.fileno()).st_size
+    return size or 0
+
+
+def match_variants(uploaded, clinvar_reference=None, clingen_index=None):
+    """
+    Streams an uploaded VCF/CSV through the ClinVar join and adds ClinGen validity.
+    Returns only the variants found in ClinVar with their Priority_Score (CLNSIG,
+    review stars, ClinGen validity), highest first, so they are also the first to
+    be annotated and interpreted.
+    """
+    clinvar_reference = get_clinvar_reference() if clinvar_reference is None else clinvar_reference
+    clingen_index = get_clingen_index() if clingen_index is None else clingen_index
+    # Stream the upload through the hash-index join so only matched rows are kept in memory
+    joined, parsed_rows, parse_seconds, join_seconds = [], 0, 0.0, 0.0
+    batches = iter_variant_batches(uploaded)
+    while True:
+        started = time.perf_counter()
+        batch = next(batches, None)
+        parse_seconds += time.perf_counter() - started
+        if batch is None:
+            break
+        parsed_rows += len(batch)
+        started = time.perf_counter()
+        joined.append(clinvar_reference.join(batch))
+        join_seconds += time.perf_counter() - started
+    tracing.record_span("vcf_parse", parse_seconds, items=parsed_rows, bytes=_upload_size(uploaded))
+    tracing.record_span("clinvar_join", join_seconds, items=parsed_rows)
+    if not joined:
+        # Header-only upload: join no variants, so the empty result still has the matched columns
+        joined.append(clinvar_reference.join(pd.DataFrame({col: pd.Series(dtype=object) for col in KEY_COLUMNS})))
+    merged = pd.concat(joined, ignore_index=True)
+    with tracing.span("clingen", items=len(merged)):
+        merged = merged.join(map_clingen_validity(merged["GENE"], clingen_index))
+    with tracing.span("prioritize") as span:
+        matched = merged[~merged["ID"].isna()].assign(Priority_Score=lambda df: priority_scores(df))
+        order = (-matched["Priority_Score"].to_numpy()).argsort(kind="stable")
+        span["items"] = len(matched)
+        return matched.iloc[order].reset_index(drop=True)
+
+
+def result_record(item):
+    """Flattens one annotate_variants result into the row shown in the Results table."""
+    pmids, stats = usable_pmids(item["pubmed"]), usable_stats(item["gnomad"])
+    pubmed_links = build_pubmed_links(pmids)
+    return {**item["row"], "PubMed_Links": ", ".join(pubmed_links), **stats,
+            "Gemini_Interpretation": item["interpretation"]}
+
+
+def interpret_variants(matched, services, on_result=None, triage=None):
+    """
+    Runs PubMed/gnomAD lookups and Gemini interpretation for the matched variants.
+    `on_result(done, total, record)` is called as each variant completes; `triage`
+    (see build_triage) replaces Gemini calls for low-priority or over-budget variants.
+    Returns the result records in input order.
+    """
+    total = len(matched)
+    results = [None] * total
+    with tracing.span("annotate", items=total):
+        annotations = annotate_variants(matched.to_dict("records"), build_prompt, *services,
+                                        fingerprint=evidence_fingerprint, triage=triage)
+        for done, item in enumerate(annotations, 1):
+            results[item["index"]] = record = result_record(item)
+            if on_result:
+                on_result(done, total, record)
+    return results
@@ -1,16 +1,26 @@
+import os
 import requests
 import logging
 
+import tracing
+
+from rate_limiter import ncbi_rate_limiter
+
 logger = logging.getLogger(__name__)
 
-def get_pubmed_ids_from_clinvar(variation_id):
-    url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/elink.fcgi"
+ELINK_URL = os.environ.get("NCBI_ELINK_URL", "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/elink.fcgi")
+ELINK_BATCH_SIZE = 200
+
+def get_pubmed_ids_from_clinvar(variation_id, api_key=None):
+    url = ELINK_URL
     params = {
         "dbfrom": "clinvar",
         "db": "pubmed",
         "id": variation_id,
         "retmode": "json"
     }
+    if api_key:
+        params["api_key"] = api_key
     try:
         response = requests.get(url, params=params, timeout=10)
         response.raise_for_status()
@@ -19,11 +29,7 @@ def get_pubmed_ids_from_clinvar(variation_id):
         if not linksets or "linksetdbs" not in linksets[0]:
             logger.warning(f"No PubMed links found for ClinVar ID {variation_id}")
             return []
-        pmids = []
-        for db in linksets[0]["linksetdbs"]:
-            if db["dbto"] == "pubmed":
-                pmids.extend(db["links"])
-        return pmids
+        return _pubmed_ids_from_linkset(linksets[0])
     except requests.exceptions.RequestException as req_err:
         logger.error(f"HTTP error fetching PubMed IDs for {variation_id}: {req_err}")
         return {'error': f"HTTP error: {req_err}"}
@@ -35,5 +41,52 @@ def get_pubmed_ids_from_clinvar(variation_id):
         return {'error': f"Unexpected error: {e}"}
 
 
+def _pubmed_ids_from_linkset(linkset):
+    pmids = []
+    for db in linkset.get("linksetdbs", []):
+        if db["dbto"] == "pubmed":
+            pmids.extend(db["links"])
+    return pmids
+
+
+def get_pubmed_ids_batch(variation_ids, api_key=None, batch_size=ELINK_BATCH_SIZE, limiter=None):
+    """
+    Resolves many ClinVar variation IDs to PubMed IDs with one elink request per
+    `batch_size` IDs. Each ID is sent as its own `id=` parameter, so E-utilities
+    returns one linkset per ID. Requests go through the shared NCBI rate limiter
+    (3/s, or 10/s with `api_key`).
+    Returns {variation_id: [pmid, ...] or {'error': str}} for every input ID.
+    """
+    limiter = limiter or ncbi_rate_limiter(api_key)
+    ids = [str(v) for v in variation_ids]
+    results = {}
+    for start in range(0, len(ids), batch_size):
+        chunk = ids[start:start + batch_size]
+        data = [("dbfrom", "clinvar"), ("db", "pubmed"), ("retmode", "json")] + [("id", v) for v in chunk]
+        if api_key:
+            data.append(("api_key", api_key))
+        limiter.acquire()
+        try:
+            # POST keeps hundreds of id= parameters out of the URL
+            response = requests.post(ELINK_URL, data=data, timeout=30)
+            tracing.add(bytes=len(response.content))
+            response.raise_for_status()
+            linksets = response.json().get("linksets", [])
+        except requests.exceptions.RequestException as req_err:
+            logger.error(f"HTTP error fetching PubMed IDs for {len(chunk)} ClinVar IDs: {req_err}")
+            results.update({v: {'error': f"HTTP error: {req_err}"} for v in chunk})
+            continue
+        except ValueError as val_err:
+            logger.error(f"JSON decode error for batched PubMed response: {val_err}")
+            results.update({v: {'error': f"JSON decode error: {val_err}"} for v in chunk})
+            continue
+        for linkset in linksets:
+            for vid in linkset.get("ids", []):
+                results[str(vid)] = _pubmed_ids_from_linkset(linkset)
+        for v in chunk:
+            results.setdefault(v, [])
+    return results
+
+
 def build_pubmed_links(pmid_list):
     return [f"https://pubmed.ncbi.nlm.nih.gov/{pmid}/" for pmid in pmid_list]
\ No newline at end of file
@@ -0,0 +1,143 @@
+import time
+import threading
+import hashlib
+
+import tracing
+
+# NCBI E-utilities: 3 requests/s per IP without an API key, 10/s with one
+NCBI_RATE_NO_KEY = 3.0
+NCBI_RATE_WITH_KEY = 10.0
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket. `acquire()` blocks until a token is available and
+    returns the number of seconds spent waiting.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self._auto_capacity = not capacity
+        self.capacity = float(capacity or max(1.0, rate))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill(time.monotonic())
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    if waited:
+                        tracing.add(wait_seconds=waited)
+                    return waited
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+    def set_rate(self, rate):
+        """Changes the rate in place; tokens already accrued are kept (up to the new capacity)."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._apply_rate(float(rate))
+
+    def _apply_rate(self, rate):
+        self.rate = rate
+        if self._auto_capacity:
+            self.capacity = max(1.0, rate)
+            self._tokens = min(self._tokens, self.capacity)
+
+    @property
+    def nominal_rate(self):
+        """The configured rate (the ceiling for adaptive limiters)."""
+        return self.rate
+
+    def throttled(self):
+        pass
+
+    def succeeded(self):
+        pass
+
+
+class AdaptiveTokenBucket(TokenBucket):
+    """
+    Token bucket whose rate backs off multiplicatively when the server throttles
+    (HTTP 429) and recovers additively on success, never exceeding `max_rate`.
+    """
+
+    def __init__(self, rate, min_rate=None, capacity=None, backoff=0.5, recovery=0.05):
+        super().__init__(rate, capacity)
+        self.max_rate = self.rate
+        self._auto_min_rate = not min_rate
+        self.min_rate = min_rate or self.rate / 16
+        self.backoff = backoff
+        self.recovery = recovery
+
+    def _apply_rate(self, rate):
+        # A limiter that is not backed off moves to the new ceiling; a backed-off one keeps
+        # its current rate (capped) and recovers towards the new ceiling
+        current = rate if self.rate >= self.max_rate else min(self.rate, rate)
+        self.max_rate = rate
+        if self._auto_min_rate:
+            self.min_rate = rate / 16
+        super()._apply_rate(max(self.min_rate, current))
+
+    @property
+    def nominal_rate(self):
+        return self.max_rate
+
+    def throttled(self):
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate * self.backoff)
+            # Drop any burst allowance so the slower rate takes effect immediately
+            self._tokens = min(self._tokens, 0.0)
+
+    def succeeded(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate * self.recovery)
+
+
+_registry = {}
+_registry_lock = threading.Lock()
+# Fraction of each service's rate this process may use (1/N for N worker processes)
+_rate_share = 1.0
+
+
+def set_rate_share(share):
+    """Scales every limiter created afterwards in this process, so N worker processes together keep one budget."""
+    global _rate_share
+    _rate_share = share
+
+
+def get_rate_limiter(name, rate, adaptive=False, **kwargs):
+    """
+    Returns the process-wide limiter registered under `name`, creating it on first
+    use, so every session hitting the same service shares one budget. A call with a
+    different `rate` (e.g. a changed RPM setting) retunes the shared limiter in place.
+    """
+    rate = float(rate) * _rate_share
+    with _registry_lock:
+        limiter = _registry.get(name)
+        if limiter is None:
+            cls = AdaptiveTokenBucket if adaptive else TokenBucket
+            limiter = _registry[name] = cls(rate, **kwargs)
+        elif limiter.nominal_rate != rate:
+            limiter.set_rate(rate)
+        return limiter
+
+
+def ncbi_rate_limiter(api_key=None):
+    if api_key:
+        return get_rate_limiter(f"ncbi:{key_fingerprint(api_key)}", NCBI_RATE_WITH_KEY)
+    return get_rate_limiter("ncbi", NCBI_RATE_NO_KEY)
+
+
+def key_fingerprint(api_key):
+    """Short, non-reversible identifier for an API key (keys are never stored in clear)."""
+    return hashlib.sha256(api_key.encode()).hexdigest()[:12]
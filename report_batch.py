@@ -0,0 +1,160 @@
+import os
+import sys
+import time
+import logging
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from pdf_report_generator import get_report_generator, build_report_volumes
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TEMPLATE = "Summary Report"
+
+
+# --- Report Jobs ---
+def patient_info_for(sample):
+    """Patient block of a report from a sample/manifest record ('sample_id' plus optional name, age, test_date)."""
+    return {
+        'id': sample["sample_id"],
+        'name': sample.get("name") or "Not specified",
+        'age': sample.get("age") or "Not specified",
+        'test_date': sample.get("test_date") or pd.Timestamp.now().strftime('%d.%m.%Y'),
+    }
+
+
+def report_options_for(template=DEFAULT_TEMPLATE):
+    return {
+        'template': template,
+        'language': "English",
+        'include_charts': True,
+        'include_detailed_analysis': True,
+    }
+
+
+def write_report(results_df, patient_info, report_options, out_dir):
+    """
+    Renders one patient's report into `out_dir` as genetic_report_<id>.pdf plus any
+    appendix volumes (genetic_report_<id>_appendix_<k>.pdf). Returns the written paths.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    paths = []
+    for name, pdf_bytes in build_report_volumes(results_df, patient_info, report_options):
+        suffix = "" if name == "report" else f"_{name}"
+        path = os.path.join(out_dir, f"genetic_report_{patient_info['id']}{suffix}.pdf")
+        with open(path, "wb") as fh:
+            fh.write(pdf_bytes)
+        paths.append(path)
+    return paths
+
+
+def _read_results(results):
+    if isinstance(results, pd.DataFrame):
+        return results
+    if results.endswith(".parquet"):
+        return pd.read_parquet(results)
+    return pd.read_csv(results)
+
+
+def jobs_from_batch_output(out_dir, template=DEFAULT_TEMPLATE):
+    """Report jobs for every sample directory of a batch_cli run that has results.parquet or results.csv."""
+    jobs = []
+    for sample_id in sorted(os.listdir(out_dir)):
+        sample_dir = os.path.join(out_dir, sample_id)
+        for name in ("results.parquet", "results.csv"):
+            path = os.path.join(sample_dir, name)
+            if os.path.exists(path):
+                jobs.append({"report_id": sample_id, "results": path, "out_dir": sample_dir,
+                             "patient_info": patient_info_for({"sample_id": sample_id}),
+                             "report_options": report_options_for(template)})
+                break
+    return jobs
+
+
+# --- Worker ---
+def _init_worker():
+    # Build the style sheets once per process instead of once per report
+    get_report_generator()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(processName)s %(levelname)s %(message)s")
+
+
+def render_report(job):
+    """
+    Renders one report job: {'report_id', 'results' (DataFrame or .parquet/.csv path),
+    'out_dir', optional 'patient_info' and 'report_options'}. Never raises; returns
+    {'report_id', 'variants', 'files', 'bytes', 'seconds', 'error'}.
+    """
+    started = time.perf_counter()
+    summary = {"report_id": job["report_id"], "variants": 0, "files": [], "bytes": 0, "error": ""}
+    try:
+        results_df = _read_results(job["results"])
+        summary["variants"] = len(results_df)
+        if not results_df.empty:
+            patient_info = job.get("patient_info") or patient_info_for({"sample_id": job["report_id"]})
+            summary["files"] = write_report(results_df, patient_info,
+                                            job.get("report_options") or report_options_for(), job["out_dir"])
+            summary["bytes"] = sum(os.path.getsize(path) for path in summary["files"])
+    except Exception as e:
+        logger.exception(f"Report {job['report_id']} failed")
+        summary["error"] = f"{type(e).__name__}: {e}"
+    summary["seconds"] = round(time.perf_counter() - started, 3)
+    return summary
+
+
+def iter_reports(jobs, workers=None):
+    """
+    Renders report jobs on a process pool and yields each summary as soon as that
+    report is finished, so one slow report never holds back the others. Pass
+    results as file paths where possible; DataFrames are pickled to the workers.
+    """
+    jobs = list(jobs)
+    workers = max(1, min(workers or os.cpu_count() or 1, len(jobs) or 1))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        futures = {pool.submit(render_report, job): job for job in jobs}
+        for future in as_completed(futures):
+            try:
+                yield future.result()
+            except Exception as e:
+                # The worker process itself died (e.g. out of memory)
+                yield {"report_id": futures[future]["report_id"], "variants": 0, "files": [], "bytes": 0,
+                       "seconds": 0.0, "error": f"{type(e).__name__}: {e}"}
+
+
+def render_reports(jobs, workers=None):
+    """Renders all report jobs in parallel; returns their summaries in job order."""
+    jobs = list(jobs)
+    order = {job["report_id"]: i for i, job in enumerate(jobs)}
+    return sorted(iter_reports(jobs, workers), key=lambda s: order[s["report_id"]])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render PDF reports for the samples of a batch_cli output directory.")
+    parser.add_argument("out", help="batch_cli output directory (one subdirectory per sample)")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--template", default=DEFAULT_TEMPLATE, choices=["Summary Report", "Full Report"],
+                        help="PDF report template")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    jobs = jobs_from_batch_output(args.out, args.template)
+    if not jobs:
+        logger.warning(f"No results found in {args.out}")
+        return 0
+
+    summaries = []
+    for done, summary in enumerate(iter_reports(jobs, args.workers), 1):
+        summaries.append(summary)
+        status = f"failed: {summary['error']}" if summary["error"] else f"{len(summary['files'])} files"
+        logger.info(f"[{done}/{len(jobs)}] {summary['report_id']}: {status} ({summary['seconds']}s)")
+    report = pd.DataFrame(summaries)
+    report["files"] = report["files"].map(";".join)
+    report.to_csv(os.path.join(args.out, "reports.csv"), index=False)
+    failed = int((report["error"] != "").sum())
+    logger.info(f"Rendered {len(summaries)} reports, {failed} failed; timings in {args.out}/reports.csv")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
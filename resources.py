@@ -0,0 +1,83 @@
+import time
+import logging
+import functools
+import importlib
+import threading
+
+import tracing
+
+logger = logging.getLogger(__name__)
+
+# Modules whose import registers the resources warmed up by default
+WARM_UP_MODULES = ("pipeline",)
+
+_registry = {}
+_warm_defaults = []
+
+
+def shared(name, warm=True):
+    """
+    Decorator for a process-wide resource loader (reference data, clients). Like
+    `functools.lru_cache`, the result is kept per argument tuple, but concurrent
+    first calls wait for one load instead of each running the loader, and every
+    load is timed as a `load:<name>` span. With `warm=True` the resource is part
+    of the default `warm_up()` set.
+    """
+    def decorate(loader):
+        values = {}
+        locks = {}
+        lock = threading.Lock()
+
+        @functools.wraps(loader)
+        def get(*args, **kwargs):
+            key = (args, tuple(sorted(kwargs.items())))
+            try:
+                return values[key]
+            except KeyError:
+                pass
+            with lock:
+                key_lock = locks.setdefault(key, threading.Lock())
+            with key_lock:
+                if key not in values:
+                    with tracing.span(f"load:{name}"):
+                        values[key] = loader(*args, **kwargs)
+                return values[key]
+
+        def cache_clear():
+            with lock:
+                values.clear()
+                locks.clear()
+
+        get.cache_clear = cache_clear
+        get.is_loaded = lambda *args, **kwargs: (args, tuple(sorted(kwargs.items()))) in values
+        _registry[name] = get
+        if warm and name not in _warm_defaults:
+            _warm_defaults.append(name)
+        return get
+    return decorate
+
+
+def warm_up(names=None, modules=WARM_UP_MODULES, background=False):
+    """
+    Loads resources ahead of their first use: `names`, or every resource registered
+    with `warm=True` after importing `modules`. Returns {name: seconds}, or the
+    started thread when `background=True`. Failures are logged, not raised, so the
+    first real use reports them instead.
+    """
+    if background:
+        thread = threading.Thread(target=warm_up, args=(names, modules), name="warm-up", daemon=True)
+        thread.start()
+        return thread
+    for module in modules:
+        importlib.import_module(module)
+    timings = {}
+    for name in names or list(_warm_defaults):
+        started = time.perf_counter()
+        try:
+            _registry[name]()
+        except Exception as e:
+            logger.error(f"Warm-up of {name} failed: {type(e).__name__}: {e}")
+            continue
+        timings[name] = round(time.perf_counter() - started, 3)
+    logger.info(f"Warmed up {timings}")
+    return timings
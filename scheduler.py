@@ -0,0 +1,148 @@
+import math
+import time
+import threading
+
+import numpy as np
+import pandas as pd
+
+from clinvar_parser import clnsig_priority
+from clingen_handler import CLASSIFICATION_RANK
+
+# --- Priority Score ---
+# Points per CLNSIG rank (clnsig_priority: 0 = Pathogenic ... 6 = Benign, 7 = missing)
+CLNSIG_POINTS = np.array([100, 80, 50, 45, 25, 10, 0, 20])
+# ClinVar review status -> stars, first matching pattern wins
+REVIEW_STARS = (
+    (r'practice guideline', 4),
+    (r'expert panel', 3),
+    (r'multiple submitters', 2),
+    (r'conflicting', 1),
+    (r'single submitter', 1),
+)
+STAR_POINTS = 5
+# Points per ClinGen classification rank (Definitive ... No Known Disease Relationship)
+CLINGEN_POINTS = np.array([15, 12, 8, 4, 0, 0, 0])
+# gnomAD PopMax AF thresholds: common variants (ACMG BA1 / BS1-like) lose points, rare ones gain a few
+FREQUENCY_POINTS = (
+    (0.05, -50),
+    (0.01, -25),
+    (0.001, 0),
+)
+RARE_POINTS = 5
+# Variants scoring below this get a templated summary instead of a Gemini call
+LOW_PRIORITY_SCORE = 25
+
+# Rough size of one interpretation, for the token budget
+RESPONSE_TOKENS = 400
+CHARS_PER_TOKEN = 4
+
+
+def review_stars(clnrevstat):
+    """Vectorized CLNREVSTAT -> ClinVar review stars (0-4)."""
+    status = clnrevstat.astype(object).fillna("").astype(str).str.lower().str.replace("_", " ", regex=False)
+    return pd.Series(np.select([status.str.contains(pattern, regex=True) for pattern, _ in REVIEW_STARS],
+                               [stars for _, stars in REVIEW_STARS], default=0), index=clnrevstat.index)
+
+
+def frequency_points(popmax_af):
+    """Score adjustment for gnomAD PopMax AF (array-like or scalar); missing frequencies score 0."""
+    af = pd.to_numeric(pd.Series(np.atleast_1d(popmax_af)), errors="coerce").to_numpy(dtype=float)
+    points = np.select([af >= threshold for threshold, _ in FREQUENCY_POINTS],
+                       [p for _, p in FREQUENCY_POINTS], default=RARE_POINTS)
+    points = np.where(np.isnan(af), 0, points)
+    return points if np.ndim(popmax_af) else int(points[0])
+
+
+def priority_scores(df):
+    """
+    Vectorized clinical priority of each variant row, higher first: CLNSIG, review
+    stars (CLNREVSTAT), ClinGen gene-disease validity and, when the columns are
+    present, gnomAD PopMax AF. Missing columns contribute nothing.
+    """
+    score = np.zeros(len(df))
+    if "CLNSIG" in df:
+        score += CLNSIG_POINTS[clnsig_priority(df["CLNSIG"]).to_numpy()]
+    if "CLNREVSTAT" in df:
+        score += STAR_POINTS * review_stars(df["CLNREVSTAT"]).to_numpy()
+    if "ClinGen_Validity" in df:
+        ranks = df["ClinGen_Validity"].map(CLASSIFICATION_RANK)
+        score += np.where(ranks.isna(), 0, CLINGEN_POINTS[ranks.fillna(0).astype(int).to_numpy()])
+    if "PopMax_AF" in df:
+        score += frequency_points(df["PopMax_AF"].to_numpy())
+    return pd.Series(score, index=df.index)
+
+
+# --- Budget ---
+def estimate_tokens(prompt):
+    return len(prompt) // CHARS_PER_TOKEN + RESPONSE_TOKENS
+
+
+class InterpretationBudget:
+    """
+    Limits on the Gemini work of one analysis: wall-clock `seconds` from creation,
+    Gemini `requests` (variants are sent `batch_size` per request) and estimated
+    `tokens` (prompt plus a typical answer). None means unlimited. `admit(prompt)`
+    reserves room for one more variant and returns False once any limit is reached.
+    """
+
+    def __init__(self, seconds=None, requests=None, tokens=None, batch_size=1):
+        self.deadline = time.monotonic() + seconds if seconds else None
+        self.max_requests = requests or None
+        self.max_tokens = tokens or None
+        self.batch_size = max(1, batch_size or 1)
+        self.variants = 0
+        self.tokens = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_params(cls, params, batch_size=1):
+        """Budget from job parameters ({"seconds", "requests", "tokens"}), or None when nothing is limited."""
+        limits = {k: (params or {}).get(k) for k in ("seconds", "requests", "tokens")}
+        return cls(batch_size=batch_size, **limits) if any(limits.values()) else None
+
+    def admit(self, prompt):
+        tokens = estimate_tokens(prompt)
+        with self._lock:
+            over = ((self.deadline is not None and time.monotonic() >= self.deadline)
+                    or (self.max_requests is not None
+                        and math.ceil((self.variants + 1) / self.batch_size) > self.max_requests)
+                    or (self.max_tokens is not None and self.tokens + tokens > self.max_tokens))
+            if over:
+                return False
+            self.variants += 1
+            self.tokens += tokens
+            return True
+
+
+# --- Templated Summary ---
+TEMPLATE_PREFIX = "📋"
+TEMPLATE_REASONS = {
+    "low_priority": "low priority",
+    "budget": "interpretation budget reached",
+}
+
+
+def _known(value):
+    return value is not None and value == value and str(value) not in ("", "None", "nan", "<NA>")
+
+
+def template_interpretation(row, stats, reason="low_priority"):
+    """Plain summary of the ClinVar, ClinGen and gnomAD evidence, used in place of a Gemini interpretation."""
+    gene = row.get("GENE") if _known(row.get("GENE")) else "an unnamed gene"
+    clnsig = str(row.get("CLNSIG")).replace("_", " ") if _known(row.get("CLNSIG")) else "no classification"
+    parts = [f"{TEMPLATE_PREFIX} Summary without AI interpretation ({TEMPLATE_REASONS.get(reason, reason)}).",
+             f"ClinVar classifies {row['CHROM']}:{row['POS']} {row['REF']}>{row['ALT']} in {gene} as {clnsig}"]
+    if _known(row.get("CLNREVSTAT")):
+        stars = int(review_stars(pd.Series([row["CLNREVSTAT"]])).iloc[0])
+        parts[-1] += f" ({stars}★, {row['CLNREVSTAT']})"
+    if _known(row.get("DISEASE")):
+        parts[-1] += f" for {str(row['DISEASE']).replace('|', ', ')}"
+    parts[-1] += "."
+    if _known(stats.get("PopMax_AF")):
+        population = f" ({stats['PopMax_Pop']})" if _known(stats.get("PopMax_Pop")) else ""
+        parts.append(f"gnomAD PopMax allele frequency: {float(stats['PopMax_AF']):.4g}{population}.")
+    else:
+        parts.append("No gnomAD frequency available.")
+    if _known(row.get("ClinGen_Validity")) and row.get("ClinGen_Validity") != "None":
+        parts.append(f"ClinGen gene-disease validity: {row['ClinGen_Validity']}.")
+    return " ".join(parts)
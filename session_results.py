@@ -0,0 +1,180 @@
+import io
+import os
+import glob
+import time
+import uuid
+import logging
+import threading
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Holds patient results and reports: app-owned, private to the server's user (0700 directory, 0600 files)
+DEFAULT_SPILL_DIR = os.environ.get("GENETIC_APP_SPILL", "session_spill")
+# Results untouched for this long are moved from memory to disk
+IDLE_SPILL_AFTER = 10 * 60
+SWEEP_INTERVAL = 60
+# Spilled results (and report files) untouched for this long are deleted
+EXPIRE_AFTER = 24 * 3600
+
+CATEGORY_COLUMNS = ("CHROM", "GENE", "CLNSIG", "CLNVC", "CLNREVSTAT", "ClinGen_Validity", "PopMax_Pop")
+NUMERIC_COLUMNS = ("POS", "ID", "Exome_AC", "Exome_AN", "PopMax_AF", "Priority_Score")
+
+
+def compact_results(records):
+    """
+    Builds the columnar results table from result records: low-cardinality columns
+    become categoricals, numeric columns are coerced, and the remaining columns use
+    the string dtype, so the frame is small and can be written to Parquet as is.
+    """
+    df = records.copy() if isinstance(records, pd.DataFrame) else pd.DataFrame(records)
+    for col in df.columns:
+        if col in NUMERIC_COLUMNS:
+            df[col] = pd.to_numeric(df[col], errors="coerce")
+        elif col in CATEGORY_COLUMNS:
+            df[col] = df[col].astype("string").astype("category")
+        elif df[col].dtype == object:
+            df[col] = df[col].astype("string")
+    return df
+
+
+def export_frame(df, fmt="csv"):
+    """Serializes a results table for download as CSV or Parquet bytes."""
+    if fmt == "parquet":
+        buffer = io.BytesIO()
+        df.to_parquet(buffer, index=False)
+        return buffer.getvalue()
+    return df.to_csv(index=False).encode()
+
+
+def _private_dir(path):
+    """
+    Creates `path` as a 0700 directory, or checks an existing one: it must be a real
+    directory owned by this user. Group/other permissions on it are removed.
+    """
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    st = os.lstat(path)
+    if not os.path.isdir(path) or os.path.islink(path):
+        raise PermissionError(f"Spill directory {path} is not a directory")
+    if hasattr(os, "getuid") and st.st_uid != os.getuid():
+        raise PermissionError(f"Spill directory {path} is owned by another user (uid {st.st_uid})")
+    if st.st_mode & 0o077:
+        logger.warning(f"Spill directory {path} was accessible to other users; restricting it to 0700")
+        os.chmod(path, 0o700)
+
+
+def _open_private(path):
+    """Opens `path` for writing with 0600 permissions (patient data), also when it already exists."""
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    if hasattr(os, "fchmod"):
+        os.fchmod(fd, 0o600)
+    return os.fdopen(fd, "wb")
+
+
+class SessionResultStore:
+    """
+    Process-wide home for per-session analysis results. Sessions keep only a token;
+    the table lives here and is spilled to a Parquet file once the session has been
+    idle for `idle_after` seconds, then read back on its next access. Large blobs
+    (PDF reports) go straight to disk.
+    """
+
+    def __init__(self, spill_dir=DEFAULT_SPILL_DIR, idle_after=IDLE_SPILL_AFTER, expire_after=EXPIRE_AFTER):
+        self.spill_dir = spill_dir
+        self.idle_after = idle_after
+        self.expire_after = expire_after
+        self._frames = {}
+        self._last_access = {}
+        self._lock = threading.Lock()
+        _private_dir(spill_dir)
+        threading.Thread(target=self._sweep_loop, name="session-spill", daemon=True).start()
+
+    def _path(self, token, name):
+        return os.path.join(self.spill_dir, f"{token}.{name}")
+
+    def _touch(self, token):
+        now = time.time()
+        self._last_access[token] = now
+        for path in glob.glob(self._path(token, "*")):
+            os.utime(path, (now, now))
+
+    # --- Results tables ---
+    def put(self, results, token=None):
+        """Stores results (records or DataFrame) and returns the session token."""
+        token = token or uuid.uuid4().hex
+        df = compact_results(results)
+        with self._lock:
+            self._frames[token] = df
+            self._touch(token)
+        return token
+
+    def get(self, token):
+        """Returns the results table for `token`, reloading it from disk if it was spilled; None if unknown."""
+        with self._lock:
+            df = self._frames.get(token)
+            if df is None:
+                path = self._path(token, "parquet")
+                if not os.path.exists(path):
+                    return None
+                df = self._frames[token] = pd.read_parquet(path)
+            self._touch(token)
+        return df
+
+    def discard(self, token):
+        with self._lock:
+            self._frames.pop(token, None)
+            self._last_access.pop(token, None)
+            for path in glob.glob(self._path(token, "*")):
+                os.remove(path)
+
+    # --- Blobs ---
+    def put_blob(self, token, name, data):
+        with _open_private(self._path(token, name)) as fh:
+            fh.write(data)
+        with self._lock:
+            self._touch(token)
+
+    def get_blob(self, token, name):
+        path = self._path(token, name)
+        if not os.path.exists(path):
+            return None
+        with open(path, "rb") as fh:
+            return fh.read()
+
+    # --- Exports (built only when a download is requested) ---
+    def export(self, token, fmt="csv"):
+        df = self.get(token)
+        return b"" if df is None else export_frame(df, fmt)
+
+    # --- Spilling ---
+    def _sweep_loop(self):
+        while True:
+            time.sleep(SWEEP_INTERVAL)
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.error(f"Session result sweep failed: {e}")
+
+    def sweep(self):
+        """Spills results idle longer than idle_after and deletes files idle longer than expire_after."""
+        now = time.time()
+        with self._lock:
+            idle = [t for t, last in self._last_access.items() if t in self._frames and now - last > self.idle_after]
+            for token in idle:
+                path = self._path(token, "parquet")
+                if not os.path.exists(path):
+                    with _open_private(path) as fh:
+                        self._frames[token].to_parquet(fh, index=False)
+                del self._frames[token]
+            for path in glob.glob(os.path.join(self.spill_dir, "*")):
+                try:
+                    if now - os.path.getmtime(path) > self.expire_after:
+                        os.remove(path)
+                except FileNotFoundError:
+                    pass
+            for token in [t for t, last in self._last_access.items() if now - last > self.expire_after]:
+                self._last_access.pop(token, None)
+                self._frames.pop(token, None)
+        if idle:
+            logger.info(f"Spilled {len(idle)} idle session results to {self.spill_dir}")
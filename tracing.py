@@ -0,0 +1,267 @@
+import io
+import os
+import json
+import time
+import uuid
+import pstats
+import cProfile
+import logging
+import threading
+import contextlib
+import contextvars
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Prometheus text file refreshed after every job (e.g. for node_exporter's textfile collector)
+METRICS_FILE = os.environ.get("GENETIC_APP_METRICS_FILE")
+# Spans kept per process; the oldest are dropped first
+MAX_SPANS = 50_000
+# Profiled runs whose cProfile data is kept per process; the oldest run's profiles are dropped first
+MAX_PROFILED_RUNS = 20
+PERCENTILES = (50, 90, 95, 99)
+# Numeric span fields that are summed per stage
+COUNTERS = ("items", "bytes", "retries", "cache_hits", "cache_misses", "wait_seconds")
+
+_run = contextvars.ContextVar("trace_run", default=None)
+_span = contextvars.ContextVar("trace_span", default=None)
+
+
+class Tracer:
+    """
+    Process-wide span recorder. A span is one timed stage or external call: a dict
+    with `stage`, `run`, `start`, `seconds`, `error` and counters (items, bytes,
+    retries, cache hits/misses, rate-limit wait) that code inside the span adds to
+    with `add()`. Spans are tagged with the run they belong to (`trace_run`).
+    Only the latest `max_spans` are kept; per-stage totals cover every span recorded.
+    """
+
+    def __init__(self, max_spans=MAX_SPANS, max_profiled_runs=MAX_PROFILED_RUNS):
+        self._spans = deque(maxlen=max_spans)
+        # {stage: {"calls", "errors", "seconds", *COUNTERS}}, cumulative since start (or clear)
+        self._totals = {}
+        # {run: [cProfile.Profile per thread]}, oldest run first
+        self._profiles = {}
+        self.max_profiled_runs = max_profiled_runs
+        self._lock = threading.Lock()
+
+    def record(self, span):
+        with self._lock:
+            self._spans.append(span)
+            totals = self._totals.get(span["stage"])
+            if totals is None:
+                totals = self._totals[span["stage"]] = dict.fromkeys(("calls", "errors", "seconds") + COUNTERS, 0)
+            totals["calls"] += 1
+            totals["errors"] += span.get("error") is not None
+            totals["seconds"] += span["seconds"]
+            for counter in COUNTERS:
+                totals[counter] += span.get(counter) or 0
+
+    def totals(self):
+        """Cumulative per-stage calls, errors, seconds and counters, unaffected by dropped spans."""
+        with self._lock:
+            return {stage: dict(values) for stage, values in self._totals.items()}
+
+    def spans(self, run=None):
+        with self._lock:
+            spans = list(self._spans)
+        return spans if run is None else [s for s in spans if s["run"] == run]
+
+    def clear(self):
+        with self._lock:
+            self._spans.clear()
+            self._totals.clear()
+            self._profiles.clear()
+
+    # --- Summaries ---
+    def summary(self, run=None):
+        """Per-stage table: calls, errors, latency percentiles and total seconds, and summed counters."""
+        spans = self.spans(run)
+        columns = (["stage", "calls", "errors"] + [f"p{p}_ms" for p in PERCENTILES] + ["total_s"]
+                   + list(COUNTERS))
+        if not spans:
+            return pd.DataFrame(columns=columns)
+        rows = []
+        for stage, group in pd.DataFrame(spans).groupby("stage", sort=False):
+            seconds = group["seconds"].to_numpy()
+            row = {"stage": stage, "calls": len(group), "errors": int(group["error"].notna().sum())}
+            row.update({f"p{p}_ms": round(float(v) * 1000, 1)
+                        for p, v in zip(PERCENTILES, np.percentile(seconds, PERCENTILES))})
+            row["total_s"] = round(float(seconds.sum()), 3)
+            for counter in COUNTERS:
+                row[counter] = group[counter].fillna(0).sum() if counter in group else 0
+            rows.append(row)
+        return pd.DataFrame(rows, columns=columns).sort_values("total_s", ascending=False, ignore_index=True)
+
+    def to_json(self, run=None):
+        return json.dumps({"run": run, "summary": self.summary(run).to_dict("records"), "spans": self.spans(run)},
+                          default=str)
+
+    def to_prometheus(self, prefix="genetic_app"):
+        """
+        This process's metrics in the Prometheus text exposition format. Sums, counts
+        and counters are cumulative (they never go down); quantiles cover the kept spans.
+        """
+        quantiles = self.summary().set_index("stage")
+        totals = self.totals()
+        lines = [f"# HELP {prefix}_stage_seconds Latency of pipeline stages and external calls",
+                 f"# TYPE {prefix}_stage_seconds summary"]
+        for stage, values in totals.items():
+            label = f'stage="{stage}"'
+            if stage in quantiles.index:
+                for p in PERCENTILES:
+                    lines.append(f'{prefix}_stage_seconds{{{label},quantile="{p / 100}"}} '
+                                 f'{quantiles.at[stage, f"p{p}_ms"] / 1000}')
+            lines.append(f"{prefix}_stage_seconds_sum{{{label}}} {values['seconds']}")
+            lines.append(f"{prefix}_stage_seconds_count{{{label}}} {values['calls']}")
+        for counter in ("errors",) + COUNTERS:
+            name = f"{prefix}_stage_{counter}_total"
+            lines += [f"# TYPE {name} counter"]
+            lines += [f'{name}{{stage="{stage}"}} {values[counter]}' for stage, values in totals.items()]
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        """Writes the metrics file for node_exporter's textfile collector (atomically)."""
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as fh:
+            fh.write(self.to_prometheus())
+        os.replace(tmp, path)
+
+    # --- Profiling ---
+    def has_profile(self, run):
+        with self._lock:
+            return bool(self._profiles.get(run))
+
+    def profile_stats(self, run):
+        """Merged cProfile statistics of a profiled run, or None."""
+        with self._lock:
+            profiles = list(self._profiles.get(run, []))
+        if not profiles:
+            return None
+        stats = pstats.Stats(profiles[0])
+        for profile in profiles[1:]:
+            stats.add(profile)
+        return stats
+
+    def profile_report(self, run, limit=40, sort="cumulative"):
+        stats = self.profile_stats(run)
+        if stats is None:
+            return ""
+        out = io.StringIO()
+        stats.stream = out
+        stats.sort_stats(sort).print_stats(limit)
+        return out.getvalue()
+
+    def _add_profile(self, run, profile):
+        with self._lock:
+            self._profiles.setdefault(run, []).append(profile)
+            while len(self._profiles) > self.max_profiled_runs:
+                del self._profiles[next(iter(self._profiles))]
+
+
+tracer = Tracer()
+_profiled_runs = set()
+
+
+# --- Instrumentation API ---
+def current_run():
+    return _run.get()
+
+
+@contextlib.contextmanager
+def trace_run(run=None, profile=False):
+    """
+    Tags every span recorded in this context (and in calls wrapped with `bind`)
+    with `run`, a new ID by default. With `profile=True` the work is also captured
+    with cProfile, thread by thread, for `Tracer.profile_report(run)`.
+    """
+    run = run or uuid.uuid4().hex[:12]
+    token = _run.set(run)
+    if profile:
+        _profiled_runs.add(run)
+    try:
+        with _profiling(run):
+            yield run
+    finally:
+        _run.reset(token)
+        _profiled_runs.discard(run)
+
+
+@contextlib.contextmanager
+def _profiling(run):
+    if run not in _profiled_runs:
+        yield
+        return
+    profile = cProfile.Profile()
+    try:
+        profile.enable()
+    except ValueError:
+        # Another profiler is already active in this thread (nested run or call)
+        yield
+        return
+    try:
+        yield
+    finally:
+        profile.disable()
+        tracer._add_profile(run, profile)
+
+
+def bind(func):
+    """Wraps `func` so it runs in the caller's trace run when called from another thread."""
+    run = _run.get()
+    if run is None:
+        return func
+
+    def bound(*args, **kwargs):
+        token = _run.set(run)
+        try:
+            with _profiling(run):
+                return func(*args, **kwargs)
+        finally:
+            _run.reset(token)
+    return bound
+
+
+@contextlib.contextmanager
+def span(stage, **fields):
+    """Times a stage or external call; yields the span dict so callers can fill in counters."""
+    record = {"stage": stage, "run": _run.get(), "start": time.time(), "error": None, **fields}
+    token = _span.set(record)
+    started = time.perf_counter()
+    try:
+        yield record
+    except BaseException as e:
+        record["error"] = type(e).__name__
+        raise
+    finally:
+        record["seconds"] = time.perf_counter() - started
+        _span.reset(token)
+        tracer.record(record)
+
+
+def add(**counters):
+    """Adds to counters (bytes, retries, cache_hits, ...) of the innermost active span in this thread."""
+    record = _span.get()
+    if record is not None:
+        for name, value in counters.items():
+            record[name] = record.get(name, 0) + value
+
+
+def record_span(stage, seconds, **fields):
+    """Records an already-measured span (e.g. time spent across a generator's iterations)."""
+    tracer.record({"stage": stage, "run": _run.get(), "start": time.time() - seconds, "error": None,
+                   "seconds": seconds, **fields})
+
+
+def export_metrics_file(path=None):
+    """Writes the Prometheus text file to `path` or $GENETIC_APP_METRICS_FILE, if either is set."""
+    path = path or METRICS_FILE
+    if not path:
+        return
+    try:
+        tracer.write_prometheus(path)
+    except OSError as e:
+        logger.error(f"Could not write metrics file {path}: {e}")
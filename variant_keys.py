@@ -0,0 +1,116 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+KEY_COLUMNS = ["CHROM", "POS", "REF", "ALT"]
+
+CHROM_CODES = {**{str(i): i for i in range(1, 23)}, "X": 23, "Y": 24, "M": 25, "MT": 25}
+# Contigs outside CHROM_CODES (alts, decoys, unplaced) get a hashed code above this
+_OTHER_CONTIG_BASE = 64
+_INVALID_KEY = np.int64(-1)
+# Odd 64-bit multiplier used to mix the locus into the allele hash
+_MIX = np.uint64(0x9E3779B97F4A7C15)
+
+
+def normalize_chrom(chrom):
+    """Vectorized 'chr1' / '1' / 'Chr1' -> '1', 'chrM' -> 'M'."""
+    return chrom.astype(str).str.strip().str.upper().str.removeprefix("CHR")
+
+
+def encode_chrom(chrom):
+    """Returns an int64 chromosome code per value; 1-22, X=23, Y=24, M/MT=25, other contigs hashed."""
+    names = normalize_chrom(chrom)
+    codes = names.map(CHROM_CODES)
+    unknown = codes.isna().to_numpy()
+    codes = codes.fillna(0).to_numpy(dtype=np.int64)
+    if unknown.any():
+        hashed = pd.util.hash_array(names.to_numpy(dtype=object)[unknown]) % np.uint64(1 << 20)
+        codes[unknown] = _OTHER_CONTIG_BASE + hashed.astype(np.int64)
+    return codes
+
+
+def encode_locus(chrom, pos):
+    """Packs chromosome code and position into one int64 (code << 32 | pos); -1 for invalid positions."""
+    pos = pd.to_numeric(pos, errors="coerce")
+    valid = (pos.notna() & (pos >= 0)).to_numpy()
+    locus = (encode_chrom(chrom) << 32) | pos.fillna(0).to_numpy(dtype=np.int64)
+    return np.where(valid, locus, _INVALID_KEY)
+
+
+def variant_keys(chrom, pos, ref, alt):
+    """
+    One int64 key per variant: the packed locus mixed with a 64-bit hash of the
+    upper-cased REF>ALT alleles. Equal variants get equal keys regardless of 'chr'
+    prefix, case or dtype.
+    """
+    locus = encode_locus(chrom, pos)
+    alleles = (ref.astype(str).str.strip().str.upper() + ">" + alt.astype(str).str.strip().str.upper())
+    allele_hash = pd.util.hash_array(alleles.to_numpy(dtype=object))
+    with np.errstate(over="ignore"):
+        keys = (allele_hash ^ (locus.astype(np.uint64) * _MIX)).view(np.int64)
+    return np.where(locus == _INVALID_KEY, _INVALID_KEY, keys)
+
+
+def frame_variant_keys(df):
+    return variant_keys(df["CHROM"], df["POS"], df["REF"], df["ALT"])
+
+
+def same_variants(left, right):
+    """
+    Vectorized check that row i of `left` and row i of `right` are the same variant on
+    normalized CHROM/POS/REF/ALT. Confirms key matches, which a hash collision could fake.
+    """
+    same = encode_locus(left["CHROM"], left["POS"]) == encode_locus(right["CHROM"], right["POS"])
+    for col in ("REF", "ALT"):
+        a = left[col].astype(str).str.strip().str.upper().to_numpy(dtype=object)
+        b = right[col].astype(str).str.strip().str.upper().to_numpy(dtype=object)
+        same &= a == b
+    return same
+
+
+class VariantIndex:
+    """
+    Hash index over the variant keys of a reference frame (e.g. ClinVar), built
+    once and probed with vectorized lookups. `keys` may pass in precomputed
+    frame_variant_keys of the reference. The reference may be Arrow-backed
+    (pd.ArrowDtype); only the matched rows are then converted to NumPy-backed columns.
+    """
+
+    def __init__(self, reference_df, keys=None):
+        self.reference = reference_df
+        self._index = pd.Index(frame_variant_keys(reference_df) if keys is None else keys)
+        self._unique = self._index.is_unique
+        if self._unique:
+            # Force the hash table to be built now rather than on the first upload
+            self._index.get_indexer(np.array([_INVALID_KEY]))
+
+    def probe(self, keys):
+        """Returns (query_positions, reference_positions) of every match."""
+        if self._unique:
+            ref_pos = self._index.get_indexer(keys)
+            query_pos = np.flatnonzero((ref_pos >= 0) & (keys != _INVALID_KEY))
+            return query_pos, ref_pos[query_pos]
+        # Duplicate reference keys: fall back to an int64 hash join
+        query = pd.DataFrame({"key": keys, "q": np.arange(len(keys))})
+        query = query[query["key"] != _INVALID_KEY]
+        ref = pd.DataFrame({"key": self._index.to_numpy(), "r": np.arange(len(self._index))})
+        matched = query.merge(ref, on="key", sort=False).sort_values("q", kind="stable")
+        return matched["q"].to_numpy(), matched["r"].to_numpy()
+
+    def join(self, query_df):
+        """
+        Inner join of `query_df` against the reference on normalized CHROM/POS/REF/ALT.
+        CHROM/POS/REF/ALT come from the reference side; other query columns are kept.
+        """
+        query_pos, ref_pos = self.probe(frame_variant_keys(query_df))
+        # Keys are hashes: keep only matches whose variants are really equal
+        same = same_variants(query_df[KEY_COLUMNS].iloc[query_pos], self.reference[KEY_COLUMNS].iloc[ref_pos])
+        if not same.all():
+            query_pos, ref_pos = query_pos[same], ref_pos[same]
+        left = query_df.drop(columns=KEY_COLUMNS).iloc[query_pos].reset_index(drop=True)
+        right = self.reference.iloc[ref_pos].reset_index(drop=True)
+        arrow = [c for c in right.columns if isinstance(right[c].dtype, pd.ArrowDtype)]
+        if arrow:
+            right[arrow] = pa.table({c: pa.array(right[c]) for c in arrow}).to_pandas()
+        extra = [c for c in left.columns if c not in right.columns]
+        return pd.concat([left[extra], right], axis=1)
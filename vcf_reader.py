@@ -0,0 +1,168 @@
+import io
+import os
+import csv
+import gzip
+import struct
+import zlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+VARIANT_COLUMNS = ["CHROM", "POS", "REF", "ALT"]
+# Zero-based VCF column positions of the optional fields that can be requested
+_OPTIONAL_COLUMNS = {"ID": 2, "QUAL": 5, "FILTER": 6, "INFO": 7}
+DEFAULT_BATCH_SIZE = 200_000
+READ_CHUNK_SIZE = 4 * 1024 * 1024
+
+_GZIP_MAGIC = b"\x1f\x8b"
+_BGZF_HEADER_SIZE = 18
+
+
+# --- Byte Sources ---
+def _is_bgzf(fh):
+    """Checks (without consuming) whether the stream starts with a BGZF block header."""
+    pos = fh.tell()
+    header = fh.read(_BGZF_HEADER_SIZE)
+    fh.seek(pos)
+    return (
+        len(header) == _BGZF_HEADER_SIZE
+        and header[:2] == _GZIP_MAGIC
+        and header[3] & 4
+        and header[12:14] == b"BC"
+    )
+
+
+def _read_bgzf_block(fh):
+    """Reads one raw BGZF block and returns its deflate payload, or None at EOF."""
+    header = fh.read(12)
+    if not header:
+        return None
+    if len(header) < 12 or header[:2] != _GZIP_MAGIC:
+        raise ValueError("Corrupt BGZF stream: invalid block header")
+    xlen = struct.unpack("<H", header[10:12])[0]
+    extra = fh.read(xlen)
+    bsize = None
+    i = 0
+    while i + 4 <= len(extra):
+        slen = struct.unpack("<H", extra[i + 2:i + 4])[0]
+        if extra[i:i + 2] == b"BC" and slen == 2:
+            bsize = struct.unpack("<H", extra[i + 4:i + 6])[0]
+        i += 4 + slen
+    if bsize is None:
+        raise ValueError("Corrupt BGZF stream: missing BC subfield")
+    # BSIZE is the total block size minus one; the payload is followed by CRC32 + ISIZE
+    rest = fh.read(bsize + 1 - 12 - xlen)
+    return rest[:-8]
+
+
+def _inflate(payload):
+    return zlib.decompress(payload, -15)
+
+
+def _iter_bgzf_chunks(fh, workers=None):
+    """Yields decompressed BGZF data, inflating blocks in parallel.
+
+    zlib releases the GIL while inflating, so a thread pool spreads the work across
+    cores. Only a bounded window of blocks is in flight at any time.
+    """
+    workers = workers or os.cpu_count() or 1
+    window = workers * 4
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while True:
+            blocks = []
+            while len(blocks) < window:
+                block = _read_bgzf_block(fh)
+                if block is None:
+                    break
+                blocks.append(block)
+            if not blocks:
+                return
+            yield b"".join(pool.map(_inflate, blocks))
+
+
+def _iter_plain_chunks(fh, chunk_size=READ_CHUNK_SIZE):
+    while True:
+        chunk = fh.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+def _iter_raw_chunks(fh, workers=None):
+    pos = fh.tell()
+    magic = fh.read(2)
+    fh.seek(pos)
+    if magic != _GZIP_MAGIC:
+        return _iter_plain_chunks(fh)
+    if _is_bgzf(fh):
+        return _iter_bgzf_chunks(fh, workers)
+    # Plain gzip cannot be split into independent blocks, so stream it serially
+    return _iter_plain_chunks(gzip.GzipFile(fileobj=fh, mode="rb"))
+
+
+# --- Line and Record Parsing ---
+def _iter_line_batches(chunks, batch_size):
+    """Regroups arbitrary byte chunks into lists of complete data lines."""
+    remainder = b""
+    batch = []
+    for chunk in chunks:
+        lines = (remainder + chunk).split(b"\n")
+        remainder = lines.pop()
+        for line in lines:
+            if not line or line.startswith(b"#"):
+                continue
+            batch.append(line)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+    if remainder and not remainder.startswith(b"#"):
+        batch.append(remainder)
+    if batch:
+        yield batch
+
+
+def _parse_line_batch(lines, split_multiallelic=True, extra_columns=()):
+    positions = {"CHROM": 0, "POS": 1, "REF": 3, "ALT": 4}
+    positions.update({c: _OPTIONAL_COLUMNS[c] for c in extra_columns})
+    df = pd.read_csv(
+        io.BytesIO(b"\n".join(lines)),
+        sep="\t",
+        header=None,
+        usecols=sorted(positions.values()),
+        dtype={i: (np.int64 if i == 1 else str) for i in positions.values()},
+        na_filter=False,
+        # VCF has no quoting: a '"' inside ID or INFO is an ordinary character
+        quoting=csv.QUOTE_NONE,
+        engine="c",
+    )
+    df = df.rename(columns={i: name for name, i in positions.items()})[VARIANT_COLUMNS + list(extra_columns)]
+    if split_multiallelic and df["ALT"].str.contains(",", regex=False).any():
+        df = df.assign(ALT=df["ALT"].str.split(",")).explode("ALT", ignore_index=True)
+    return df
+
+
+def iter_vcf_batches(fileobj, batch_size=DEFAULT_BATCH_SIZE, split_multiallelic=True, workers=None,
+                     extra_columns=()):
+    """
+    Streams a VCF (plain, gzip or BGZF) as columnar DataFrame batches.
+    Each batch has CHROM, POS (int64), REF and ALT columns, plus any of ID, QUAL,
+    FILTER and INFO listed in `extra_columns`, and at most roughly `batch_size`
+    records; multi-allelic ALTs are split into one row per allele.
+    Memory stays bounded by the batch size regardless of file size.
+    """
+    chunks = _iter_raw_chunks(fileobj, workers)
+    for lines in _iter_line_batches(chunks, batch_size):
+        yield _parse_line_batch(lines, split_multiallelic, extra_columns)
+
+
+def iter_variant_batches(uploaded_file, batch_size=DEFAULT_BATCH_SIZE):
+    """Streams an uploaded .vcf, .vcf.gz or .csv file as variant DataFrame batches."""
+    uploaded_file.seek(0)
+    if uploaded_file.name.endswith((".vcf", ".vcf.gz")):
+        yield from iter_vcf_batches(uploaded_file, batch_size)
+    else:
+        yield from pd.read_csv(uploaded_file, chunksize=batch_size)